@@ -0,0 +1,165 @@
+from database import Database, Assignment
+from binary import FieldType, TableSignature, Field, Entry
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable
+import asyncio
+
+MAX_WORKERS = 4 # Number of threads doing file I/O at the same time
+BATCH_SIZE = 256 # Number of entries read by a thread each time an async scan needs more
+
+class AsyncDatabase:
+    def __init__(self, name: str, max_workers: int = MAX_WORKERS, **options):
+        '''
+        Give awaitable versions of the Database methods for asyncio programs.
+
+        All file I/O runs on a bounded thread pool so the event loop is never blocked.
+        Operations on a table are run one at a time in the order they were awaited,
+        while operations on different tables can run at the same time.
+        Other options are given to the Database.
+        '''
+        self.db = Database(name, **options)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='uldb')
+        self.table_locks = {} # Lock of each table, asyncio locks wake up waiting tasks in order
+
+    async def __aenter__(self) -> 'AsyncDatabase':
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''
+        Wait for the running operations and stop the threads.
+        '''
+        self.executor.shutdown(wait=True)
+        self.db.close()
+
+    def get_lock(self, table_name: str) -> asyncio.Lock:
+        if table_name not in self.table_locks:
+            self.table_locks[table_name] = asyncio.Lock()
+        return self.table_locks[table_name]
+
+    async def run(self, table_name: str, function: Callable, *args, **kwargs):
+        '''
+        Run a blocking function of the database on the thread pool once the table is free.
+        '''
+        loop = asyncio.get_running_loop()
+        async with self.get_lock(table_name):
+            return await loop.run_in_executor(self.executor, lambda: function(*args, **kwargs))
+
+    async def list_tables(self) -> list[str]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.db.list_tables)
+
+    async def create_table(self, table_name: str, *fields: TableSignature, **options) -> None:
+        await self.run(table_name, self.db.create_table, table_name, *fields, **options)
+
+    async def delete_table(self, table_name: str) -> None:
+        await self.run(table_name, self.db.delete_table, table_name)
+
+    async def get_table_signature(self, table_name: str) -> TableSignature:
+        return await self.run(table_name, self.db.get_table_signature, table_name)
+
+    async def get_table_size(self, table_name: str) -> int:
+        return await self.run(table_name, self.db.get_table_size, table_name)
+
+    async def analyze_table(self, table_name: str) -> dict:
+        return await self.run(table_name, self.db.analyze_table, table_name)
+
+    async def add_column(self, table_name: str, field_name: str, field_type: FieldType, default: Field | None = None) -> None:
+        await self.run(table_name, self.db.add_column, table_name, field_name, field_type, default)
+
+    async def drop_column(self, table_name: str, field_name: str) -> None:
+        await self.run(table_name, self.db.drop_column, table_name, field_name)
+
+    async def create_text_index(self, table_name: str, field_name: str) -> None:
+        await self.run(table_name, self.db.create_text_index, table_name, field_name)
+
+    async def add_entry(self, table_name: str, entry: Entry) -> None:
+        await self.run(table_name, self.db.add_entry, table_name, entry)
+
+    async def add_entries(self, table_name: str, entries: list[Entry]) -> None:
+        await self.run(table_name, self.db.add_entries, table_name, entries)
+
+    async def get_complete_table(self, table_name: str) -> list[Entry]:
+        return await self.run(table_name, self.db.get_complete_table, table_name)
+
+    async def get_entry(self, table_name: str, field_name: str, field_value: Field) -> Entry | None:
+        return await self.run(table_name, self.db.get_entry, table_name, field_name, field_value)
+
+    async def get_entries(self, table_name: str, field_name: str, field_value: Field) -> list[Entry]:
+        return await self.run(table_name, self.db.get_entries, table_name, field_name, field_value)
+
+    async def get_entries_like(self, table_name: str, field_name: str, pattern: str) -> list[Entry]:
+        return await self.run(table_name, self.db.get_entries_like, table_name, field_name, pattern)
+
+    async def get_entries_containing(self, table_name: str, field_name: str, text: str) -> list[Entry]:
+        return await self.run(table_name, self.db.get_entries_containing, table_name, field_name, text)
+
+    async def select_entry(self, table_name: str, fields: tuple[str], field_name: str, field_value: Field) -> Field | tuple[Field]:
+        return await self.run(table_name, self.db.select_entry, table_name, fields, field_name, field_value)
+
+    async def select_entries(self, table_name: str, fields: tuple[str], field_name: str, field_value: Field) -> list[Field | tuple[Field]]:
+        return await self.run(table_name, self.db.select_entries, table_name, fields, field_name, field_value)
+
+    async def select_page(self, table_name: str, fields: tuple[str], field_name: str | None, field_value: Field | None,
+                          limit: int, cursor: str | None = None) -> tuple[list[Field | tuple[Field]], str | None]:
+        return await self.run(table_name, self.db.select_page, table_name, fields, field_name, field_value, limit, cursor)
+
+    async def update_entries(self, table_name: str, cond_name: str, cond_value: Field, update_name: str, update_value: Field) -> bool:
+        return await self.run(table_name, self.db.update_entries, table_name, cond_name, cond_value, update_name, update_value)
+
+    async def update_fields(self, table_name: str, cond_name: str, cond_value: Field, assignments: dict[str, Assignment]) -> bool:
+        return await self.run(table_name, self.db.update_fields, table_name, cond_name, cond_value, assignments)
+
+    async def delete_entries(self, table_name: str, field_name: str, field_value: Field) -> bool:
+        return await self.run(table_name, self.db.delete_entries, table_name, field_name, field_value)
+
+    async def explain(self, operation: str, table_name: str, *args) -> dict:
+        return await self.run(table_name, self.db.explain, operation, table_name, *args)
+
+    async def import_csv(self, table_name: str, path: str, batch_size: int = 1000) -> tuple[int, float]:
+        return await self.run(table_name, self.db.import_csv, table_name, path, batch_size)
+
+    async def import_ndjson(self, table_name: str, path: str, batch_size: int = 1000) -> tuple[int, float]:
+        return await self.run(table_name, self.db.import_ndjson, table_name, path, batch_size)
+
+    async def export_csv(self, table_name: str, path: str) -> int:
+        return await self.run(table_name, self.db.export_csv, table_name, path)
+
+    async def export_ndjson(self, table_name: str, path: str) -> int:
+        return await self.run(table_name, self.db.export_ndjson, table_name, path)
+
+    async def snapshot(self, destination: str, reflink: bool = True) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.db.snapshot(destination, reflink))
+
+    async def iter_entries(self, table_name: str, batch_size: int = BATCH_SIZE) -> AsyncIterator[Entry]:
+        '''
+        Give all entries one by one, reading them by batch on the thread pool.
+        The table is locked until the scan ends or is stopped.
+        '''
+        loop = asyncio.get_running_loop()
+
+        async with self.get_lock(table_name):
+            entries = self.db.iter_entries(table_name)
+            try:
+                while True:
+                    batch = await loop.run_in_executor(self.executor, lambda: next_batch(entries, batch_size))
+                    for entry in batch:
+                        yield entry
+                    if len(batch) < batch_size:
+                        break
+            finally:
+                entries.close()
+
+def next_batch(entries, batch_size: int) -> list[Entry]:
+    '''
+    Get the next entries of a scan, less than batch_size if the scan ends.
+    '''
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == batch_size:
+            break
+    return batch
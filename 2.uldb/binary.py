@@ -1,20 +1,141 @@
 from typing import BinaryIO
+from os import open as open_fd, close as close_fd, fsync, O_RDONLY
 from enum import Enum
+from struct import pack, unpack
+from collections import OrderedDict
+from row_cache import RowCache
+import zlib
+import lzma
 
 class FieldType(Enum):
     INTEGER = 1
     STRING = 2
+    INT8 = 3
+    INT16 = 4
+    INT64 = 5
+    BOOL = 6
+    FLOAT64 = 7
+
+# Number of bytes taken by each field type in an entry (a string is stored as a pointer)
+FIELD_SIZES = {
+    FieldType.INTEGER: 4,
+    FieldType.STRING: 4,
+    FieldType.INT8: 1,
+    FieldType.INT16: 2,
+    FieldType.INT64: 8,
+    FieldType.BOOL: 1,
+    FieldType.FLOAT64: 8,
+}
+
+# Compression algorithms usable for the strings of a table, with their default level
+COMPRESSION_LEVELS = {'zlib': 6, 'lzma': 6}
+MIN_COMPRESSED_STRING = 32 # Shorter strings are never worth compressing
 
 TableSignature = list[tuple[str, FieldType]]
-Field = str | int
+Field = str | int | float | bool
 Entry = dict[str, Field]
 
+def new_io_stats() -> dict[str, int]:
+    '''Create a set of I/O counters with all values at 0'''
+    return {
+        'seeks': 0,
+        'reads': 0,
+        'writes': 0,
+        'bytes_read': 0,
+        'bytes_written': 0,
+        'shifts': 0,
+        'bytes_shifted': 0,
+        'string_cache_hits': 0,
+        'string_cache_misses': 0,
+        'syncs': 0,
+    }
+
+def sync_file(path: str) -> None:
+    '''Write the data of a file or directory kept by the system to the disk'''
+    try:
+        fd = open_fd(path, O_RDONLY)
+    except OSError: # Directories can't be opened on Windows
+        return
+
+    try:
+        fsync(fd)
+    finally:
+        close_fd(fd)
+
+class MappedFile:
+    def __init__(self, mapping):
+        '''
+        Read a memory-mapped file like a file opened in 'rb' mode, with its own position.
+        Several of them can share the same mapping.
+        '''
+        self.mapping = mapping
+        self.position = 0
+        self.closed = False
+
+    def seek(self, pos: int, whence: int = 0) -> int:
+        if whence == 0:
+            self.position = pos
+        elif whence == 1:
+            self.position += pos
+        else:
+            self.position = len(self.mapping) + pos
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.mapping) if size < 0 else min(self.position + size, len(self.mapping))
+        data = self.mapping[self.position:end]
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer: memoryview) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def write(self, data: bytes) -> None:
+        raise ValueError # The mapping is read-only
+
+    def flush(self) -> None:
+        pass
+
 class BinaryFile:
-    def __init__(self, file: BinaryIO):
+    def __init__(self, file: BinaryIO, stats: dict[str, int] | None = None,
+                 compression: tuple[str, int] | None = None, string_cache: OrderedDict | None = None,
+                 row_cache: RowCache | None = None):
         self.__file = file # Define file as hidden for safety reasons 
+        self.stats = stats if stats is not None else new_io_stats() # Counters can be shared between several files
+        self.compression = compression # Algorithm and level used by encode_string, None to store raw strings
+        self.string_cache = string_cache # Decompressed strings by position, can be shared between several files
+        self.string_cache_size = 128
+        self.row_cache = row_cache # Decoded entries and strings by position, dropped when their bytes are written
+        self.string_header_pointer = None # Kept by the database once the fields are read
+        self.pointer_size = None # Size of the pointers of the table, kept by the database once its magic constant is read
+
+    def __seek(self, pos: int, whence: int = 0) -> None:
+        '''Move in the file and count the seek'''
+        self.stats['seeks'] += 1
+        self.__file.seek(pos, whence)
+
+    def __read(self, size: int) -> bytes:
+        '''Read raw bytes and count them'''
+        data = self.__file.read(size)
+        self.stats['reads'] += 1
+        self.stats['bytes_read'] += len(data)
+        return data
+
+    def __write(self, data: bytes) -> None:
+        '''Write raw bytes and count them'''
+        if self.row_cache is not None:
+            self.row_cache.invalidate(self.current_pos, len(data))
+        self.__file.write(data)
+        self.stats['writes'] += 1
+        self.stats['bytes_written'] += len(data)
 
     def goto(self, pos: int) -> None:
-        self.__file.seek(pos)
+        self.__seek(pos)
 
     @property
     def current_pos(self) -> int:
@@ -23,7 +144,7 @@ class BinaryFile:
     
     def increment_int_from(self, n: int, size: int, pos: int):
         '''Increment an int by the given amont'''
-        currentInt = self.read_integer_from(4, pos)
+        currentInt = self.read_integer_from(size, pos)
         if currentInt != -1: # Ignore unassigned int
             newInt = currentInt + n
             self.write_integer_to(newInt, size, pos)
@@ -31,36 +152,98 @@ class BinaryFile:
             return newInt
         return currentInt
 
+    def flush(self) -> None:
+        '''Write buffered data to the file so other handles can read it'''
+        self.__file.flush()
+
+    def sync(self) -> None:
+        '''Write buffered data to the disk, so it's kept even if the system stops'''
+        self.__file.flush()
+        fsync(self.__file.fileno())
+
     def get_size(self) -> int:
         '''Get the size of a file'''
         currentPos = self.current_pos
-        self.__file.seek(0, 2)
+        self.__seek(0, 2)
         fileSize = self.current_pos
-        self.__file.seek(currentPos)
+        self.__seek(currentPos)
         return  fileSize
     
     def write_integer(self, n: int, size: int) -> int:
         '''Write an unsigned integer in reversed byte order to the current position'''
-        self.__file.write(n.to_bytes(size, byteorder='little', signed=True))
+        self.__write(n.to_bytes(size, byteorder='little', signed=True))
 
     def write_integer_to(self, n: int, size: int, pos: int) -> int:
         '''Write an unsigned integer in reversed byte order to a given position'''
         self.goto(pos)
         self.write_integer(n, size)
 
+    def write_bytes(self, data: bytes) -> None:
+        '''Write raw bytes to the current position'''
+        if self.string_cache is not None:
+            self.string_cache.pop(self.current_pos, None) # A cached string may be overwritten
+        self.__write(data)
+
+    def read_bytes(self, size: int) -> bytes:
+        '''Read raw bytes from the current position'''
+        return self.__read(size)
+
+    def read_into(self, buffer: memoryview) -> int:
+        '''Read raw bytes from the current position into a given buffer and return the number of bytes read'''
+        nb_bytes = self.__file.readinto(buffer)
+        self.stats['reads'] += 1
+        self.stats['bytes_read'] += nb_bytes
+        return nb_bytes
+
+    def compress(self, data: bytes) -> bytes:
+        '''Compress data with the algorithm and level of the file'''
+        algorithm, level = self.compression
+        if algorithm == 'zlib':
+            return zlib.compress(data, level)
+        return lzma.compress(data, format=lzma.FORMAT_RAW, filters=[{'id': lzma.FILTER_LZMA2, 'preset': level}])
+
+    def decompress(self, data: bytes) -> bytes:
+        '''Decompress data with the algorithm of the file'''
+        algorithm, _ = self.compression
+        if algorithm == 'zlib':
+            return zlib.decompress(data)
+        return lzma.decompress(data, format=lzma.FORMAT_RAW, filters=[{'id': lzma.FILTER_LZMA2}])
+
+    def encode_string(self, s: str) -> bytes:
+        '''
+        Get the bytes of a string as they are stored: its size on 2 bytes, then its utf-8 content.
+        A compressed string is stored with a negative size.
+        '''
+        data = s.encode('utf-8')
+
+        if self.compression is not None and len(data) >= MIN_COMPRESSED_STRING:
+            compressed = self.compress(data)
+            if len(compressed) < len(data):
+                return (-len(compressed)).to_bytes(2, byteorder='little', signed=True) + compressed
+
+        return len(data).to_bytes(2, byteorder='little', signed=True) + data
+
     def write_string(self, s: str) -> int:
         '''Write a string in utf-8 to the current position'''
         self.write_integer(len(s.encode('utf-8')), 2)
-        self.__file.write(s.encode('utf-8'))
+        self.__write(s.encode('utf-8'))
 
     def write_string_to(self, s: str, pos: int) -> int:
         '''Write a string in utf-8 to a given position'''
         self.goto(pos)
         self.write_string(s)
 
+    def write_float(self, x: float) -> None:
+        '''Write a float as a little-endian IEEE 754 double to the current position'''
+        self.__write(pack('<d', x))
+
+    def read_float(self) -> float:
+        '''Read a little-endian IEEE 754 double from the current position'''
+        return unpack('<d', self.__read(8))[0]
+
     def read_integer(self, size: int) -> int:
         '''Read an unsigned integer in reversed byte order from the current position'''
-        return int.from_bytes(self.__file.read(size), byteorder='little', signed=True)
+        return int.from_bytes(self.__read(size), byteorder='little', signed=True)
 
     def read_integer_from(self, size: int, pos: int) -> int:
         '''Read an unsigned integer in reversed byte order from a given position'''
@@ -70,18 +253,65 @@ class BinaryFile:
     def read_string(self) -> str:
         '''Read a string in utf-8 from the current position'''
         stringSize = self.read_integer(2)
-        return self.__file.read(stringSize).decode('utf-8')
+
+        # A negative size means the string is compressed
+        if stringSize < 0:
+            return self.decompress(self.__read(-stringSize)).decode('utf-8')
+        return self.__read(stringSize).decode('utf-8')
 
     def read_string_from(self, pos: int) -> str:
         '''Read a string in utf-8 from the a given position'''
+        if self.row_cache is not None:
+            return self.read_cached_string_from(pos)
+
+        if self.string_cache is not None and pos in self.string_cache:
+            self.stats['string_cache_hits'] += 1
+            self.string_cache.move_to_end(pos)
+            return self.string_cache[pos]
+
         self.goto(pos)
-        return self.read_string()
+        stringSize = self.read_integer(2)
+
+        if stringSize >= 0:
+            return self.__read(stringSize).decode('utf-8')
+
+        # Only keep strings that needed to be decompressed
+        string = self.decompress(self.__read(-stringSize)).decode('utf-8')
+        if self.string_cache is not None:
+            self.stats['string_cache_misses'] += 1
+            self.string_cache[pos] = string
+            if len(self.string_cache) > self.string_cache_size:
+                self.string_cache.popitem(last=False)
+
+        return string
+
+    def read_cached_string_from(self, pos: int) -> str:
+        '''Read a string from the row cache, or from the file and keep it with its size in bytes'''
+        found, string = self.row_cache.strings.get(pos)
+        if found:
+            self.stats['string_cache_hits'] += 1
+            return string
+
+        self.stats['string_cache_misses'] += 1
+        self.goto(pos)
+        stringSize = self.read_integer(2)
+        data = self.__read(abs(stringSize))
+        string = (data if stringSize >= 0 else self.decompress(data)).decode('utf-8')
+        self.row_cache.strings.put(pos, string, abs(stringSize) + 2)
+        return string
+
+    def get_string_size_from(self, pos: int) -> int:
+        '''Get the number of bytes taken by the string stored at a given position'''
+        return abs(self.read_integer_from(2, pos)) + 2
     
     def shift_from(self, pos, size):
         '''Insert nul bits from a given position and push all data'''
         self.goto(pos)
         spaceToShift = self.get_size() - pos
-        data = self.__file.read(spaceToShift)
+        data = self.__read(spaceToShift)
         self.goto(pos)
-        self.__file.write(b'\x00' * size)
-        self.__file.write(data)
\ No newline at end of file
+        self.__write(b'\x00' * size)
+        self.__write(data)
+
+        self.stats['shifts'] += 1
+        self.stats['bytes_shifted'] += spaceToShift
\ No newline at end of file
@@ -0,0 +1,106 @@
+from binary import BinaryFile
+from hashlib import blake2b
+
+MIN_CAPACITY = 1024 # Number of values a new filter is sized for
+BITS_PER_VALUE = 10 # With 7 hashes, about 1% of false positives at full capacity
+NB_HASHES = 7
+
+class BloomFilter:
+    def __init__(self, capacity: int, nb_hashes: int = NB_HASHES, count: int = 0, bits: bytearray | None = None):
+        self.capacity = capacity
+        self.nb_bits = self.capacity * BITS_PER_VALUE
+        self.nb_hashes = nb_hashes
+        self.count = count # Number of values added, used to know when the filter is full
+        self.bits = bits if bits is not None else bytearray((self.nb_bits + 7) // 8)
+        self.position = -1 # Position of the filter in its file once written
+
+    def get_bit_positions(self, value: str) -> list[int]:
+        '''
+        Get the position of all bits of a value by double hashing.
+        '''
+        digest = blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first_hash = int.from_bytes(digest[:8], byteorder='little')
+        second_hash = int.from_bytes(digest[8:], byteorder='little') | 1 # Odd, so all positions are different
+
+        return [(first_hash + i * second_hash) % self.nb_bits for i in range(self.nb_hashes)]
+
+    def add(self, value: str) -> list[int]:
+        '''
+        Add a value to the filter and return the index of all bytes that changed.
+        '''
+        changed_bytes = []
+
+        for bit_position in self.get_bit_positions(value):
+            byte_index, bit_index = divmod(bit_position, 8)
+            if not self.bits[byte_index] & (1 << bit_index):
+                self.bits[byte_index] |= 1 << bit_index
+                changed_bytes.append(byte_index)
+
+        self.count += 1
+        return changed_bytes
+
+    def __contains__(self, value: str) -> bool:
+        '''
+        False if the value was never added, True if it was probably added.
+        '''
+        for bit_position in self.get_bit_positions(value):
+            byte_index, bit_index = divmod(bit_position, 8)
+            if not self.bits[byte_index] & (1 << bit_index):
+                return False
+        return True
+
+    @property
+    def is_full(self) -> bool:
+        return self.count > self.capacity
+
+def write_bloom_filters(bloom_file: BinaryFile, bloom_filters: dict[str, BloomFilter]) -> None:
+    '''
+    Write all filters of a table: the number of filters, then for each one its column name,
+    capacity, number of hashes, number of values and bits.
+    '''
+    bloom_file.goto(0)
+    bloom_file.write_integer(len(bloom_filters), 4)
+
+    for column, bloom_filter in bloom_filters.items():
+        bloom_file.write_string(column)
+        bloom_file.write_integer(bloom_filter.capacity, 4)
+        bloom_file.write_integer(bloom_filter.nb_hashes, 1)
+        bloom_filter.position = bloom_file.current_pos
+        bloom_file.write_integer(bloom_filter.count, 4)
+        bloom_file.write_bytes(bytes(bloom_filter.bits))
+
+def read_bloom_filters(bloom_file: BinaryFile) -> dict[str, BloomFilter]:
+    '''
+    Read all filters of a table written by write_bloom_filters.
+    '''
+    bloom_filters = {}
+    nb_filters = bloom_file.read_integer_from(4, 0)
+
+    for _ in range(nb_filters):
+        column = bloom_file.read_string()
+        capacity = bloom_file.read_integer(4)
+        nb_hashes = bloom_file.read_integer(1)
+        position = bloom_file.current_pos
+        count = bloom_file.read_integer(4)
+
+        bloom_filter = BloomFilter(capacity, nb_hashes, count)
+        bloom_filter.bits = bytearray(bloom_file.read_bytes(len(bloom_filter.bits)))
+        bloom_filter.position = position
+        bloom_filters[column] = bloom_filter
+
+    return bloom_filters
+
+def write_bloom_changes(bloom_file: BinaryFile, bloom_filter: BloomFilter, changed_bytes: list[int]) -> None:
+    '''
+    Only write the bytes of a filter that changed by the value just added, and its number of values.
+    Each byte is merged with the one in the file, so the bits set by another database are kept.
+    '''
+    bloom_filter.count = bloom_file.read_integer_from(4, bloom_filter.position) + 1
+    bloom_file.write_integer_to(bloom_filter.count, 4, bloom_filter.position)
+    bits_position = bloom_filter.position + 4
+
+    for byte_index in changed_bytes:
+        bloom_file.goto(bits_position + byte_index)
+        bloom_filter.bits[byte_index] |= bloom_file.read_bytes(1)[0]
+        bloom_file.goto(bits_position + byte_index)
+        bloom_file.write_bytes(bytes([bloom_filter.bits[byte_index]]))
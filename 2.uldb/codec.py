@@ -0,0 +1,75 @@
+from binary import FieldType, TableSignature
+from struct import Struct
+from typing import Iterator
+
+# Struct format of each field type, strings are stored as a pointer
+STRUCT_FORMATS = {
+    FieldType.INTEGER: 'i',
+    FieldType.STRING: 'i',
+    FieldType.INT8: 'b',
+    FieldType.INT16: 'h',
+    FieldType.INT64: 'q',
+    FieldType.BOOL: '?',
+    FieldType.FLOAT64: 'd',
+}
+
+# Struct format of the pointers of a table, by size
+POINTER_FORMATS = {4: 'i', 8: 'q'}
+
+class RowCodec:
+    def __init__(self, entry_signature: TableSignature, pointer_size: int = 4):
+        '''
+        Compile the struct of a whole entry: all its fields, then the pointers to the last and next entries.
+        String pointers and entry pointers take pointer_size bytes.
+        '''
+        self.entry_signature = entry_signature
+        self.field_names = [field[0] for field in entry_signature]
+        self.field_types = [field[1] for field in entry_signature]
+        self.string_indexes = [index for index, field_type in enumerate(self.field_types) if field_type == FieldType.STRING]
+
+        # Little-endian without padding, as entries are written by the database
+        pointer_format = POINTER_FORMATS[pointer_size]
+        field_formats = [pointer_format if field_type == FieldType.STRING else STRUCT_FORMATS[field_type] for field_type in self.field_types]
+        self.struct = Struct('<' + ''.join(field_formats) + pointer_format * 2)
+        self.size = self.struct.size
+        self.fields_struct = Struct('<' + ''.join(field_formats)) # Only the fields, without the pointers to the other entries
+        self.fields_size = self.fields_struct.size
+
+        # Struct and offset of each field alone, to unpack only the fields that are used
+        self.field_indexes = {field_name: index for index, field_name in enumerate(self.field_names)}
+        self.field_structs = [Struct('<' + field_format) for field_format in field_formats]
+        self.field_offsets = [Struct('<' + ''.join(field_formats[:index])).size for index in range(len(field_formats))]
+
+        # Buffer reused to read one entry without creating a bytes object
+        self.buffer = bytearray(self.size)
+        self.view = memoryview(self.buffer)
+
+    def index(self, field_name: str) -> int:
+        '''
+        Get the index of a field in the unpacked values.
+        '''
+        return self.field_names.index(field_name)
+
+    def unpack(self) -> tuple:
+        '''
+        Unpack the entry that was read in the buffer of the codec.
+        '''
+        return self.struct.unpack_from(self.buffer)
+
+    def iter_unpack(self, view: memoryview) -> Iterator[tuple]:
+        '''
+        Unpack entries that follow each other in a buffer.
+        '''
+        return self.struct.iter_unpack(view)
+
+    def unpack_fields(self, data: bytes) -> tuple:
+        '''
+        Unpack the fields of the bytes of an entry read without its pointers.
+        '''
+        return self.fields_struct.unpack_from(data)
+
+    def unpack_field(self, data: bytes, index: int) -> int | float | bool:
+        '''
+        Unpack a single field of the bytes of an entry, a string gives its pointer.
+        '''
+        return self.field_structs[index].unpack_from(data, self.field_offsets[index])[0]
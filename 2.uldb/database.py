@@ -1,164 +1,1621 @@
-from binary import BinaryFile
-from os import makedirs, listdir, remove
-from enum import Enum
+from binary import BinaryFile, MappedFile, FieldType, FIELD_SIZES, COMPRESSION_LEVELS, TableSignature, Field, Entry, new_io_stats, sync_file
+from os import makedirs, listdir, remove, replace
+from os.path import isfile, isdir, getsize
+from mmap import mmap, ACCESS_READ
+from time import perf_counter, time_ns, time, sleep
+from threading import get_ident, RLock, Lock, Timer, local
+from weakref import WeakSet
+from collections import OrderedDict, deque
+from typing import Iterable, Iterator, Callable
+from codec import RowCodec
+from result_cache import ResultCache
+from row_cache import RowCache
+from row import Row
+from lsm import LsmTable, MEMTABLE_SIZE, WAL
+from table_stats import (HyperLogLog, NUMBER_TYPES, STALE_FRACTION, new_column_stats, add_to_column_stats,
+                         build_histogram, save_hll, load_hll, estimate_selectivity, is_comparable)
+from vacuum import VacuumWorker
+from snapshot import copy_directory
+from contextlib import ExitStack, contextmanager
+from text_index import TextIndex, get_like_trigrams, get_trigrams, compile_like, write_postings
+from os import stat
+import re
+from slot_bitmap import is_live, read_slot_bitmap, write_slot_bitmap, write_slot_changes
+from bloom import BloomFilter, MIN_CAPACITY, write_bloom_filters, read_bloom_filters, write_bloom_changes
+from bisect import bisect_right
+from zlib import crc32
+from operator import add, sub, mul
+import json
+import csv
+
+# Types that can be declared for the id column
+ID_TYPES = [FieldType.INT8, FieldType.INT16, FieldType.INTEGER]
+
+# Value of each type used when none is given
+ZERO_VALUES = {
+    FieldType.INTEGER: 0,
+    FieldType.STRING: '',
+    FieldType.INT8: 0,
+    FieldType.INT16: 0,
+    FieldType.INT64: 0,
+    FieldType.BOOL: False,
+    FieldType.FLOAT64: 0.0,
+}
+
+PARTITION_SEPARATOR = '~' # Between the name of a partitioned table and the number of a partition
+PARTITION_KINDS = ['hash', 'range']
+
+VACUUM_DIRECTORY = '.vacuum' # Where background compactions build the new table files
+VACUUM_TABLE = 'compacted' # Name of the copy, any table can be compacted even a partition
+VACUUM_BATCH = 256 # Number of entries copied between two checks of the I/O budget
+
+RUN_LENGTH = 64 # Maximum number of entries read at once when they follow each other in the file
+SNAPSHOT_ATTEMPTS = 3 # Copies of a database made while writes continue, before making them wait
+MAGIC = 0x42444C55 # ULDB in ASCII, at the start of every table file
+LARGE_MAGIC = 0x38444C55 # ULD8 in ASCII, at the start of the table files with 8-byte pointers and ids
+FORMAT_VERSIONS = {MAGIC: 1, LARGE_MAGIC: 2} # Version of the table format of each magic constant
+POINTER_SIZES = {MAGIC: 4, LARGE_MAGIC: 8} # Number of bytes of the pointers and counters of each format
+PLAN_LENGTH = 256 # Number of access paths kept, the oldest ones are forgotten first
+DURABILITY_MODES = ['none', 'per-statement', 'per-transaction'] # Or 'interval(ms)'
+SCAN_CHUNK = 1024 # Number of slots read at once by a scan in physical order, a multiple of 8
+CHANGE_LOG = '.changes.ndjson' # Committed writes of a database, one JSON object per line, read by its followers
+ENGINES = ['lsm'] # Engines a table can be created with instead of the linked entries of its table file
+
+# Operators of the expressions (field, operator, operand) an update can give instead of a value
+UPDATE_OPERATORS = {'+': add, '-': sub, '*': mul}
+Assignment = Field | tuple[str, str, Field]
 
-class FieldType(Enum):
-    INTEGER = 1
-    STRING = 2
+class Database:
+    def __init__(self, name: str, result_cache_size: int = 0, background_vacuum: bool = False,
+                 vacuum_ratio: int = 2, vacuum_io_budget: int | None = None, physical_scan: bool = False,
+                 durability: str = 'none', read_only: bool = False, use_mmap: bool = False, change_log: bool = False,
+                 row_cache_size: int = 0, lazy_rows: bool = False):
+        '''
+        Open the database stored in the given directory.
+        Results of read queries are kept in memory until their table changes if a result_cache_size (in bytes) is given.
+        With a row_cache_size, up to that many decoded entries and strings of each table are kept by their position,
+        until the bytes they were read from are written or another database writes the table (see get_row_cache_stats to size it).
 
-TableSignature = list[tuple[str, FieldType]]
-Field = str | int
-Entry = dict[str, Field]
+        With lazy_rows, get_entry and get_entries give Row objects that only decode the fields that are used,
+        and have to be read before the table is written again.
 
-class Database:
-    def __init__(self, name: str):
+        With physical_scan, full scans read the entry slots in their order in the file instead of following the chain,
+        so entries come in file order and no more in insertion order once deleted slots were reused.
+
+        A table is compacted once it has vacuum_ratio times more slots than entries. With background_vacuum,
+        the compaction runs in a background thread reading and writing at most vacuum_io_budget bytes per second.
+
+        The durability tells when written files are synced to the disk:
+        'none' leaves it to the system, 'per-statement' syncs after each write, 'per-transaction' after each
+        transaction() or write outside of one, and 'interval(ms)' at most ms milliseconds after a write.
+
+        A read_only database opens the files without write access and refuses every change. Its tables can
+        also be read through a read-only memory map shared by all reads with use_mmap.
+
+        With change_log, every write that succeeds is added to a change log in the directory,
+        so that followers (see replication.py) can apply the same writes in the same order.
+        '''
         self.name = name # Initialize name 
-        makedirs(name, exist_ok=True) # Create database directory and do not raise an error if the directory already exists
+        self.read_only = read_only
+        self.use_mmap = use_mmap
+        if read_only:
+            if not isdir(name) or background_vacuum:
+                raise ValueError
+        elif use_mmap:
+            raise ValueError # A written file can't be read through a read-only map
+        else:
+            makedirs(name, exist_ok=True) # Create database directory and do not raise an error if the directory already exists
+        self.reset_stats()
+
+        self.table_options = {} # Options of each table read from its .meta file
+        self.string_caches = {} # Decompressed strings of each table
+        self.row_caches = {} # Decoded entries and strings of each table, with a row_cache_size
+        self.row_cache_versions = {} # Version of each table its row cache was filled at
+        self.row_cache_size = row_cache_size
+        self.lazy_rows = lazy_rows
+        self.bloom_filters = {} # Bloom filters of each table by column
+        self.bloom_versions = {} # Version of each table when its bloom filters were read
+        self.codecs = {} # Codec of each entry signature and thread
+        self.table_stats = {} # Statistics of each table read from its .stats file
+        self.text_indexes = {} # Trigram index of each table read from its .trigram file
+        self.lsm_tables = {} # Memtable and segments of each table created with engine='lsm'
+        self.lsm_lock = Lock() # Held while an LSM table is opened, so its log is read once
+        self.catalog = None # Tables of the directory, partitions included, with their cached information
+        self.catalog_mtime = None # Modification time of the directory when the catalog was read
+        self.physical_scan = physical_scan
+        self.mappings = {} # Size, modification time and memory map of each table file read with use_mmap
+        self.read_versions = {} # Version of each table when its files were last read by a read-only database
+        self.result_cache = ResultCache(result_cache_size) if result_cache_size > 0 else None
+
+        self.write_locks = {} # Lock of each table, held by writes and by the swap of a compacted table
+        self.writes = local() # Depth of the write statements and transactions of each thread
+        self.unsynced_tables = set() # Tables written since the last sync
+        self.sync_lock = Lock()
+        self.sync_timer = None
+        self.change_log = self.name + '/' + CHANGE_LOG if change_log else None
+        self.change_lock = Lock()
+        self.last_change = None # Number of the last change written to the log, read from it the first time
+
+        interval = re.fullmatch(r'interval\((\d+)\)', durability)
+        if durability not in DURABILITY_MODES and interval is None:
+            raise ValueError
+        self.durability = 'interval' if interval else durability
+        self.sync_interval = int(interval.group(1)) / 1000 if interval else None
+
+        self.vacuum_ratio = vacuum_ratio
+        self.vacuum_io_budget = vacuum_io_budget
+        self.vacuum_worker = None
+        if background_vacuum:
+            makedirs(self.name + '/' + VACUUM_DIRECTORY, exist_ok=True)
+            self.vacuum_worker = VacuumWorker(self)
 
     def size_of_int(self, nb_int):
         return nb_int * 4
 
+    def size_of_pointer(self, table_file: BinaryFile) -> int:
+        '''
+        Get the number of bytes of the pointers and counters of a table, 8 in a large-file table and 4 otherwise.
+        '''
+        if table_file.pointer_size is None:
+            self.get_string_header_pointer(table_file)
+        return table_file.pointer_size
+
+    def size_of_field(self, field_type: FieldType, pointer_size: int = 4) -> int:
+        '''
+        Get the number of bytes a field of the given type takes in an entry, a string is a pointer.
+        '''
+        return pointer_size if field_type == FieldType.STRING else FIELD_SIZES[field_type]
+
+    def size_of_fields(self, field_signature: TableSignature, pointer_size: int = 4) -> int:
+        '''
+        Get the number of bytes all given fields take in an entry.
+        '''
+        return sum(self.size_of_field(field[1], pointer_size) for field in field_signature)
+
+    def check_field(self, field_type: FieldType, value: Field) -> None:
+        '''
+        Raise a ValueError if the value can't be stored in a field of the given type.
+        '''
+        if field_type == FieldType.STRING:
+            valid = isinstance(value, str)
+        elif field_type == FieldType.BOOL:
+            valid = isinstance(value, bool)
+        elif field_type == FieldType.FLOAT64:
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+        else:
+            # Signed integer that must fit in the size of the field
+            limit = 2 ** (self.size_of_field(field_type) * 8 - 1)
+            valid = isinstance(value, int) and -limit <= value < limit
+
+        if not valid:
+            raise ValueError
+
+    def normalize_field(self, field_type: FieldType, value: Field) -> Field:
+        '''
+        Convert an int to a float when it's compared with a FLOAT64 field.
+        '''
+        if field_type == FieldType.FLOAT64 and isinstance(value, int) and not isinstance(value, bool):
+            return float(value)
+        return value
+
+    def write_value(self, table_file: BinaryFile, field_type: FieldType, value: Field) -> None:
+        '''
+        Write a field that is not a string to the current position depending on its type.
+        '''
+        if field_type == FieldType.FLOAT64:
+            table_file.write_float(float(value))
+        else:
+            table_file.write_integer(int(value), self.size_of_field(field_type))
+
+    def reset_stats(self) -> None:
+        '''
+        Set all I/O counters, phase timings and access paths back to their initial value.
+        '''
+        self.stats = new_io_stats() | {'entries_visited': 0, 'entries_matched': 0, 'result_cache_hits': 0,
+                                       'row_cache_hits': 0, 'row_cache_misses': 0}
+        self.phases = {}
+        self.plan = deque(maxlen=PLAN_LENGTH) # Bounded, as it's filled by every operation between two resets
+
+    def get_stats(self) -> dict:
+        '''
+        Get a copy of the counters collected since the last reset.
+        '''
+        return self.stats | {'phases': dict(self.phases), 'plan': list(self.plan)}
+
+    def get_row_cache_stats(self) -> dict:
+        '''
+        Get the hits, misses and hit rate of the decoded entries and strings since the last reset,
+        with the number of entries and strings kept for each table.
+        '''
+        row_stats = {}
+        for kind, prefix in [('rows', 'row_cache'), ('strings', 'string_cache')]:
+            hits, misses = self.stats[f'{prefix}_hits'], self.stats[f'{prefix}_misses']
+            row_stats[kind] = {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses) if hits + misses > 0 else 0}
+        row_stats['tables'] = {table_name: {'rows': len(row_cache.rows), 'strings': len(row_cache.strings)}
+                               for table_name, row_cache in self.row_caches.items()}
+        return row_stats
+
+    def add_phase_time(self, phase: str, start: float) -> None:
+        '''
+        Add the time elapsed since start to the given phase.
+        '''
+        self.phases[phase] = self.phases.get(phase, 0) + perf_counter() - start
+
+    def get_access_path(self, table_name: str, field_name: str | None, field_value: Field | None = None) -> str:
+        '''
+        Describe how the entries of a table are reached for a given condition,
+        with the number of matching rows expected if the table was analyzed.
+        '''
+        scan_order = ' in physical order' if self.physical_scan else ''
+        if field_name is None:
+            return f'{table_name}: full scan{scan_order}'
+
+        access_path = f'{table_name}: full scan{scan_order} with filter on {field_name}'
+        if field_name in self.get_bloom_filters(table_name):
+            access_path = f'{table_name}: bloom filter on {field_name}, then full scan{scan_order} with filter on {field_name}'
+
+        estimated_rows = self.estimate_rows(table_name, field_name, field_value)
+        if estimated_rows is not None:
+            access_path += f' (estimated {estimated_rows} rows)'
+        return access_path
+
+    def explain(self, operation: str, *args) -> dict:
+        '''
+        Execute an operation and report its access path, rows examined, I/O counters and time per phase.
+        '''
+        explainable = [
+            'add_entry', 'get_table_size', 'get_complete_table', 'get_entry', 'get_entries',
+            'select_entry', 'select_entries', 'select_page', 'update_entries', 'update_fields', 'delete_entries'
+        ]
+
+        if operation not in explainable:
+            raise ValueError
+
+        self.reset_stats()
+        start = perf_counter()
+        result = getattr(self, operation)(*args)
+
+        report = self.get_stats()
+        report['operation'] = operation
+        report['time'] = perf_counter() - start
+        report['result'] = result
+        return report
+
+    def get_file_name(self, table_name: str, extension: str = 'table') -> str:
+        '''
+        Get the path of a file of the table, the table itself or one of the files beside it.
+        '''
+        return self.name + '/' + table_name + '.' + extension
+
+    def get_catalog(self) -> dict[str, tuple | None]:
+        '''
+        Get the tables of the database directory with their cached information (None until asked).
+        The directory is only listed again if it changed since, by another database for example.
+        '''
+        mtime = stat(self.name).st_mtime_ns
+        if self.catalog is None or mtime != self.catalog_mtime:
+            self.catalog = {
+                file_name[:-len('.table')]: None for file_name in listdir(self.name)
+                if file_name.endswith('.table') and isfile(self.name + '/' + file_name)
+            }
+            self.catalog_mtime = mtime
+        return self.catalog
+
+    def update_catalog(self, table_name: str, exists: bool) -> None:
+        '''
+        Add or remove a table created or deleted by this database, without listing the directory again.
+        '''
+        catalog = self.get_catalog()
+        if exists:
+            catalog[table_name] = None
+        else:
+            catalog.pop(table_name, None)
+
+    def table_exists(self, table_name: str) -> bool:
+        return table_name in self.get_catalog()
+
     def list_tables(self) -> list[str]:
         '''
-        List all file names in the database directory without the extensions.
+        List all table file names in the database directory without the extensions.
+        '''
+
+        # Partitions are only reached through their table
+        return [table_name for table_name in self.get_catalog() if PARTITION_SEPARATOR not in table_name]
+
+    def table_info(self, table_name: str) -> dict:
+        '''
+        Get the number of rows, the size in bytes of the files and the format version of a table.
+        They are kept in the catalog until the table changes.
         '''
+        catalog = self.get_catalog()
+        if table_name not in catalog:
+            raise ValueError
+
+        version = self.get_version(table_name)
+        if catalog[table_name] is None or version is None or catalog[table_name][0] != version:
+            table_names = [table_name] + (self.get_partitions(table_name) if self.is_partitioned(table_name) else [])
+            table_file = self.open_table(table_name, 'r')
+
+            info = {
+                'rows': self.get_table_size(table_name),
+                'size': sum(
+                    getsize(self.name + '/' + file_name) for file_name in listdir(self.name)
+                    if file_name.split('.')[0] in table_names
+                ),
+                'format': FORMAT_VERSIONS.get(table_file.read_integer_from(self.size_of_int(1), 0)),
+                'partitions': len(table_names) - 1,
+            }
+            catalog[table_name] = (version, info)
+
+        return dict(catalog[table_name][1])
+
+    def get_table_options(self, table_name: str) -> dict:
+        '''
+        Get the options given to create the table (empty if there is no .meta file).
+        '''
+        if table_name not in self.table_options:
+            try:
+                with open(self.get_file_name(table_name, 'meta'), 'r') as meta_file:
+                    self.table_options[table_name] = json.load(meta_file)
+            except FileNotFoundError:
+                self.table_options[table_name] = {}
+
+        return self.table_options[table_name]
+
+    def set_table_options(self, table_name: str, options: dict) -> None:
+        '''
+        Save the options of the table in its .meta file.
+        '''
+        with open(self.get_file_name(table_name, 'meta'), 'w') as meta_file:
+            json.dump(options, meta_file)
+
+        self.table_options[table_name] = options
+
+    def get_write_lock(self, table_name: str) -> RLock:
+        return self.write_locks.setdefault(table_name, RLock())
+
+    def check_writable(self) -> None:
+        '''
+        Raise a ValueError if the database was opened read-only.
+        '''
+        if self.read_only:
+            raise ValueError
+
+    @contextmanager
+    def write_statement(self, table_name: str, change: tuple | None = None):
+        '''
+        Hold the write lock of the table while it's written, then sync it to the disk as the durability asks
+        once the outermost statement of the thread is over.
+
+        The change is the operation and the arguments of the statement, added to the change log if it succeeds.
+        Nested statements are not logged, the outermost one gives the same result when it's applied again.
+        '''
+        self.check_writable()
+        with self.get_write_lock(table_name):
+            outermost = getattr(self.writes, 'statements', 0) == 0
+            if outermost:
+                self.writes.files = WeakSet() # Files opened by the statement that are still in use
+            else:
+                self.flush_written_files() # A nested statement opens the tables again with other handles
+            self.writes.statements = getattr(self.writes, 'statements', 0) + 1
+            try:
+                yield
+                # Still under the lock, so the changes of a table are logged in the order they were made
+                if outermost and change is not None and self.change_log is not None:
+                    self.log_change(*change)
+            finally:
+                self.writes.statements -= 1
+                self.flush_written_files()
+                with self.sync_lock:
+                    self.unsynced_tables.add(table_name)
 
-        return [file_name.split('.')[0] for file_name in listdir(self.name)]
+        if self.writes.statements == 0:
+            if self.durability == 'per-statement':
+                self.sync()
+            elif self.durability == 'per-transaction' and getattr(self.writes, 'transactions', 0) == 0:
+                self.sync()
+            elif self.durability == 'interval':
+                self.schedule_sync()
+
+    def log_change(self, operation: str, *args) -> None:
+        '''
+        Add a write to the change log with its number and the time it was made.
+        '''
+        with self.change_lock:
+            if self.last_change is None:
+                self.last_change = self.read_last_change()
+            self.last_change += 1
+
+            # Field types are written as their number
+            change = {'change': self.last_change, 'time': time(), 'operation': operation, 'args': args}
+            with open(self.change_log, 'a', encoding='utf-8') as log_file:
+                log_file.write(json.dumps(change, default=lambda field_type: field_type.value) + '\n')
+
+    def read_last_change(self) -> int:
+        '''
+        Get the number of the last change of the log, 0 if nothing was logged yet.
+        '''
+        if not isfile(self.change_log):
+            return 0
+
+        with open(self.change_log, 'rb') as log_file:
+            lines = log_file.read().splitlines()
+        return json.loads(lines[-1])['change'] if lines else 0
+
+    def flush_written_files(self) -> None:
+        '''
+        Write the buffered data of the files the current statement still uses, the others were flushed when closed.
+        '''
+        for file in list(self.writes.files):
+            if not file.closed:
+                file.flush()
+
+    @contextmanager
+    def transaction(self):
+        '''
+        Group writes so they are synced together at the end with the 'per-transaction' durability.
+        Writes are not undone if the transaction fails, they are only synced.
+        '''
+        self.writes.transactions = getattr(self.writes, 'transactions', 0) + 1
+        try:
+            yield self
+        finally:
+            self.writes.transactions -= 1
+            if self.writes.transactions == 0 and self.durability == 'per-transaction':
+                self.sync()
+
+    def schedule_sync(self) -> None:
+        '''
+        Sync the written tables after the interval of the durability, unless a sync is already planned.
+        '''
+        with self.sync_lock:
+            if self.sync_timer is None:
+                self.sync_timer = Timer(self.sync_interval, self.sync)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+
+    def sync(self) -> None:
+        '''
+        Write to the disk all files of the tables written since the last sync, and the directory for new or removed files.
+        '''
+        with self.sync_lock:
+            tables, self.unsynced_tables = self.unsynced_tables, set()
+            if self.sync_timer is not None:
+                self.sync_timer.cancel()
+                self.sync_timer = None
+
+            if not tables:
+                return
+
+            for file_name in listdir(self.name):
+                if file_name.split('.')[0] in tables and isfile(self.name + '/' + file_name):
+                    sync_file(self.name + '/' + file_name)
+                    self.stats['syncs'] += 1
+            if self.change_log is not None and isfile(self.change_log):
+                sync_file(self.change_log)
+                self.stats['syncs'] += 1
+            sync_file(self.name)
+
+    def get_version(self, table_name: str) -> int | None:
+        '''
+        Get the version of the table, changed by every write (None if the table has no .version file).
+        '''
+        try:
+            with open(self.get_file_name(table_name, 'version'), 'rb') as version_file:
+                version = int.from_bytes(version_file.read(8), byteorder='little')
+        except FileNotFoundError:
+            return None
+
+        # The log of an LSM table grows with every write, the .version file only changes when it's emptied
+        if self.is_lsm(table_name) and isfile(self.get_file_name(table_name, WAL)):
+            version += getsize(self.get_file_name(table_name, WAL))
+        return version
+
+    def set_version(self, table_name: str, version: int) -> None:
+        with open(self.get_file_name(table_name, 'version'), 'wb') as version_file:
+            version_file.write(version.to_bytes(8, byteorder='little'))
+
+    def bump_version(self, table_name: str) -> None:
+        '''
+        Increment the version of the table after a write, so cached results of older versions are never used.
+        '''
+        version = self.get_version(table_name)
+        self.set_version(table_name, time_ns() if version is None else version + 1)
+
+        # The bloom filters and row cache in memory have the changes of this write, they are only dropped after the writes of others
+        for versions in [self.bloom_versions, self.row_cache_versions]:
+            if version is not None and versions.get(table_name) == version:
+                versions[table_name] = version + 1
+
+    def cached(self, table_name: str, query: tuple, compute: Callable):
+        '''
+        Get the result of a read query from the result cache, or compute it and keep it for the current version of the table.
+        '''
+        if self.result_cache is None:
+            return compute()
+
+        version = self.get_version(table_name)
+        key = (table_name, query, version)
+        try:
+            hash(key)
+        except TypeError: # Selected fields given in a list
+            return compute()
+
+        found, result = self.result_cache.get(key)
+        if found:
+            self.stats['result_cache_hits'] += 1
+            self.plan.append(f'{table_name}: result cache')
+            return result
+
+        result = compute()
+        self.result_cache.put(key, result)
+        return result
 
     def open_table(self, table_name, method):
         '''
         Open the table file if it exists, or create a new one if requested.
         '''
 
-        if table_name in self.list_tables() or method == 'x':
+        if self.read_only and self.table_exists(table_name):
+            self.forget_changed_table(table_name)
+            file = self.open_read_only(table_name)
+        elif method == 'x' or self.table_exists(table_name):
             try:
-                file_name = self.name + '/' + table_name + '.table'
-                return BinaryFile(open(file_name, method + '+b'))  # Open file with chosen method
+                file = open(self.get_file_name(table_name), method + '+b') # Open file with chosen method
             except:
                 raise ValueError
+            if getattr(self.writes, 'statements', 0) > 0:
+                self.writes.files.add(file)
         else:
             raise ValueError
-            
-    def create_table(self, table_name: str, *fields: TableSignature) -> None:
+
+        # Strings are compressed only if the table was created with a compression
+        compression = self.get_table_options(table_name).get('compression')
+        string_cache = None
+        if compression is not None:
+            compression = tuple(compression)
+            string_cache = self.string_caches.setdefault(table_name, OrderedDict())
+
+        # Another database may have written the table, the cache is only kept while the version is the same
+        row_cache = None
+        if self.row_cache_size > 0:
+            version = self.get_version(table_name)
+            if self.row_cache_versions.get(table_name, version) != version:
+                self.row_caches.pop(table_name, None)
+            self.row_cache_versions[table_name] = version
+            row_cache = self.row_caches.setdefault(table_name, RowCache(self.row_cache_size))
+
+        return BinaryFile(file, self.stats, compression, string_cache, row_cache) # Share counters between all files
+
+    def forget_changed_table(self, table_name: str) -> None:
         '''
-        Create an empty table file with default headers and pointers.
+        Drop what a read-only database kept in memory about a table changed by another database since it was read.
         '''
+        version = self.get_version(table_name)
+        if self.read_versions.get(table_name, version) != version:
+            for cache in [self.table_options, self.string_caches, self.row_caches, self.bloom_filters, self.table_stats, self.lsm_tables]:
+                cache.pop(table_name, None)
+        self.read_versions[table_name] = version
 
-        pointer_size = self.size_of_int(1) # For readability
-        table_file = self.open_table(table_name, 'x')
-        
-        table_file.write_integer(int(0x42444C55), self.size_of_int(1))  # Write magic constant (ULDB in ASCII)
-        table_file.write_integer(len(fields), self.size_of_int(1)) # Write number of fields
+    def open_read_only(self, table_name: str):
+        '''
+        Open a table file without write access, or read it through its memory map with use_mmap.
+        The map is shared by all reads until the file is changed by another database.
+        '''
+        if not self.use_mmap:
+            return open(self.get_file_name(table_name), 'rb')
+
+        with open(self.get_file_name(table_name), 'rb') as file:
+            file_stat = stat(file.fileno())
+            key = (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+            if table_name not in self.mappings or self.mappings[table_name][0] != key:
+                # The previous map stays valid for the reads still using it
+                self.mappings[table_name] = (key, mmap(file.fileno(), 0, access=ACCESS_READ))
 
-        for field in fields: # Initialize each column
-            table_file.write_integer(field[1].value, 1) # Field type
-            table_file.write_string(field[0]) # Field name
+        return MappedFile(self.mappings[table_name][1])
 
-        file_size = table_file.get_size()
-        size_string_buffer = 16
+    def create_table(self, table_name: str, *fields: TableSignature, compression: str | tuple[str, int] | None = None,
+                     bloom: tuple[str] = (), partition_by: tuple | None = None, text_index: tuple[str] = (),
+                     large_file: bool = False, engine: str | tuple[str, int] | None = None) -> None:
+        '''
+        Create an empty table file with default headers and pointers.
 
-        table_file.write_integer(file_size + pointer_size * 3, pointer_size) # Initialize string buffer pointer
-        table_file.write_integer(file_size + pointer_size * 3, pointer_size) # Initialize next usable space pointer
-        table_file.write_integer(file_size + pointer_size * 3 + size_string_buffer, pointer_size) # Initialize pointer to entry buffer header
+        Strings can be compressed by giving an algorithm ('zlib' or 'lzma') and optionally a level: ('zlib', 9).
+        A bloom filter is kept for each STRING field named in bloom to skip lookups of absent values.
+
+        Entries are spread over several partition files with partition_by=(field, 'hash', nb_partitions)
+        or partition_by=(field, 'range', bounds): bounds [10, 20] gives 3 partitions (< 10, < 20 and the rest).
+        The table file then only keeps the signature and the last id.
+
+        A trigram index is kept for each STRING field named in text_index to search by LIKE pattern or substring.
+
+        A large_file table stores its pointers, counters and ids on 8 bytes instead of 4, so it can grow past 2 GiB.
+        Its magic constant tells it apart from the other tables.
+
+        With engine='lsm' (or ('lsm', memtable_size)), entries are kept by id in a memtable and sorted segment files
+        (see lsm.py) for fast inserts, and the table file only keeps the signature. An entry added with the id
+        of another one replaces it. Such a table can't have other options or schema changes.
+        '''
+        change = ('create_table', table_name, fields, {'compression': compression, 'bloom': bloom,
+                  'partition_by': partition_by, 'text_index': text_index, 'large_file': large_file, 'engine': engine})
+        with self.write_statement(table_name, change):
+
+            magic = LARGE_MAGIC if large_file else MAGIC
+            pointer_size = POINTER_SIZES[magic] # For readability
+            options = {}
+
+            if compression is not None:
+                if isinstance(compression, str):
+                    compression = (compression, COMPRESSION_LEVELS.get(compression))
+
+                algorithm, level = compression
+                if algorithm not in COMPRESSION_LEVELS or not isinstance(level, int) or not 0 <= level <= 9:
+                    raise ValueError
+                options['compression'] = [algorithm, level]
+
+            if bloom:
+                string_fields = [field[0] for field in fields if field[1] == FieldType.STRING]
+                if any(column not in string_fields for column in bloom):
+                    raise ValueError
+                options['bloom'] = list(bloom)
+
+            if text_index:
+                string_fields = [field[0] for field in fields if field[1] == FieldType.STRING]
+                if any(column not in string_fields for column in text_index):
+                    raise ValueError
+                options['text_index'] = list(text_index)
+
+            if engine is not None:
+                if isinstance(engine, str):
+                    engine = (engine, MEMTABLE_SIZE)
+
+                # The other options need the entries in the table file
+                engine_name, memtable_size = engine
+                if engine_name not in ENGINES or not isinstance(memtable_size, int) or memtable_size < 1:
+                    raise ValueError
+                if options or partition_by is not None:
+                    raise ValueError
+                options['engine'] = [engine_name, memtable_size]
+
+            # The id column can only be declared first, with an integer type that fits in the header
+            id_types = ID_TYPES + [FieldType.INT64] if large_file else ID_TYPES
+            for field_index, field in enumerate(fields):
+                if field[0] == 'id' and (field_index != 0 or field[1] not in id_types):
+                    raise ValueError
+
+            # Only partitions of an existing table are named with the separator
+            if PARTITION_SEPARATOR in table_name and not self.is_partitioned(table_name.split(PARTITION_SEPARATOR)[0]):
+                raise ValueError
 
-        table_file.write_integer(0, size_string_buffer) # Allocate space for the string buffer
+            if partition_by is not None:
+                column, kind, spec = partition_by
+                if column != 'id' and column not in [field[0] for field in fields] or kind not in PARTITION_KINDS:
+                    raise ValueError
+                if kind == 'hash' and (not isinstance(spec, int) or spec < 1):
+                    raise ValueError
+                if kind == 'range':
+                    field_type = dict(fields).get(column, self.get_default_id_type({'large_file': large_file}))
+                    for bound in spec:
+                        self.check_field(field_type, bound)
+                    if list(spec) != sorted(spec):
+                        raise ValueError
+                options['partition_by'] = [column, kind, spec if kind == 'hash' else list(spec)]
 
-        table_file.write_integer(0, pointer_size) # Initialize last used ID (0 as default)
-        table_file.write_integer(0, pointer_size) # Initialize number of entries (0 as default)
-        table_file.write_integer(-1, pointer_size) # Initialize pointer to the first entry (-1 as default)
-        table_file.write_integer(-1, pointer_size) # Initialize pointer to the first entry (-1 as default)
-        table_file.write_integer(-1, pointer_size) # Initialize pointer to the first 
+            table_file = self.open_table(table_name, 'x')
+        
+            table_file.write_integer(magic, self.size_of_int(1))  # Write magic constant (ULDB or ULD8 in ASCII)
+            table_file.write_integer(len(fields), self.size_of_int(1)) # Write number of fields
+
+            for field in fields: # Initialize each column
+                table_file.write_integer(field[1].value, 1) # Field type
+                table_file.write_string(field[0]) # Field name
+
+            file_size = table_file.get_size()
+            size_string_buffer = 16
+
+            table_file.write_integer(file_size + pointer_size * 3, pointer_size) # Initialize string buffer pointer
+            table_file.write_integer(file_size + pointer_size * 3, pointer_size) # Initialize next usable space pointer
+            table_file.write_integer(file_size + pointer_size * 3 + size_string_buffer, pointer_size) # Initialize pointer to entry buffer header
+
+            table_file.write_integer(0, size_string_buffer) # Allocate space for the string buffer
+
+            table_file.write_integer(0, pointer_size) # Initialize last used ID (0 as default)
+            table_file.write_integer(0, pointer_size) # Initialize number of entries (0 as default)
+            table_file.write_integer(-1, pointer_size) # Initialize pointer to the first entry (-1 as default)
+            table_file.write_integer(-1, pointer_size) # Initialize pointer to the first entry (-1 as default)
+            table_file.write_integer(-1, pointer_size) # Initialize pointer to the first 
+
+            # A new table starts from the current time so it never reuses the versions of a deleted table
+            self.set_version(table_name, time_ns())
+
+            # Tables without option don't need a .meta file
+            self.table_options.pop(table_name, None)
+            if options:
+                self.set_table_options(table_name, options)
+
+            self.bloom_filters.pop(table_name, None)
+            self.text_indexes.pop(table_name, None)
+            self.lsm_tables.pop(table_name, None)
+            # The bitmap of the live slots is needed by scans in physical order and by text indexes
+            if (self.physical_scan or text_index) and partition_by is None:
+                open(self.get_file_name(table_name, 'slots'), 'wb').close() # No slot yet
+            if partition_by is not None:
+                # Partitions are tables with the same fields and options, their entries get ids from this table
+                for partition_name in self.get_partitions(table_name):
+                    self.create_table(partition_name, *fields, compression=compression, bloom=bloom, text_index=text_index,
+                                      large_file=large_file)
+            elif bloom:
+                self.save_bloom_filters(table_name, {column: BloomFilter(MIN_CAPACITY) for column in bloom})
+
+            self.update_catalog(table_name, True)
 
     def delete_table(self, table_name: str) -> None:
         '''
         Delete the table file if it exists.
         '''
+        with self.write_statement(table_name, ('delete_table', table_name)):
+            partitions = self.get_partitions(table_name) if self.is_partitioned(table_name) else []
+            if table_name in self.lsm_tables:
+                self.lsm_tables.pop(table_name).close()
+
+            try: # Try to delete the file
+                remove(self.get_file_name(table_name))
+            except: # If it doesn't work, that means it doesn't exist
+                raise ValueError
+
+            # Also delete the files beside the table
+            for file_name in listdir(self.name):
+                if file_name.split('.')[0] == table_name:
+                    remove(self.name + '/' + file_name)
+
+            self.table_options.pop(table_name, None)
+            self.string_caches.pop(table_name, None)
+            self.row_caches.pop(table_name, None)
+            self.bloom_filters.pop(table_name, None)
+            self.table_stats.pop(table_name, None)
+            self.text_indexes.pop(table_name, None)
+            if self.result_cache is not None:
+                self.result_cache.drop_table(table_name)
+            self.update_catalog(table_name, False)
+
+            for partition_name in partitions:
+                self.delete_table(partition_name)
+
+    def is_partitioned(self, table_name: str) -> bool:
+        return 'partition_by' in self.get_table_options(table_name)
+
+    def get_partition_index(self, table_name: str, value: Field) -> int:
+        '''
+        Get the number of the partition holding the entries with the given value in the partition field.
+        Raise a ValueError if the value can't be compared with the bounds of a range.
+        '''
+        column, kind, spec = self.get_table_options(table_name)['partition_by']
+
+        if kind == 'range':
+            self.check_field(dict(self.get_row_signature(table_name))[column], value)
+            return bisect_right(spec, value)
+
+        # A stable hash, 1 and 1.0 are in the same partition
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return crc32(repr(value).encode('utf-8')) % spec
+
+    def get_partitions(self, table_name: str, field_name: str | None = None, field_value: Field | None = None) -> list[str]:
+        '''
+        Get the names of the partitions of a table, or only the one that can hold the value
+        if the condition is on the partition field.
+        '''
+        column, kind, spec = self.get_table_options(table_name)['partition_by']
+        nb_partitions = spec if kind == 'hash' else len(spec) + 1
+
+        if field_name == column and field_value is not None:
+            indexes = [self.get_partition_index(table_name, field_value)]
+        else:
+            indexes = range(nb_partitions)
+
+        if field_name is not None:
+            self.plan.append(f'{table_name}: {len(indexes)} of {nb_partitions} partitions')
+        return [f'{table_name}{PARTITION_SEPARATOR}{index}' for index in indexes]
+
+    def add_to_partitions(self, table_name: str, entries: list[Entry]) -> None:
+        '''
+        Add entries that already have an id to the partitions of the table.
+        '''
+        column = self.get_table_options(table_name)['partition_by'][0]
+        partitions = {}
+
+        for entry in entries:
+            partitions.setdefault(self.get_partition_index(table_name, entry[column]), []).append(entry)
+
+        for index, partition_entries in sorted(partitions.items()):
+            self.add_entries(f'{table_name}{PARTITION_SEPARATOR}{index}', partition_entries)
+
+    def add_partitioned_entries(self, table_name: str, entries: list[Entry]) -> None:
+        '''
+        Give ids to new entries from the table file, then add them to their partitions.
+        '''
+        logged_entries = [] # Logged with the ids they were given, so a follower gives the same ones
+        with self.write_statement(table_name, ('add_entries', table_name, logged_entries)):
+            table_file = self.open_table(table_name, 'r')
+            self.check_entries(table_file, self.get_row_signature(table_name), entries)
+
+            entries = [entry | {'id': self.increment_id(table_file, entry)} for entry in entries]
+            table_file.flush()
+            logged_entries.extend(entries)
+
+            self.add_to_partitions(table_name, entries)
+            self.bump_version(table_name)
+            self.note_changes(table_name, len(entries), entries)
+
+    def update_partitioned_entries(self, table_name: str, cond_name: str, cond_value: Field, assignments: dict[str, Assignment]) -> bool:
+        '''
+        Update the entries of the partitions that can meet the condition.
+        An entry whose partition field changes is moved to its new partition.
+        '''
+        with self.write_statement(table_name, ('update_fields', table_name, cond_name, cond_value, assignments)):
+            partitions = self.get_partitions(table_name, cond_name, cond_value)
+            update_status = False
+            nb_updated = 0
+
+            if self.get_table_options(table_name)['partition_by'][0] in assignments:
+                row_signature = dict(self.get_row_signature(table_name))
+                moved_partitions = [
+                    (partition_name, self.get_entries(partition_name, cond_name, cond_value)) for partition_name in partitions
+                ]
+
+                # Nothing is deleted before the new values are known to be valid
+                moved_entries = []
+                for _, entries in moved_partitions:
+                    for entry in entries:
+                        new_values = {field_name: self.evaluate_assignment(assignment, entry) for field_name, assignment in assignments.items()}
+                        for field_name, new_value in new_values.items():
+                            if field_name not in row_signature:
+                                raise ValueError
+                            self.check_field(row_signature[field_name], new_value)
+                        moved_entries.append(entry | new_values)
+
+                for partition_name, entries in moved_partitions:
+                    if entries:
+                        self.delete_entries(partition_name, cond_name, cond_value)
+                self.add_to_partitions(table_name, moved_entries)
+                update_status = len(moved_entries) > 0
+                nb_updated = len(moved_entries)
+            else:
+                for partition_name in partitions:
+                    # Only count the entries if the statistics need it
+                    if self.get_table_stats(table_name) is not None:
+                        nb_updated += len(self.for_entries(partition_name, cond_name, cond_value, lambda *_: None)[0])
+                    update_status = self.update_fields(partition_name, cond_name, cond_value, assignments) or update_status
+
+            if update_status:
+                self.bump_version(table_name)
+                self.note_changes(table_name, nb_updated)
+            return update_status
+
+    def delete_partitioned_entries(self, table_name: str, field_name: str, field_value: Field) -> bool:
+        '''
+        Delete the entries of the partitions that can meet the condition, each partition is compacted on its own.
+        '''
+        with self.write_statement(table_name, ('delete_entries', table_name, field_name, field_value)):
+            size = self.get_table_size(table_name)
+            status = False
+
+            for partition_name in self.get_partitions(table_name, field_name, field_value):
+                status = self.delete_entries(partition_name, field_name, field_value) or status
+
+            if status:
+                nb_deleted = size - self.get_table_size(table_name)
+                self.bump_version(table_name)
+                self.note_changes(table_name, nb_deleted, nb_deleted=nb_deleted)
+            return status
+
+    def is_lsm(self, table_name: str) -> bool:
+        return 'engine' in self.get_table_options(table_name)
+
+    def get_lsm_table(self, table_name: str) -> LsmTable:
+        '''
+        Get the memtable and the segments of a table created with engine='lsm', its log is read the first time.
+        '''
+        with self.lsm_lock:
+            if table_name not in self.lsm_tables:
+                _, memtable_size = self.get_table_options(table_name)['engine']
+                self.lsm_tables[table_name] = LsmTable(self.name + '/' + table_name, self.get_entry_signature(table_name),
+                                                       memtable_size, self.read_only)
+            return self.lsm_tables[table_name]
 
-        try: # Try to delete the file
-            remove(self.name + '/' + table_name + '.table')
-        except: # If it doesn't work, that means it doesn't exist
+    def find_lsm_entries(self, table_name: str, field_name: str, field_value: Field, first: bool = False) -> list[Entry]:
+        '''
+        Get the entries of an LSM table that meet the condition, only the first one with first.
+        A condition on the id is a lookup in the memtable, then in the segments from the newest.
+        '''
+        lsm_table = self.get_lsm_table(table_name)
+        field_types = dict(lsm_table.entry_signature)
+        if field_name not in field_types:
             raise ValueError
+        field_value = self.normalize_field(field_types[field_name], field_value)
+
+        if field_name == 'id':
+            if type(field_value) != int:
+                raise ValueError
+            self.plan.append(f'{table_name}: lookup by id in the memtable and segments')
+            entry = lsm_table.get(field_value)
+            return [] if entry is None else [dict(entry)]
+
+        self.plan.append(f'{table_name}: merged scan of the memtable and segments with filter on {field_name}')
+        entries = []
+        for entry in lsm_table:
+            self.stats['entries_visited'] += 1
+            if type(entry[field_name]) != type(field_value):
+                raise ValueError
+            if entry[field_name] == field_value:
+                self.stats['entries_matched'] += 1
+                entries.append(dict(entry))
+                if first:
+                    break
+        return entries
+
+    def add_lsm_entries(self, table_name: str, entries: list[Entry]) -> None:
+        '''
+        Give ids to new entries and add them all to the memtable with a single append to its log.
+        '''
+        logged_entries = [] # Logged with the ids they were given, so a follower gives the same ones
+        with self.write_statement(table_name, ('add_entries', table_name, logged_entries)):
+            lsm_table = self.get_lsm_table(table_name)
+            entry_signature = lsm_table.entry_signature
+
+            # Check all values before writing anything
+            last_id = lsm_table.last_id
+            new_entries = []
+            for entry in entries:
+                # An entry given with an older id replaces it, the next ids still follow the largest one
+                entry_id = entry['id'] if 'id' in entry else last_id + 1
+                last_id = max(last_id, entry_id)
+                new_entry = {}
+                for field_name, field_type in entry_signature:
+                    if field_name not in entry and field_name != 'id':
+                        raise ValueError
+                    value = entry_id if field_name == 'id' else entry[field_name]
+                    self.check_field(field_type, value)
+                    new_entry[field_name] = self.normalize_field(field_type, value)
+                new_entries.append(new_entry)
+
+            self.plan.append(f'{table_name}: append to the memtable')
+            start = perf_counter()
+            lsm_table.write(new_entries, last_id=last_id)
+            self.flush_lsm_memtable(table_name)
+            self.add_phase_time('write', start)
+            logged_entries.extend(new_entries)
+
+    def update_lsm_entries(self, table_name: str, cond_name: str, cond_value: Field, assignments: dict[str, Assignment]) -> bool:
+        '''
+        Write the new version of the entries that meet the condition, they hide the old ones.
+        '''
+        with self.write_statement(table_name, ('update_fields', table_name, cond_name, cond_value, assignments)):
+            field_types = dict(self.get_lsm_table(table_name).entry_signature)
+            if 'id' in assignments or any(field_name not in field_types for field_name in assignments):
+                raise ValueError
+            if not assignments:
+                return False
+
+            new_entries = []
+            for entry in self.find_lsm_entries(table_name, cond_name, cond_value):
+                new_values = {field_name: self.evaluate_assignment(assignment, entry) for field_name, assignment in assignments.items()}
+                for field_name, new_value in new_values.items():
+                    self.check_field(field_types[field_name], new_value)
+                    new_values[field_name] = self.normalize_field(field_types[field_name], new_value)
+                new_entries.append(entry | new_values)
+
+            if not new_entries:
+                return False
+            self.get_lsm_table(table_name).write(new_entries)
+            self.flush_lsm_memtable(table_name)
+            return True
+
+    def delete_lsm_entries(self, table_name: str, field_name: str, field_value: Field) -> bool:
+        '''
+        Write the deletion of the ids of the entries that meet the condition, the segments are cleaned by compactions.
+        '''
+        with self.write_statement(table_name, ('delete_entries', table_name, field_name, field_value)):
+            deleted_ids = [entry['id'] for entry in self.find_lsm_entries(table_name, field_name, field_value)]
+            if not deleted_ids:
+                return False
+
+            self.get_lsm_table(table_name).write([], deleted_ids)
+            self.flush_lsm_memtable(table_name)
+            return True
+
+    def flush_lsm_memtable(self, table_name: str) -> None:
+        '''
+        Write the memtable of an LSM table to a segment once it's full. The size of the emptied log is added
+        to the .version file, so the version keeps growing without a write of the file for every change.
+        '''
+        lsm_table = self.get_lsm_table(table_name)
+        if lsm_table.is_full():
+            version = self.get_version(table_name)
+            lsm_table.flush_memtable()
+            self.set_version(table_name, version + 1)
+
+    def get_bloom_filters(self, table_name: str) -> dict[str, BloomFilter]:
+        '''
+        Get the bloom filters of a table by column, read from its .bloom file.
+        They are read again once another database wrote the table, as it may have added values.
+        '''
+        if self.read_only:
+            self.forget_changed_table(table_name)
+        version = self.get_version(table_name)
+        if self.bloom_versions.get(table_name, version) != version:
+            self.bloom_filters.pop(table_name, None)
+        if table_name not in self.bloom_filters:
+            if self.get_table_options(table_name).get('bloom'):
+                with open(self.get_file_name(table_name, 'bloom'), 'rb') as file:
+                    self.bloom_filters[table_name] = read_bloom_filters(BinaryFile(file, self.stats))
+            else:
+                self.bloom_filters[table_name] = {}
+            self.bloom_versions[table_name] = version
+
+        return self.bloom_filters[table_name]
+
+    def save_bloom_filters(self, table_name: str, bloom_filters: dict[str, BloomFilter]) -> None:
+        '''
+        Write all bloom filters of a table in its .bloom file.
+        '''
+        with open(self.get_file_name(table_name, 'bloom'), 'wb') as file:
+            write_bloom_filters(BinaryFile(file, self.stats), bloom_filters)
+
+        self.bloom_filters[table_name] = bloom_filters
+        self.bloom_versions[table_name] = self.get_version(table_name)
+
+    def rebuild_bloom_filters(self, table_name: str) -> None:
+        '''
+        Create new bloom filters sized for the table and add the values of all entries.
+        '''
+        columns = list(self.get_bloom_filters(table_name))
+        capacity = max(MIN_CAPACITY, 2 * self.get_table_size(table_name))
+        bloom_filters = {column: BloomFilter(capacity) for column in columns}
+
+        for entry in self.get_complete_table(table_name):
+            for column in columns:
+                bloom_filters[column].add(entry[column])
+
+        self.save_bloom_filters(table_name, bloom_filters)
+
+    def add_to_bloom_filters(self, table_name: str, values: dict[str, list[str]]) -> None:
+        '''
+        Add new values of some columns to their bloom filter, and rebuild the filters if one is full.
+        '''
+        bloom_filters = self.get_bloom_filters(table_name)
+        columns = [column for column in values if column in bloom_filters]
+        if not columns:
+            return
+
+        with open(self.get_file_name(table_name, 'bloom'), 'r+b') as file:
+            bloom_file = BinaryFile(file, self.stats)
+            for column in columns:
+                for value in values[column]:
+                    changed_bytes = bloom_filters[column].add(value)
+                    write_bloom_changes(bloom_file, bloom_filters[column], changed_bytes)
+
+        if any(bloom_filters[column].is_full for column in columns):
+            self.rebuild_bloom_filters(table_name)
+
+    def is_absent(self, table_name: str, field_name: str, field_value: Field) -> bool:
+        '''
+        Tell if a bloom filter proves that no entry has the given value.
+        '''
+        bloom_filter = self.get_bloom_filters(table_name).get(field_name)
+
+        if bloom_filter is not None and isinstance(field_value, str) and field_value not in bloom_filter:
+            self.plan.append(f'{table_name}: bloom filter on {field_name}, value absent')
+            return True
+        return False
         
+    def get_table_stats(self, table_name: str) -> dict | None:
+        '''
+        Get the statistics of the table computed by analyze_table (None if it was never analyzed).
+        '''
+        if table_name not in self.table_stats:
+            try:
+                with open(self.get_file_name(table_name, 'stats'), 'r') as stats_file:
+                    self.table_stats[table_name] = json.load(stats_file)
+            except FileNotFoundError:
+                self.table_stats[table_name] = None
+
+        return self.table_stats[table_name]
+
+    def save_table_stats(self, table_name: str, stats: dict) -> None:
+        with open(self.get_file_name(table_name, 'stats'), 'w') as stats_file:
+            json.dump(stats, stats_file)
+
+        self.table_stats[table_name] = stats
+
+    def analyze_table(self, table_name: str) -> dict:
+        '''
+        Compute the statistics of each column and save them in the .stats file of the table:
+        the number of distinct values (HyperLogLog), the min, the max, the number of null-equivalent
+        values and an equi-depth histogram for number columns.
+        '''
+        self.check_writable()
+        entry_signature = self.get_row_signature(table_name)
+        columns = {field_name: new_column_stats() for field_name, _ in entry_signature}
+        hlls = {field_name: HyperLogLog() for field_name, _ in entry_signature}
+        numbers = {field_name: [] for field_name, field_type in entry_signature if field_type in NUMBER_TYPES}
+        nb_rows = 0
+
+        for entry in self.iter_entries(table_name):
+            nb_rows += 1
+            for field_name, column_stats in columns.items():
+                add_to_column_stats(column_stats, hlls[field_name], entry[field_name])
+                if field_name in numbers:
+                    numbers[field_name].append(entry[field_name])
+
+        for field_name, column_stats in columns.items():
+            save_hll(column_stats, hlls[field_name])
+            if field_name in numbers:
+                column_stats['histogram'] = build_histogram(numbers[field_name])
+
+        table_file = self.open_table(table_name, 'r')
+        stats = {'rows': nb_rows, 'changes': 0, 'bytes': table_file.get_size(), 'columns': columns}
+        self.save_table_stats(table_name, stats)
+        return stats
+
+    def note_changes(self, table_name: str, nb_changed: int, added_entries: list[Entry] = (), nb_deleted: int = 0) -> None:
+        '''
+        Keep the statistics of an analyzed table up to date after a write.
+        New entries are added to the counts, and the table is analyzed again once too many rows changed.
+        '''
+        stats = self.get_table_stats(table_name)
+        if stats is None or nb_changed == 0:
+            return
+
+        stats['changes'] += nb_changed
+        stats['rows'] += len(added_entries) - nb_deleted
+        if stats['changes'] > STALE_FRACTION * max(stats['rows'], 1):
+            self.analyze_table(table_name)
+            return
+
+        for field_name, column_stats in stats['columns'].items():
+            hll = load_hll(column_stats)
+            for entry in added_entries:
+                add_to_column_stats(column_stats, hll, entry[field_name])
+            save_hll(column_stats, hll)
+
+        self.save_table_stats(table_name, stats)
+
+    def estimate_rows(self, table_name: str, field_name: str, field_value: Field) -> int | None:
+        '''
+        Estimate the number of rows where the field is equal to the value (None if the table wasn't analyzed).
+        '''
+        stats = self.get_table_stats(table_name)
+        if stats is None or field_name not in stats['columns'] or field_value is None:
+            return None
+
+        # A value of another type is refused by the query itself
+        if not is_comparable(stats['columns'][field_name], field_value):
+            return None
+
+        return round(estimate_selectivity(stats['columns'][field_name], field_value) * stats['rows'])
+
+    def get_text_index(self, table_name: str, pointer_size: int = 4) -> TextIndex:
+        '''
+        Get the trigram index of a table with the postings written since it was last read, by this database or another one.
+        '''
+        index = self.text_indexes.get(table_name)
+
+        try:
+            with open(self.get_file_name(table_name, 'trigram'), 'rb') as file:
+                file_id = stat(file.fileno()).st_ino
+                if index is None or index.file_id != file_id:
+                    index = TextIndex(pointer_size)
+                    index.file_id = file_id
+                index.read(BinaryFile(file, self.stats))
+        except FileNotFoundError:
+            index = TextIndex(pointer_size)
+
+        self.text_indexes[table_name] = index
+        return index
+
+    def add_text_postings(self, table_name: str, postings: list[tuple[str, int, str]], pointer_size: int = 4) -> None:
+        with open(self.get_file_name(table_name, 'trigram'), 'ab') as file:
+            write_postings(BinaryFile(file, self.stats), postings, pointer_size)
+
+    def create_text_index(self, table_name: str, field_name: str) -> None:
+        '''
+        Add a trigram index on a STRING field of an existing table, with the values of all its entries.
+        '''
+        with self.write_statement(table_name, ('create_text_index', table_name, field_name)):
+            if (field_name, FieldType.STRING) not in self.get_table_signature(table_name) or self.is_lsm(table_name):
+                raise ValueError
+
+            options = self.get_table_options(table_name)
+            if field_name in options.get('text_index', []):
+                return
+
+            if self.is_partitioned(table_name):
+                for partition_name in self.get_partitions(table_name):
+                    self.create_text_index(partition_name, field_name)
+            else:
+                self.check_schema_field(table_name, field_name)
+                table_file = self.open_table(table_name, 'r')
+                codec = self.get_codec(self.get_entry_signature(table_name), self.size_of_pointer(table_file))
+                field_index = codec.index(field_name)
+                entry_buffer = self.get(table_file, 'entry_buffer')
+
+                self.add_text_postings(table_name, [
+                    (field_name, entry_pointer - entry_buffer, table_file.read_string_from(values[field_index]))
+                    for entry_pointer, values in self.iter_values(table_file, codec, self.get(table_file, 'first_entry'))
+                ], self.size_of_pointer(table_file))
+
+            self.set_table_options(table_name, options | {'text_index': options.get('text_index', []) + [field_name]})
+
+    def get_entries_like(self, table_name: str, field_name: str, pattern: str) -> list[Entry]:
+        '''
+        Get all entries where a STRING field matches a LIKE pattern: '%' is any text and '_' any character.
+        '''
+        return self.cached(table_name, ('get_entries_like', field_name, pattern),
+                           lambda: self.search_entries(table_name, field_name, compile_like(pattern).fullmatch, get_like_trigrams(pattern)))
+
+    def get_entries_containing(self, table_name: str, field_name: str, text: str) -> list[Entry]:
+        '''
+        Get all entries where a STRING field contains the text.
+        '''
+        return self.cached(table_name, ('get_entries_containing', field_name, text),
+                           lambda: self.search_entries(table_name, field_name, re.compile(re.escape(text)).search, get_trigrams(text)))
+
+    def search_entries(self, table_name: str, field_name: str, match, trigrams: set[str]) -> list[Entry]:
+        '''
+        Get all entries whose field is matched by the function. With a trigram index on the field,
+        only the entries having all the trigrams are read, and their value is checked in the string buffer.
+        '''
+        if self.is_partitioned(table_name):
+            return [entry for partition_name in self.get_partitions(table_name) for entry in self.search_entries(partition_name, field_name, match, trigrams)]
+        if self.is_lsm(table_name):
+            if (field_name, FieldType.STRING) not in self.get_table_signature(table_name):
+                raise ValueError
+            return [entry for entry in self.iter_entries(table_name) if match(entry[field_name])]
+
+        # An added field has its default value in all entries, even if a field of the same name was dropped before
+        schema = self.get_table_options(table_name).get('schema', {'added': [], 'dropped': []})
+        for added_name, type_value, default in schema['added']:
+            if added_name == field_name:
+                if FieldType(type_value) != FieldType.STRING:
+                    raise ValueError
+                return list(self.iter_entries(table_name)) if match(default) else []
+        if field_name in schema['dropped']:
+            raise ValueError
+
+        start = perf_counter()
+        table_file = self.open_table(table_name, 'r')
+        codec = self.get_codec(self.get_entry_signature(table_name), self.size_of_pointer(table_file))
+        field_index = codec.index(field_name)
+        if codec.field_types[field_index] != FieldType.STRING:
+            raise ValueError
+
+        candidates = None
+        if field_name in self.get_table_options(table_name).get('text_index', []):
+            candidates = self.get_text_index(table_name, self.size_of_pointer(table_file)).get_candidates(field_name, trigrams)
+        self.add_phase_time('open', start)
+
+        start = perf_counter()
+        entries = []
+        if candidates is None:
+            self.plan.append(f'{table_name}: full scan with pattern on {field_name}')
+            entries_values = self.scan_values(table_name, table_file, codec)
+        else:
+            self.plan.append(f'{table_name}: trigram index on {field_name} ({len(candidates)} candidates)')
+            entries_values = self.iter_candidates(table_file, codec, candidates, self.get_slot_bitmap(table_name, table_file, codec))
+
+        for _, values in entries_values:
+            self.stats['entries_visited'] += 1
+            if match(table_file.read_string_from(values[field_index])):
+                self.stats['entries_matched'] += 1
+                entries.append(self.apply_schema(table_name, self.decode_entry(table_file, codec, values)))
+
+        self.add_phase_time('scan', start)
+        return entries
+
+    def iter_candidates(self, table_file: BinaryFile, codec: RowCodec, offsets: set[int], bitmap: bytearray) -> Iterator[tuple[int, tuple]]:
+        '''
+        Give the pointer and the values of the entries at the given offsets of the entry buffer that are still in the table,
+        according to the bitmap of its live slots.
+        '''
+        entry_buffer = self.get(table_file, 'entry_buffer')
+        first_slot = self.get_first_slot(table_file)
+
+        for offset in sorted(offsets):
+            slot, misalignment = divmod(entry_buffer + offset - first_slot, codec.size)
+            if misalignment == 0 and is_live(bitmap, slot):
+                yield first_slot + slot * codec.size, self.read_values(table_file, codec, first_slot + slot * codec.size)
+
     def get_string_header_pointer(self, table_file: BinaryFile):
         '''
         Get the header pointer of the string buffer to retrieve pointers.
         '''
+        # The fields never change, so they are only browsed once per opened file
+        if table_file.string_header_pointer is None:
+            magic = table_file.read_integer_from(self.size_of_int(1), 0)
+            n_field = table_file.read_integer(self.size_of_int(1))
+            if magic not in POINTER_SIZES:
+                raise ValueError
+            table_file.pointer_size = POINTER_SIZES[magic]
+
+            for _ in range(n_field):
+                table_file.read_integer(1)
+                table_file.read_string()
+
+            table_file.string_header_pointer = table_file.current_pos
+
+        return table_file.string_header_pointer
+    
+    def get_pointer(self, table_file: BinaryFile, pointers_name: str | list[str]):
+        '''
+        Powerful function that can retrieve any pointer in the database.
+        '''
+        
+        # Get headers pointers
+        string_header_pointer = self.get_string_header_pointer(table_file)
+        pointer_size = self.size_of_pointer(table_file)
+        entry_header_pointer = table_file.read_integer_from(pointer_size, string_header_pointer + pointer_size * 2)
+
+        # Define all pointer pos
+        pointers = {
+            'first_string': string_header_pointer,
+            'free_string_space': string_header_pointer + pointer_size,
+            'entry_buffer': string_header_pointer + pointer_size * 2,
+
+            'last_id': entry_header_pointer,
+            'nb_entry': entry_header_pointer + pointer_size,
+            'first_entry': entry_header_pointer + pointer_size * 2,
+            'last_entry': entry_header_pointer + pointer_size * 3,
+            'first_deleted_entry': entry_header_pointer + pointer_size * 4,
+        }
+
+        # Return a int or a string depend of the entry
+        if isinstance(pointers_name, str):
+            return pointers[pointers_name]
+        else:
+            return [pointers[name] for name in pointers_name]
+        
+    def get(self, table_file: BinaryFile, pointers_name: str | list[str]):
+        '''
+        Get the value directly from the pointer.
+        '''
+        pointers = self.get_pointer(table_file, pointers_name)
+
+        # Return a int or a string depend of the entry
+        if isinstance(pointers_name, str):
+            return table_file.read_integer_from(self.size_of_pointer(table_file), pointers)
+        else:
+            return [table_file.read_integer_from(self.size_of_pointer(table_file), pointer) for pointer in pointers]
+    
+    def get_table_signature(self, table_name: str) -> TableSignature:
+        '''
+        Get a list of all fields composing an entry, with the changes of the schema that are not written yet.
+        '''
+        table_signature = self.read_table_signature(table_name)
+        schema = self.get_table_options(table_name).get('schema')
+
+        if schema is not None:
+            table_signature = [field for field in table_signature if field[0] not in schema['dropped']]
+            table_signature += [(field_name, FieldType(field_type)) for field_name, field_type, _ in schema['added']]
+
+        return table_signature
+
+    def get_row_signature(self, table_name: str) -> TableSignature:
+        '''
+        Get a list of all fields of the entries as they are given by the database, starting with the id.
+        '''
+        return self.get_entry_signature(table_name)[:1] + self.get_table_signature(table_name)
+
+    def read_table_signature(self, table_name: str) -> TableSignature:
+        '''
+        Get a list of all fields written in the table file.
+        '''
+        table_file = self.open_table(table_name, 'r')
+        
+        table_signature = []
+
         n_field = table_file.read_integer_from(self.size_of_int(1), 4)
 
-        for _ in range(n_field):
-            table_file.read_integer(1)
-            table_file.read_string()
+        for _ in range(n_field): # Browse all field and add propreties to the list
+            cell_type = FieldType(table_file.read_integer(1))
+            cell_name = table_file.read_string()
+            table_signature.append((cell_name, cell_type))
+
+        # A declared id column is not part of the signature
+        if table_signature and table_signature[0][0] == 'id':
+            table_signature.pop(0)
+
+        return table_signature
+
+    def get_entry_signature(self, table_name: str) -> TableSignature:
+        '''
+        Get a list of all fields stored in an entry, starting with the id.
+        '''
+        table_file = self.open_table(table_name, 'r')
+
+        # The id is an INTEGER (INT64 in a large-file table) unless another type was declared first
+        id_type = self.get_default_id_type({'large_file': self.size_of_pointer(table_file) == 8})
+        if table_file.read_integer_from(self.size_of_int(1), 4) > 0:
+            first_type = FieldType(table_file.read_integer(1))
+            if table_file.read_string() == 'id':
+                id_type = first_type
+
+        return [('id', id_type)] + self.read_table_signature(table_name)
+
+    def add_column(self, table_name: str, field_name: str, field_type: FieldType, default: Field | None = None) -> None:
+        '''
+        Add a field to the table without rewriting it: entries have the default value until the table is rewritten,
+        which happens on the first write of another value in this field or on the next compaction.
+        '''
+        with self.write_statement(table_name, ('add_column', table_name, field_name, field_type, default)):
+            if default is None:
+                default = ZERO_VALUES[field_type]
+            self.check_field(field_type, default)
+
+            if field_name in [field[0] for field in self.get_row_signature(table_name)] or self.is_lsm(table_name):
+                raise ValueError
+
+            if self.is_partitioned(table_name):
+                for partition_name in self.get_partitions(table_name):
+                    self.add_column(partition_name, field_name, field_type, default)
+
+            schema = self.get_schema(table_name)
+            schema['added'].append([field_name, field_type.value, self.normalize_field(field_type, default)])
+            self.set_schema(table_name, schema)
+
+    def drop_column(self, table_name: str, field_name: str) -> None:
+        '''
+        Remove a field from the table without rewriting it: its values stay in the file until the table is rewritten.
+        '''
+        with self.write_statement(table_name, ('drop_column', table_name, field_name)):
+            options = self.get_table_options(table_name)
+            if field_name == 'id' or field_name not in [field[0] for field in self.get_table_signature(table_name)]:
+                raise ValueError
+            if field_name == options.get('partition_by', [None])[0] or self.is_lsm(table_name):
+                raise ValueError
+
+            if self.is_partitioned(table_name):
+                for partition_name in self.get_partitions(table_name):
+                    self.drop_column(partition_name, field_name)
+
+            # A field that was only added in the schema is simply forgotten
+            schema = self.get_schema(table_name)
+            added_names = [field[0] for field in schema['added']]
+            if field_name in added_names:
+                schema['added'].pop(added_names.index(field_name))
+            else:
+                schema['dropped'].append(field_name)
+            self.set_schema(table_name, schema)
+
+    def get_schema(self, table_name: str) -> dict:
+        '''
+        Get a copy of the fields added and dropped since the table file was written.
+        '''
+        schema = self.get_table_options(table_name).get('schema', {'added': [], 'dropped': []})
+        return {'added': [list(field) for field in schema['added']], 'dropped': list(schema['dropped'])}
+
+    def set_schema(self, table_name: str, schema: dict) -> None:
+        '''
+        Save the changes of the schema in the .meta file, cached results and statistics are not valid anymore.
+        '''
+        options = {option: value for option, value in self.get_table_options(table_name).items() if option != 'schema'}
+        if schema['added'] or schema['dropped']:
+            options['schema'] = schema
+        self.set_table_options(table_name, options)
+
+        self.bump_version(table_name)
+        if isfile(self.get_file_name(table_name, 'stats')):
+            remove(self.get_file_name(table_name, 'stats'))
+        self.table_stats.pop(table_name, None)
+
+    def apply_schema(self, table_name: str, entry: Entry | None) -> Entry | None:
+        '''
+        Remove the dropped fields of an entry read in the file and give the default value to the added ones.
+        '''
+        schema = self.get_table_options(table_name).get('schema')
+        if schema is None or entry is None:
+            return entry
+
+        if isinstance(entry, Row):
+            entry = dict(entry) # A lazy row can't be changed
+        for field_name in schema['dropped']:
+            entry.pop(field_name, None)
+        for field_name, _, default in schema['added']:
+            entry.setdefault(field_name, default)
+        return entry
+
+    def prepare_entries(self, table_name: str, entries: list[Entry]) -> list[Entry]:
+        '''
+        Get the entries as they are written in the table file: dropped fields get a zero value and added fields
+        are removed. If an added field has another value than its default, the table is rewritten with the new schema first.
+        '''
+        schema = self.get_table_options(table_name).get('schema')
+        if schema is None:
+            return entries
+
+        defaults = {field_name: default for field_name, _, default in schema['added']}
+        if any(entry.get(field_name, default) != default for entry in entries for field_name, default in defaults.items()):
+            self.materialize_schema(table_name)
+            return entries
+
+        field_types = dict(self.get_entry_signature(table_name))
+        zero_values = {field_name: ZERO_VALUES[field_types[field_name]] for field_name in schema['dropped']}
+        return [{field_name: value for field_name, value in entry.items() if field_name not in defaults} | zero_values for entry in entries]
+
+    def match_schema_field(self, table_name: str, field_name: str, field_value: Field) -> bool | None:
+        '''
+        Check a condition on a field added without rewrite: all entries have its default value,
+        so they all match or none does. Return None if the field is in the table file, and refuse dropped fields.
+        A field dropped then added again is an added field.
+        '''
+        schema = self.get_table_options(table_name).get('schema')
+        if schema is None:
+            return None
+
+        for added_name, type_value, default in schema['added']:
+            if added_name == field_name:
+                field_type = FieldType(type_value)
+                self.check_field(field_type, field_value)
+                return self.normalize_field(field_type, default) == self.normalize_field(field_type, field_value)
+        if field_name in schema['dropped']:
+            raise ValueError
+        return None
 
-        return table_file.current_pos
-    
-    def get_pointer(self, table_file: BinaryFile, pointers_name: str | list[str]):
+    def check_schema_field(self, table_name: str, field_name: str) -> None:
         '''
-        Powerful function that can retrieve any pointer in the database.
+        Rewrite the table if an update or an index is on an added field, and refuse dropped fields.
+        Only writes call it, reads use match_schema_field.
         '''
-        
-        # Get headers pointers
-        string_header_pointer = self.get_string_header_pointer(table_file)
-        entry_header_pointer = table_file.read_integer_from(self.size_of_int(1), string_header_pointer + 8)
+        schema = self.get_table_options(table_name).get('schema')
+        if schema is None:
+            return
 
-        # Define all pointer pos
-        pointers = {
-            'first_string': string_header_pointer + self.size_of_int(0),
-            'free_string_space': string_header_pointer + self.size_of_int(1),
-            'entry_buffer': string_header_pointer + self.size_of_int(2),
-
-            'last_id': entry_header_pointer + self.size_of_int(0),
-            'nb_entry': entry_header_pointer + self.size_of_int(1),
-            'first_entry': entry_header_pointer + self.size_of_int(2),
-            'last_entry': entry_header_pointer + self.size_of_int(3),
-            'first_deleted_entry': entry_header_pointer + self.size_of_int(4),
-        }
+        if field_name in [field[0] for field in schema['added']]:
+            self.materialize_schema(table_name)
+        elif field_name in schema['dropped']:
+            raise ValueError
 
-        # Return a int or a string depend of the entry
-        if isinstance(pointers_name, str):
-            return pointers[pointers_name]
-        else:
-            return [pointers[name] for name in pointers_name]
-        
-    def get(self, table_file: BinaryFile, pointers_name: str | list[str]):
+    def materialize_schema(self, table_name: str) -> None:
         '''
-        Get the value directly from the pointer.
+        Rewrite all entries of the table with its current schema.
         '''
-        pointers = self.get_pointer(table_file, pointers_name)
+        start = perf_counter()
+        self.plan.append(f'{table_name}: rewrite with the new schema')
+        self.erase_deleted_entry(table_name)
+        self.add_phase_time('rewrite', start)
 
-        # Return a int or a string depend of the entry
-        if isinstance(pointers_name, str):
-            return table_file.read_integer_from(self.size_of_int(1), pointers)
-        else:
-            return [table_file.read_integer_from(self.size_of_int(1), pointer) for pointer in pointers]
-    
-    def get_table_signature(self, table_name: str) -> TableSignature:
+    def get_default_id_type(self, options: dict) -> FieldType:
         '''
-        Get a list of all fields composing an entry.
+        Get the type of the id column of a table created with the given options when none is declared.
         '''
-        table_file = self.open_table(table_name, 'r')
-        
-        table_signature = []
-
-        n_field = table_file.read_integer_from(self.size_of_int(1), 4)
-
-        for _ in range(n_field): # Browse all field and add propreties to the list
-            cell_type = FieldType(table_file.read_integer(1))
-            cell_name = table_file.read_string()
-            table_signature.append((cell_name, cell_type))
+        return FieldType.INT64 if options.get('large_file') else FieldType.INTEGER
 
-        return table_signature
+    def get_rebuild_options(self, table_name: str, entry_signature: TableSignature) -> dict:
+        '''
+        Get the options to create the table again with the given fields, once the schema changes are written.
+        '''
+        options = {option: value for option, value in self.get_table_options(table_name).items() if option not in ['schema', 'partition_by']}
+        if self.size_of_pointer(self.open_table(table_name, 'r')) == 8:
+            options['large_file'] = True
+        field_names = [field[0] for field in entry_signature]
+        for option in ['bloom', 'text_index']:
+            if option in options:
+                options[option] = [column for column in options[option] if column in field_names]
+        return options
     
-    def scan_strings_entry(self, entry: Entry) -> int:
+    def scan_strings_entry(self, table_file: BinaryFile, entry: Entry, field_signature: TableSignature) -> int:
         '''
-        Return the space this entry will take in the string buffer and a list of all strings to add.
+        Return the space this entry will take in the string buffer and a list of all strings to add, as they are stored.
+        Strings are listed in the order of the signature, which is the order they are written in the entry.
         '''
         string_space = 0
         strings = []
 
-        for info in entry:
-            if isinstance(entry[info], str):
-                string_space += len(entry[info].encode("utf-8")) + 2 # Get the size this string will take in the file
-                strings.append(entry[info])
+        for field_name, field_type in field_signature:
+            if field_type == FieldType.STRING:
+                string = table_file.encode_string(entry[field_name])
+                string_space += len(string) # Get the size this string will take in the file
+                strings.append(string)
 
         return string_space, strings
     
@@ -187,37 +1644,41 @@ class Database:
         '''
         Upgrade the string buffer and apply the shift to all pointers
         '''
+        pointer_size = self.size_of_pointer(table_file)
         free_space_string_buffer_pointerPointer, entry_buffer_pointer  = self.get_pointer(table_file, ['free_string_space', 'entry_buffer'])
-        free_space_string_buffer_pointer = table_file.read_integer_from(self.size_of_int(1), free_space_string_buffer_pointerPointer)
+        free_space_string_buffer_pointer = table_file.read_integer_from(pointer_size, free_space_string_buffer_pointerPointer)
         table_file.shift_from(free_space_string_buffer_pointer, shift)
-        table_file.increment_int_from(shift, self.size_of_int(1), entry_buffer_pointer)
+        table_file.increment_int_from(shift, pointer_size, entry_buffer_pointer)
         
     def upgrade_entry_buffer(self, table_file: BinaryFile, table_name, shift):
         '''
         Upgrade the entry buffer and apply shift to all pointer
         '''
+        pointer_size = self.size_of_pointer(table_file)
         pointers_to_shift = self.get_pointer(table_file, ['first_entry', 'last_entry', 'first_deleted_entry'])
 
         # Shift all pointer of the header
         for pointer in pointers_to_shift:
-            table_file.increment_int_from(shift, self.size_of_int(1), pointer)
+            table_file.increment_int_from(shift, pointer_size, pointer)
 
         # Get the offset of all entry pointer 
-        last_entry_pointer_offset =  self.size_of_int(1 + len(self.get_table_signature(table_name)))
-        next_entry_pointer_offset = self.size_of_int(2 + len(self.get_table_signature(table_name)))
+        last_entry_pointer_offset = self.size_of_fields(self.get_entry_signature(table_name), pointer_size)
+        next_entry_pointer_offset = last_entry_pointer_offset + pointer_size
 
         # Apply the shift to all entry pointer of each list
         entry_pointer, deleted_entry_pointer = self.get(table_file, ['first_entry', 'first_deleted_entry'])
 
         while entry_pointer > 0:
-            table_file.increment_int_from(shift, self.size_of_int(1), entry_pointer + last_entry_pointer_offset)
-            table_file.increment_int_from(shift, self.size_of_int(1), entry_pointer + next_entry_pointer_offset)
-            entry_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointer + next_entry_pointer_offset)
+            self.stats['entries_visited'] += 1
+            table_file.increment_int_from(shift, pointer_size, entry_pointer + last_entry_pointer_offset)
+            table_file.increment_int_from(shift, pointer_size, entry_pointer + next_entry_pointer_offset)
+            entry_pointer = table_file.read_integer_from(pointer_size, entry_pointer + next_entry_pointer_offset)
 
         while deleted_entry_pointer > 0:
-            table_file.increment_int_from(shift, self.size_of_int(1), deleted_entry_pointer + last_entry_pointer_offset)
-            table_file.increment_int_from(shift, self.size_of_int(1), deleted_entry_pointer + next_entry_pointer_offset)
-            deleted_entry_pointer = table_file.read_integer_from(self.size_of_int(1), deleted_entry_pointer + next_entry_pointer_offset)
+            self.stats['entries_visited'] += 1
+            table_file.increment_int_from(shift, pointer_size, deleted_entry_pointer + last_entry_pointer_offset)
+            table_file.increment_int_from(shift, pointer_size, deleted_entry_pointer + next_entry_pointer_offset)
+            deleted_entry_pointer = table_file.read_integer_from(pointer_size, deleted_entry_pointer + next_entry_pointer_offset)
 
     def upgrade_db(self, table_file, table_name, space):
         '''
@@ -225,63 +1686,68 @@ class Database:
         '''
         shift = self.get_string_buffer_shift(table_file, space)
         if shift > 0:
+            start = perf_counter()
             self.upgrade_string_buffer(table_file, shift)
             self.upgrade_entry_buffer(table_file, table_name, shift)
+            self.add_phase_time('buffer_upgrade', start)
 
         return shift
 
-    def insert_strings(self, table_file: BinaryFile, entry_string: list[str], string_space) -> list[int]:
+    def insert_strings(self, table_file: BinaryFile, entry_string: list[bytes], string_space) -> list[int]:
         '''
-        Insert strings into the string buffer and return a list of pointers to all strings.
+        Insert encoded strings into the string buffer and return a list of pointers to all strings.
         '''
+        pointer_size = self.size_of_pointer(table_file)
         free_string_space_pointer = self.get(table_file, 'free_string_space')
         strings_pointer = []
 
         table_file.goto(free_string_space_pointer)
         for string in entry_string:
             strings_pointer.append(table_file.current_pos)
-            table_file.write_string(string)
+            table_file.write_bytes(string)
 
         free_string_space_pointer_pointer = self.get_pointer(table_file, 'free_string_space')
-        table_file.increment_int_from(string_space, self.size_of_int(1), free_string_space_pointer_pointer)
+        table_file.increment_int_from(string_space, pointer_size, free_string_space_pointer_pointer)
 
-        if len(strings_pointer) == 1:
-            return strings_pointer[0]
-        else:
-            return strings_pointer
+        return strings_pointer
     
     def set_new_entry_pointer(self, table_file: BinaryFile, field_signature):
         '''
         Get all entry pointers and set the entry buffer to add a new entry.
         '''
+        pointer_size = self.size_of_pointer(table_file)
         last_entry_pointer, first_deleted_entry_pointer = self.get(table_file, ['last_entry', 'first_deleted_entry'])
-        last_entry_pointer_offset =self.size_of_int(len(field_signature))
-        next_entry_pointer_offset = last_entry_pointer_offset + self.size_of_int(1)
+        last_entry_pointer_offset = self.size_of_fields(field_signature, pointer_size)
+        next_entry_pointer_offset = last_entry_pointer_offset + pointer_size
 
         if first_deleted_entry_pointer > 0:
             # Use a deleted place
             entry_pointer = first_deleted_entry_pointer
 
             last_entry_pointer_pointer = self.get_pointer(table_file, 'last_entry')
-            last_entry_next_entry_pointer_pointer = last_entry_pointer + next_entry_pointer_offset
+            if last_entry_pointer > 0:
+                last_entry_next_entry_pointer_pointer = last_entry_pointer + next_entry_pointer_offset
+            else:
+                # All entries were deleted, the reused place becomes the first one
+                last_entry_next_entry_pointer_pointer = self.get_pointer(table_file, 'first_entry')
             
-            table_file.write_integer_to(entry_pointer, self.size_of_int(1), last_entry_pointer_pointer)
-            table_file.write_integer_to(entry_pointer, self.size_of_int(1), last_entry_next_entry_pointer_pointer)
+            table_file.write_integer_to(entry_pointer, pointer_size, last_entry_pointer_pointer)
+            table_file.write_integer_to(entry_pointer, pointer_size, last_entry_next_entry_pointer_pointer)
 
             # Unlist to the delete entry
-            last_deleted_entry_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointer + last_entry_pointer_offset)
-            next_deleted_entry_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointer + next_entry_pointer_offset)
+            last_deleted_entry_pointer = table_file.read_integer_from(pointer_size, entry_pointer + last_entry_pointer_offset)
+            next_deleted_entry_pointer = table_file.read_integer_from(pointer_size, entry_pointer + next_entry_pointer_offset)
 
             if last_deleted_entry_pointer > 0:
                 last_deleted_next_entry_pointer = last_deleted_entry_pointer + next_entry_pointer_offset
-                table_file.write_integer_to(next_deleted_entry_pointer, self.size_of_int(1), last_deleted_next_entry_pointer)
+                table_file.write_integer_to(next_deleted_entry_pointer, pointer_size, last_deleted_next_entry_pointer)
             else:
                 first_deleted_entry_pointer = self.get_pointer(table_file, 'first_deleted_entry')
-                table_file.write_integer_to(next_deleted_entry_pointer, self.size_of_int(1), first_deleted_entry_pointer)
+                table_file.write_integer_to(next_deleted_entry_pointer, pointer_size, first_deleted_entry_pointer)
 
             if next_deleted_entry_pointer > 0:
                 next_deleted_last_entry_pointer = next_deleted_entry_pointer + last_entry_pointer_offset
-                table_file.write_integer_to(last_deleted_entry_pointer, self.size_of_int(1), next_deleted_last_entry_pointer)
+                table_file.write_integer_to(last_deleted_entry_pointer, pointer_size, next_deleted_last_entry_pointer)
                 
 
         elif last_entry_pointer > 0:
@@ -291,14 +1757,14 @@ class Database:
             last_entry_pointer_pointer = self.get_pointer(table_file, 'last_entry')
             last_entry_next_entry_pointer_pointer = last_entry_pointer + next_entry_pointer_offset
 
-            table_file.write_integer_to(entry_pointer, self.size_of_int(1), last_entry_pointer_pointer)
-            table_file.write_integer_to(entry_pointer, self.size_of_int(1), last_entry_next_entry_pointer_pointer)
+            table_file.write_integer_to(entry_pointer, pointer_size, last_entry_pointer_pointer)
+            table_file.write_integer_to(entry_pointer, pointer_size, last_entry_next_entry_pointer_pointer)
         else:
             # Set the entry buffer header and add a entry at the end of the file
             first_entry_pointer_pointer, last_entry_pointer_pointer = self.get_pointer(table_file, ['first_entry', 'last_entry'])
             entry_pointer = table_file.get_size()
-            table_file.write_integer_to(entry_pointer, self.size_of_int(1), first_entry_pointer_pointer)
-            table_file.write_integer_to(entry_pointer, self.size_of_int(1), last_entry_pointer_pointer)
+            table_file.write_integer_to(entry_pointer, pointer_size, first_entry_pointer_pointer)
+            table_file.write_integer_to(entry_pointer, pointer_size, last_entry_pointer_pointer)
 
         return entry_pointer, last_entry_pointer, -1
     
@@ -306,170 +1772,498 @@ class Database:
         '''
         Increment nb_entry and set the last used id if provided
         '''
+        pointer_size = self.size_of_pointer(table_file)
 
         last_id_pointer, nb_entry_pointer = self.get_pointer(table_file, ['last_id', 'nb_entry'])
 
         if 'id' in entry.keys():
-            table_file.write_integer_to(entry['id'], self.size_of_int(1), last_id_pointer)
+            table_file.write_integer_to(entry['id'], pointer_size, last_id_pointer)
         else:
-            table_file.increment_int_from(1, self.size_of_int(1), last_id_pointer)
+            table_file.increment_int_from(1, pointer_size, last_id_pointer)
 
-        table_file.increment_int_from(1, self.size_of_int(1), nb_entry_pointer)
+        table_file.increment_int_from(1, pointer_size, nb_entry_pointer)
 
         new_id = self.get(table_file, 'last_id')
         return new_id
     
-    def write_entry(self, table_file:BinaryFile, table_name, strings_pointer, entry):
+    def write_entry(self, table_file:BinaryFile, field_signature, strings_pointer, entry):
         '''
         Write an entry to the entry buffer
         '''
-        for field in self.get_table_signature(table_name):
+        for field in field_signature:
             fieldName = field[0]
             fieldType = field[1]
 
             # Depend of the field type
-            if fieldType == FieldType.INTEGER:
-                # Only write the int
-                table_file.write_integer(entry[fieldName], 4)
+            if fieldType != FieldType.STRING:
+                # Only write the value
+                self.write_value(table_file, fieldType, entry[fieldName])
             else:
                 # Write the pointer to the string on the string buffer
                 stringPointer = strings_pointer.pop(0)
-                table_file.write_integer(stringPointer, 4)
+                table_file.write_integer(stringPointer, self.size_of_pointer(table_file))
     
     def add_entry(self, table_name: str, entry: Entry) -> None:
         '''
         Add the specified entry to the database.
         '''
+        self.add_entries(table_name, [entry])
+
+    def check_entries(self, table_file: BinaryFile, entry_signature: TableSignature, entries: list[Entry]) -> None:
+        '''
+        Raise a ValueError if an entry misses a field or has a value that can't be stored.
+        '''
+        last_id = self.get(table_file, 'last_id')
+
+        for entry in entries:
+            for field_name, field_type in entry_signature:
+                if field_name in entry:
+                    self.check_field(field_type, entry[field_name])
+                elif field_name != 'id':
+                    raise ValueError
+
+            # A generated id must also fit in the id column
+            last_id = entry['id'] if 'id' in entry else last_id + 1
+            self.check_field(entry_signature[0][1], last_id)
+
+    def add_entries(self, table_name: str, entries: list[Entry]) -> None:
+        '''
+        Add several entries to the database. The string buffer is upgraded only once for all of them.
+        '''
+        if self.is_partitioned(table_name):
+            return self.add_partitioned_entries(table_name, entries)
+        if self.is_lsm(table_name):
+            return self.add_lsm_entries(table_name, entries)
+
+        logged_entries = [] # Logged with the ids they were given, so a follower gives the same ones
+        with self.write_statement(table_name, ('add_entries', table_name, logged_entries)):
+            given_entries, entries = entries, self.prepare_entries(table_name, entries)
+
+            start = perf_counter()
+            table_file = self.open_table(table_name, 'r')
+            entry_signature = self.get_entry_signature(table_name)
+            self.add_phase_time('open', start)
+
+            # Check all values before writing anything
+            self.check_entries(table_file, entry_signature, entries)
+            self.plan.append(f'{table_name}: append')
+
+            entries_string = [self.scan_strings_entry(table_file, entry, entry_signature) for entry in entries]
+            self.upgrade_db(table_file, table_name, sum(string_space for string_space, _ in entries_string))
+
+            start = perf_counter()
+            entry_ids = []
+            entry_pointers = []
+            for entry, (spaceEntryString, entry_string) in zip(entries, entries_string):
+                entry_id = self.increment_id(table_file, entry)
+                entry_ids.append(entry_id)
+
+                # Add string to string pointer
+                strings_pointer = self.insert_strings(table_file, entry_string, spaceEntryString)
+                entry_pointer, last_entry_pointer, next_entry_pointer = self.set_new_entry_pointer(table_file, entry_signature)
+                entry_pointers.append(entry_pointer)
+
+                # Add entry to entry pointer
+                table_file.goto(entry_pointer)
+                self.write_value(table_file, entry_signature[0][1], entry_id)
+                self.write_entry(table_file, entry_signature[1:], strings_pointer, entry)
+                table_file.write_integer(last_entry_pointer, self.size_of_pointer(table_file))
+                table_file.write_integer(next_entry_pointer, self.size_of_pointer(table_file))
+            self.add_phase_time('write', start)
+            logged_entries.extend(entry | {'id': entry_id} for entry, entry_id in zip(given_entries, entry_ids))
+
+            table_file.flush()
+            self.mark_slots(table_name, table_file, self.get_codec(entry_signature, self.size_of_pointer(table_file)).size, entry_pointers, True)
+            self.bump_version(table_name)
+
+            # The entry buffer doesn't move anymore, so offsets can be computed once
+            text_fields = self.get_table_options(table_name).get('text_index', [])
+            if text_fields:
+                entry_buffer = self.get(table_file, 'entry_buffer')
+                self.add_text_postings(table_name, [
+                    (field_name, entry_pointer - entry_buffer, entry[field_name])
+                    for entry, entry_pointer in zip(entries, entry_pointers) for field_name in text_fields
+                ], self.size_of_pointer(table_file))
+            if self.get_table_stats(table_name) is not None:
+                self.note_changes(table_name, len(entries), [self.apply_schema(table_name, entry | {'id': entry_id}) for entry, entry_id in zip(entries, entry_ids)])
+
+            # Add all new values of each column to the bloom filters at once
+            values = {}
+            for entry in entries:
+                for field_name in self.get_bloom_filters(table_name):
+                    values.setdefault(field_name, []).append(entry[field_name])
+            self.add_to_bloom_filters(table_name, values)
+
+    def convert_field(self, field_type: FieldType, value: Field) -> Field:
+        '''
+        Convert a value read as text from a file to the type of its field.
+        '''
+        if not isinstance(value, str) or field_type == FieldType.STRING:
+            return value
+        elif field_type == FieldType.BOOL:
+            if value.lower() in ['true', '1']:
+                return True
+            elif value.lower() in ['false', '0']:
+                return False
+            raise ValueError
+        elif field_type == FieldType.FLOAT64:
+            return float(value)
+        else:
+            return int(value)
+
+    def import_rows(self, table_name: str, rows: Iterable[dict], batch_size: int) -> tuple[int, float]:
+        '''
+        Convert rows to entries of the table and add them by batches.
+        Return the number of rows imported and the number of rows per second.
+        '''
+        start = perf_counter()
+        field_types = dict(self.get_row_signature(table_name))
+        nb_rows = 0
+        batch = []
 
-        table_file = self.open_table(table_name, 'r')
-        spaceEntryString, entry_string = self.scan_strings_entry(entry)
-        entry_signature = [('id', FieldType.INTEGER)] + self.get_table_signature(table_name)
+        for row in rows:
+            # Every column must be a field of the table
+            if any(field_name not in field_types for field_name in row):
+                raise ValueError
+
+            batch.append({field_name: self.convert_field(field_types[field_name], value) for field_name, value in row.items()})
+
+            if len(batch) == batch_size:
+                self.add_entries(table_name, batch)
+                nb_rows += len(batch)
+                batch = []
+
+        if batch:
+            self.add_entries(table_name, batch)
+            nb_rows += len(batch)
+
+        elapsed_time = perf_counter() - start
+        return nb_rows, nb_rows / elapsed_time if elapsed_time > 0 else 0.0
+
+    def import_csv(self, table_name: str, path: str, batch_size: int = 1000) -> tuple[int, float]:
+        '''
+        Add all rows of a CSV file whose header gives the field names.
+        '''
+        with open(path, 'r', newline='', encoding='utf-8') as csv_file:
+            return self.import_rows(table_name, csv.DictReader(csv_file), batch_size)
+
+    def import_ndjson(self, table_name: str, path: str, batch_size: int = 1000) -> tuple[int, float]:
+        '''
+        Add all rows of a file with one JSON object per line.
+        '''
+        with open(path, 'r', encoding='utf-8') as ndjson_file:
+            rows = (json.loads(line) for line in ndjson_file if line.strip())
+            return self.import_rows(table_name, rows, batch_size)
+
+    def export_csv(self, table_name: str, path: str) -> int:
+        '''
+        Write all entries in a CSV file while browsing the table and return the number of rows.
+        '''
+        field_names = [field[0] for field in self.get_row_signature(table_name)]
+        nb_rows = 0
+
+        with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(field_names)
+
+            for entry in self.iter_entries(table_name):
+                # Booleans are written as they are read back
+                writer.writerow([str(entry[name]).lower() if isinstance(entry[name], bool) else entry[name] for name in field_names])
+                nb_rows += 1
 
-        self.upgrade_db(table_file, table_name, spaceEntryString)
+        return nb_rows
 
-        entry_id = self.increment_id(table_file, entry)
+    def export_ndjson(self, table_name: str, path: str) -> int:
+        '''
+        Write all entries as one JSON object per line while browsing the table and return the number of rows.
+        '''
+        nb_rows = 0
 
-        # Add string to string pointer
-        strings_pointer = self.insert_strings(table_file, entry_string, spaceEntryString)
-        entry_pointer, last_entry_pointer, next_entry_pointer = self.set_new_entry_pointer(table_file, entry_signature)
+        with open(path, 'w', encoding='utf-8') as ndjson_file:
+            for entry in self.iter_entries(table_name):
+                ndjson_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                nb_rows += 1
 
-        # Add entry to entry pointer
-        table_file.write_integer_to(entry_id, self.size_of_int(1), entry_pointer)
-        self.write_entry(table_file, table_name, strings_pointer, entry)
-        table_file.write_integer(last_entry_pointer, self.size_of_int(1))
-        table_file.write_integer(next_entry_pointer, self.size_of_int(1))
+        return nb_rows
 
     def get_table_size(self, table_name: str) -> int:
         '''
         Get the number of entries in the database.
         '''
+        if self.is_partitioned(table_name):
+            return sum(self.get_table_size(partition_name) for partition_name in self.get_partitions(table_name))
+        if self.is_lsm(table_name):
+            return sum(1 for _ in self.get_lsm_table(table_name))
 
         table_file = self.open_table(table_name, 'r')
         return self.get(table_file, 'nb_entry')
 
-    def analyse_entry(self, table_file: BinaryFile, entrySignature, entry_pointer):
+    def get_codec(self, field_signature: TableSignature, pointer_size: int = 4) -> RowCodec:
         '''
-        Read an entry and parse it into a dict
+        Get the codec of an entry signature with pointers of the given size, compiled only once.
+        Each thread has its own codec as the read buffer can't be shared.
+        '''
+        key = (tuple(field_signature), pointer_size, get_ident())
+
+        if key not in self.codecs:
+            self.codecs[key] = RowCodec(field_signature, pointer_size)
+        return self.codecs[key]
+
+    def read_values(self, table_file: BinaryFile, codec: RowCodec, entry_pointer: int) -> tuple:
+        '''
+        Read a whole entry with a single read and unpack all its values, pointers included.
         '''
-        entry = {}
         table_file.goto(entry_pointer)
+        table_file.read_into(codec.view)
+        return codec.unpack()
 
-        # Read all field one by one
-        for field in entrySignature:
-            fieldName = field[0]
-            fieldType = field[1]
+    def iter_values(self, table_file: BinaryFile, codec: RowCodec, entry_pointer: int) -> Iterator[tuple[int, tuple]]:
+        '''
+        Give the pointer and the values of all entries of the chain.
+        Entries that follow each other in the file are read and unpacked together.
+        '''
+        run_buffer = bytearray(codec.size * RUN_LENGTH)
+        run_view = memoryview(run_buffer)
+
+        while entry_pointer > 0:
+            table_file.goto(entry_pointer)
+            nb_bytes = table_file.read_into(run_view)
+            if nb_bytes < codec.size:
+                raise ValueError # The chain points outside of the file
+
+            for values in codec.iter_unpack(run_view[:nb_bytes - nb_bytes % codec.size]):
+                yield entry_pointer, values
+
+                # Stop the run as soon as the next entry is somewhere else
+                next_entry_pointer = values[-1]
+                is_following = next_entry_pointer == entry_pointer + codec.size
+                entry_pointer = next_entry_pointer
+                if not is_following:
+                    break
+
+    def scan_values(self, table_name: str, table_file: BinaryFile, codec: RowCodec) -> Iterator[tuple[int, tuple]]:
+        '''
+        Give the pointer and the values of all entries of the table, in chain or physical order.
+        '''
+        if self.physical_scan:
+            return self.iter_physical_values(table_file, codec, self.get_slot_bitmap(table_name, table_file, codec))
+        return self.iter_values(table_file, codec, self.get(table_file, 'first_entry'))
+
+    def get_first_slot(self, table_file: BinaryFile) -> int:
+        '''
+        Get the pointer of the first slot of the entry buffer, right after the entry header.
+        '''
+        return self.get_pointer(table_file, 'first_deleted_entry') + self.size_of_pointer(table_file)
+
+    def get_slot_bitmap(self, table_name: str, table_file: BinaryFile, codec: RowCodec) -> bytearray:
+        '''
+        Get a bit by slot of the entry buffer, set if the slot holds an entry and not a deleted one.
+        It's read from the .slots file, kept up to date by the writes once it exists.
+        The first time, it's built by following the chain of deleted entries.
+        '''
+        with self.get_write_lock(table_name):
+            try:
+                with open(self.get_file_name(table_name, 'slots'), 'rb') as file:
+                    return read_slot_bitmap(BinaryFile(file, self.stats))
+            except FileNotFoundError:
+                pass
+
+            first_slot = self.get_first_slot(table_file)
+            pointer_size = self.size_of_pointer(table_file)
+            nb_slots = (table_file.get_size() - first_slot) // codec.size
+
+            bitmap = bytearray(b'\xff' * (nb_slots // 8) + bytes([(1 << nb_slots % 8) - 1]))
+            deleted_entry_pointer = self.get(table_file, 'first_deleted_entry')
+            for _ in range(nb_slots): # A chain can't be longer than the number of slots
+                if deleted_entry_pointer <= 0:
+                    break
+                slot = (deleted_entry_pointer - first_slot) // codec.size
+                bitmap[slot >> 3] &= ~(1 << (slot & 7))
+                deleted_entry_pointer = table_file.read_integer_from(pointer_size, deleted_entry_pointer + codec.size - pointer_size)
+
+            if not self.read_only:
+                with open(self.get_file_name(table_name, 'slots'), 'wb') as file:
+                    write_slot_bitmap(BinaryFile(file, self.stats), bitmap)
+            return bitmap
+
+    def mark_slots(self, table_name: str, table_file: BinaryFile, entry_size: int, entry_pointers: list[int], live: bool) -> None:
+        '''
+        Keep the .slots file of the table up to date after entries were written in slots or deleted from them.
+        '''
+        if not entry_pointers or not isfile(self.get_file_name(table_name, 'slots')):
+            return
 
-            # Read field depend of the type
-            if fieldType == FieldType.INTEGER: 
-                # Only read the int
-                entry[fieldName] = table_file.read_integer(4) 
-            else: 
-                # Only read the string on the string buffer
-                stringPointer = table_file.read_integer(4)
-                currentPos = table_file.current_pos
-                entry[fieldName] = table_file.read_string_from(stringPointer)
-                table_file.goto(currentPos)
+        first_slot = self.get_first_slot(table_file)
+        with open(self.get_file_name(table_name, 'slots'), 'r+b') as file:
+            write_slot_changes(BinaryFile(file, self.stats), [(entry_pointer - first_slot) // entry_size for entry_pointer in entry_pointers], live)
 
-        # Skip last entry pointer
-        table_file.read_integer(self.size_of_int(1))
+    def iter_physical_values(self, table_file: BinaryFile, codec: RowCodec, bitmap: bytearray, start_slot: int = 0) -> Iterator[tuple[int, tuple]]:
+        '''
+        Give the pointer and the values of the live slots in file order from start_slot, reading SCAN_CHUNK slots at once.
+        Chunks without any entry are not read, and deleted slots at the edges of a chunk are left out of the read.
+        '''
+        first_slot = self.get_first_slot(table_file)
+        nb_slots = min(len(bitmap) * 8, (table_file.get_size() - first_slot) // codec.size)
+        chunk_buffer = bytearray(codec.size * SCAN_CHUNK)
+        chunk_view = memoryview(chunk_buffer)
+
+        for chunk_start in range(start_slot, nb_slots, SCAN_CHUNK):
+            if not any(bitmap[chunk_start >> 3:((chunk_start + SCAN_CHUNK) >> 3) + 1]):
+                continue
+
+            live_slots = [slot for slot in range(chunk_start, min(chunk_start + SCAN_CHUNK, nb_slots)) if is_live(bitmap, slot)]
+            if not live_slots:
+                continue
+            first, last = live_slots[0], live_slots[-1]
+
+            table_file.goto(first_slot + first * codec.size)
+            nb_bytes = table_file.read_into(chunk_view[:(last - first + 1) * codec.size])
+            if nb_bytes < (last - first + 1) * codec.size:
+                raise ValueError # The table is shorter than its bitmap
+
+            slots_values = codec.iter_unpack(chunk_view[:nb_bytes])
+            live_index = 0
+            for slot, values in zip(range(first, last + 1), slots_values):
+                if slot == live_slots[live_index]:
+                    live_index += 1
+                    yield first_slot + slot * codec.size, values
+
+    def decode_entry(self, table_file: BinaryFile, codec: RowCodec, values: tuple) -> Entry:
+        '''
+        Build the dict of an entry from its values, reading its strings in the string buffer.
+        '''
+        entry = dict(zip(codec.field_names, values))
+
+        for index in codec.string_indexes:
+            entry[codec.field_names[index]] = table_file.read_string_from(values[index])
+
+        return entry
 
-        # Read next entry pointer
-        next_entry_pointer = table_file.read_integer(4)
+    def analyse_entry(self, table_file: BinaryFile, entrySignature, entry_pointer):
+        '''
+        Read an entry and parse it into a dict
+        '''
+        codec = self.get_codec(entrySignature, self.size_of_pointer(table_file))
+        values = self.read_values(table_file, codec, entry_pointer)
 
-        return entry, next_entry_pointer
+        # The last value is the next entry pointer
+        return self.decode_entry(table_file, codec, values), values[-1]
 
     def get_complete_table(self, table_name: str) -> list[Entry]:
         '''
         Get a list of all entries.
         '''
+        return self.cached(table_name, ('get_complete_table',), lambda: list(self.iter_entries(table_name)))
 
-        table_file = self.open_table(table_name, 'r')
-        
-        complete_table = []
-        field_signature = [('id', FieldType.INTEGER)] + self.get_table_signature(table_name)
-        entry_pointer = self.get(table_file, 'first_entry')
+    def iter_entries(self, table_name: str) -> Iterator[Entry]:
+        '''
+        Give all entries one by one while browsing the table, without keeping them in memory.
+        '''
+        if self.is_partitioned(table_name):
+            for partition_name in self.get_partitions(table_name):
+                yield from self.iter_entries(partition_name)
+            return
+        if self.is_lsm(table_name):
+            self.plan.append(f'{table_name}: merged scan of the memtable and segments')
+            for entry in self.get_lsm_table(table_name):
+                self.stats['entries_visited'] += 1
+                yield dict(entry)
+            return
 
-            # Browse all entries in the chain until the end
-        while entry_pointer > 0:
-            entry, entry_pointer = self.analyse_entry(table_file, field_signature, entry_pointer)
-            complete_table.append(entry)
+        start = perf_counter()
+        table_file = self.open_table(table_name, 'r')
         
-        return complete_table
+        codec = self.get_codec(self.get_entry_signature(table_name), self.size_of_pointer(table_file))
+        entries_values = self.scan_values(table_name, table_file, codec)
+        self.add_phase_time('open', start)
+        self.plan.append(self.get_access_path(table_name, None))
+
+        # Browse all entries until the end
+        start = perf_counter()
+        for entry_pointer, values in entries_values:
+            entry = self.apply_schema(table_name, self.decode_entry(table_file, codec, values))
+            self.stats['entries_visited'] += 1
+            self.add_phase_time('scan', start)
+            yield entry
+            start = perf_counter()
     
-    def get_field_offset(self, field_signature, field_name, shallBeList = False):
+    def get_field_offset(self, field_signature, field_name, shallBeList = False, pointer_size = 4):
         '''
         Get the offset of the given field to retrieve its value from an entry.
         '''
         field_offset = []
+        offset = 0
 
-        for field_index, field in enumerate(field_signature):
+        for field in field_signature:
             if field[0] in field_name:
-                field_offset.append((self.size_of_int(field_index), field[1]))
+                field_offset.append((offset, field[1]))
+            offset += self.size_of_field(field[1], pointer_size)
 
         if len(field_offset) == 1 and not shallBeList:
             return field_offset[0]
         else:
             return field_offset
             
-    def read_field(self, table_file: BinaryFile, entry_pointer, field_infos):
+    def get_selection(self, codec: RowCodec, select_fields) -> tuple[RowCodec, list[int]]:
         '''
-        Read a field from an entry depending on whether it's an integer or a string.
+        Get the index of the selected fields in the values of an entry, in the order of the signature.
         '''
-        field_offset, field_type = field_infos
-        
-        if field_type == FieldType.INTEGER:
-            field = table_file.read_integer_from(self.size_of_int(1), entry_pointer + field_offset)
-        else:
-            string_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointer + field_offset)
-            field = table_file.read_string_from(string_pointer)
+        return codec, [index for index, field_name in enumerate(codec.field_names) if field_name in select_fields]
 
-        return field
-            
     def for_entry(self, table_name, field_name, field_value, action, select_fields = None):
         '''
         Execute a function on the selected entry and return the result.
         '''
+        if self.is_partitioned(table_name):
+            for partition_name in self.get_partitions(table_name, field_name, field_value):
+                result = self.for_entry(partition_name, field_name, field_value, action, select_fields)
+                if result is not None:
+                    return result
+            return None
+
+        schema_match = self.match_schema_field(table_name, field_name, field_value)
+        if schema_match is False or (schema_match is None and self.is_absent(table_name, field_name, field_value)):
+            return None
+
+        start = perf_counter()
         table_file = self.open_table(table_name, 'r')
-        field_signature = [('id', FieldType.INTEGER)] + self.get_table_signature(table_name)
+        field_signature = self.get_entry_signature(table_name)
+        codec = self.get_codec(field_signature, self.size_of_pointer(table_file))
         
-        field_info = self.get_field_offset(field_signature, field_name)
-        next_entry_pointer_offset = self.size_of_int(len(field_signature) + 1)
+        # The first entry matches a condition on the default value of an added field
+        field_index = None
+        if schema_match is None:
+            field_index = codec.index(field_name)
+            field_type = codec.field_types[field_index]
+            field_value = self.normalize_field(field_type, field_value)
 
         if select_fields != None:
-            field_signature = self.get_field_offset(field_signature, select_fields, shallBeList = True)
+            field_signature = self.get_selection(codec, select_fields)
 
-        entry_pointer = self.get(table_file, 'first_entry')
+        entries_values = self.scan_values(table_name, table_file, codec)
+        self.add_phase_time('open', start)
+        self.plan.append(self.get_access_path(table_name, field_name, field_value))
 
         # Browse all entry
-        while entry_pointer > 0: 
+        start = perf_counter()
+        for entry_pointer, values in entries_values: 
             # If field match exec the function
-            field = self.read_field(table_file, entry_pointer, field_info)
-
-            if field == field_value:
-                return action(table_file, field_signature, entry_pointer)
-            
-            entry_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointer + next_entry_pointer_offset)
-
+            if field_index is not None:
+                field = values[field_index]
+                if field_type == FieldType.STRING:
+                    field = table_file.read_string_from(field)
+            self.stats['entries_visited'] += 1
+
+            if field_index is None or field == field_value:
+                self.stats['entries_matched'] += 1
+                self.add_phase_time('scan', start)
+
+                start = perf_counter()
+                result = action(table_file, field_signature, entry_pointer)
+                self.add_phase_time('action', start)
+                return result
+
+        self.add_phase_time('scan', start)
         return None
     
     def for_entries(self, table_name, field_name, field_value, action, select_fields = None):
@@ -479,31 +2273,62 @@ class Database:
         action_list = []
         action_status = False
 
+        if self.is_partitioned(table_name):
+            for partition_name in self.get_partitions(table_name, field_name, field_value):
+                partition_list, partition_status = self.for_entries(partition_name, field_name, field_value, action, select_fields)
+                action_list += partition_list
+                action_status = action_status or partition_status
+            return action_list, action_status
+
+        schema_match = self.match_schema_field(table_name, field_name, field_value)
+        if schema_match is False or (schema_match is None and self.is_absent(table_name, field_name, field_value)):
+            return action_list, action_status
+
+        start = perf_counter()
         table_file = self.open_table(table_name, 'r')
-        field_signature = [('id', FieldType.INTEGER)] + self.get_table_signature(table_name)
+        field_signature = self.get_entry_signature(table_name)
+        codec = self.get_codec(field_signature, self.size_of_pointer(table_file))
         
-        field_info = self.get_field_offset(field_signature, field_name)
-        next_entry_pointer_offset = self.size_of_int(len(field_signature) + 1)
+        # All entries match a condition on the default value of an added field
+        field_index = None
+        if schema_match is None:
+            field_index = codec.index(field_name)
+            field_type = codec.field_types[field_index]
+            field_value = self.normalize_field(field_type, field_value)
 
         if select_fields != None:
-            field_signature = self.get_field_offset(field_signature, select_fields, shallBeList = True)
+            field_signature = self.get_selection(codec, select_fields)
 
-        entry_pointer = self.get(table_file, 'first_entry')
+        entries_values = self.scan_values(table_name, table_file, codec)
+        self.add_phase_time('open', start)
+        self.plan.append(self.get_access_path(table_name, field_name, field_value))
 
-        # Browse all entry
-        while entry_pointer > 0: 
+        # Browse all entry, the next entry pointer is read before the action can change it
+        start = perf_counter()
+        action_time = 0
+        for entry_pointer, values in entries_values: 
             # If field match exec the function
-            next_entry_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointer + next_entry_pointer_offset)
-            field = self.read_field(table_file, entry_pointer, field_info)
+            if field_index is not None:
+                field = values[field_index]
+                if field_type == FieldType.STRING:
+                    field = table_file.read_string_from(field)
+            else:
+                field = field_value
+            self.stats['entries_visited'] += 1
 
             if type(field) == type(field_value): 
                 if field == field_value:
+                    self.stats['entries_matched'] += 1
+                    action_start = perf_counter()
                     action_list.append(action(table_file, field_signature, entry_pointer))
+                    action_time += perf_counter() - action_start
                     action_status = True
             else:
                 raise ValueError
 
-            entry_pointer = next_entry_pointer
+        # Time spent in the action is reported apart from the scan
+        self.add_phase_time('scan', start + action_time)
+        self.phases['action'] = self.phases.get('action', 0) + action_time
 
         return action_list, action_status
     
@@ -511,136 +2336,372 @@ class Database:
         '''
         Read all fields of an entry.
         '''
-        entry = {}
-        table_file.goto(entry_pointer)
+        codec = self.get_codec(field_signature, self.size_of_pointer(table_file))
+        if table_file.row_cache is None and not self.lazy_rows:
+            return self.decode_entry(table_file, codec, self.read_values(table_file, codec, entry_pointer))
 
-        for field in field_signature:
-            fieldName = field[0]
-            fieldType = repr(field[1])
-
-            if fieldType == repr(FieldType.INTEGER):
-                entry[fieldName] = table_file.read_integer(self.size_of_int(1))
-            else:
-                string_pointer = table_file.read_integer(self.size_of_int(1))
-                current_field_pointer = table_file.current_pos
-                entry[fieldName] = table_file.read_string_from(string_pointer)
-                table_file.goto(current_field_pointer)
+        # The links to the other entries can change alone, so only the bytes of the fields are kept.
+        # Strings are cached apart by their own position, as they can be overwritten without the entry.
+        found = False
+        if table_file.row_cache is not None:
+            found, data = table_file.row_cache.rows.get(entry_pointer)
+            self.stats['row_cache_hits' if found else 'row_cache_misses'] += 1
+        if not found:
+            table_file.goto(entry_pointer)
+            data = table_file.read_bytes(codec.fields_size)
+            if table_file.row_cache is not None:
+                table_file.row_cache.rows.put(entry_pointer, data, codec.fields_size)
 
-        return entry
+        if self.lazy_rows:
+            return Row(table_file, codec, data)
+        return self.decode_entry(table_file, codec, codec.unpack_fields(data))
 
 
     def get_entry(self, table_name: str, field_name: str, field_value: Field) -> Entry | None:
         '''
         Get all fields of an entry based on specific properties.
         '''
-        return self.for_entry(table_name, field_name, field_value, self.read_entry)
+        if self.is_lsm(table_name):
+            return self.cached(table_name, ('get_entry', field_name, field_value),
+                               lambda: next(iter(self.find_lsm_entries(table_name, field_name, field_value, first=True)), None))
+
+        return self.cached(table_name, ('get_entry', field_name, field_value),
+                           lambda: self.apply_schema(table_name, self.for_entry(table_name, field_name, field_value, self.read_entry)))
     
     def get_entries(self, table_name: str, field_name: str, field_value: Field) -> list[Entry]:
         '''
         Get all fields of all entries based on specific properties.
         '''
-        action_list, _ = self.for_entries(table_name, field_name, field_value, self.read_entry)
-        return action_list
+        if self.is_lsm(table_name):
+            return self.cached(table_name, ('get_entries', field_name, field_value),
+                               lambda: self.find_lsm_entries(table_name, field_name, field_value))
+
+        return self.cached(table_name, ('get_entries', field_name, field_value),
+                           lambda: [self.apply_schema(table_name, entry) for entry in self.for_entries(table_name, field_name, field_value, self.read_entry)[0]])
     
     def read_selection(self, table_file: BinaryFile, selection, entry_pointer):
         '''
         Read selected fields of an entry.
         '''
+        codec, indexes = selection
+        values = self.read_values(table_file, codec, entry_pointer)
         fields = []
 
-        for field in selection:
-            field_offset = field[0]
-            field_type = field[1]
-            
-            if field_type == FieldType.INTEGER: 
-                fields.append(table_file.read_integer_from(self.size_of_int(1), entry_pointer + field_offset))
+        for index in indexes:
+            if codec.field_types[index] != FieldType.STRING: 
+                fields.append(values[index])
             else:
-                string_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointer + field_offset)
-                fields.append(table_file.read_string_from(string_pointer))
+                fields.append(table_file.read_string_from(values[index]))
 
         if len(fields) == 1:
             return fields[0]
         else:
             return tuple(fields)
     
+    def is_schema_selection(self, table_name: str, fields: tuple[str]) -> bool:
+        '''
+        Check if fields added or dropped in the schema are selected, they can't be read from the entries in the file.
+        '''
+        schema = self.get_table_options(table_name).get('schema')
+        if schema is None:
+            return False
+
+        changed_names = [field[0] for field in schema['added']] + schema['dropped']
+        return any(field_name in fields for field_name in changed_names)
+
+    def select_from_entries(self, table_name: str, fields: tuple[str], entries: list[Entry | None]) -> list[Field | tuple[Field]]:
+        '''
+        Keep the selected fields of whole entries, in the order of the signature.
+        '''
+        field_names = [field[0] for field in self.get_row_signature(table_name) if field[0] in fields]
+        selection = []
+
+        for entry in entries:
+            if entry is None:
+                selection.append(None)
+            elif len(field_names) == 1:
+                selection.append(entry[field_names[0]])
+            else:
+                selection.append(tuple(entry[field_name] for field_name in field_names))
+
+        return selection
+
     def select_entry(self, table_name: str, fields: tuple[str], field_name: str, field_value: Field) -> Field | tuple[Field]:
         '''
         Get specific fields of an entry based on given properties.
         '''
-        return self.for_entry(table_name, field_name, field_value, self.read_selection, select_fields = fields)
+        if self.is_schema_selection(table_name, fields) or self.is_lsm(table_name):
+            return self.select_from_entries(table_name, fields, [self.get_entry(table_name, field_name, field_value)])[0]
+
+        return self.cached(table_name, ('select_entry', fields, field_name, field_value),
+                           lambda: self.for_entry(table_name, field_name, field_value, self.read_selection, select_fields = fields))
     
     def select_entries(self, table: str, fields: tuple[str], field_name: str, field_value: Field) -> list[Field | tuple[Field]]:
         '''
         Get specific fields of all entries based on given properties.
         '''
-        action_list, _ =  self.for_entries(table, field_name, field_value, self.read_selection, select_fields = fields)
-        return action_list
+        if self.is_schema_selection(table, fields) or self.is_lsm(table):
+            return self.select_from_entries(table, fields, self.get_entries(table, field_name, field_value))
+
+        return self.cached(table, ('select_entries', fields, field_name, field_value),
+                           lambda: self.for_entries(table, field_name, field_value, self.read_selection, select_fields = fields)[0])
     
-    def update_entries(self, table_str: str, cond_name: str, cond_value: Field, update_name: str, update_value: Field) -> bool:
+    def select_page(self, table_name: str, fields: tuple[str], field_name: str | None, field_value: Field | None,
+                    limit: int, cursor: str | None = None) -> tuple[list[Field | tuple[Field]], str | None]:
         '''
-        Update all entries that meet the given condition with the specified update information.
- 
-        Note: for readability reasons, for_entries() is rewritten within this function.
+        Get specific fields of at most limit entries meeting the condition (all entries if field_name is None),
+        and the cursor to pass back for the next page, None once the last entry was given.
+
+        A page only reads the entries from where the previous one stopped, so deep pages cost as much as the first.
+        The cursor is refused with a ValueError once the table was written, as its entries may have moved.
         '''
-        update_status = False
+        if limit <= 0 or self.is_lsm(table_name):
+            raise ValueError
 
-        table_file = self.open_table(table_str, 'r')
-        field_signature = [('id', FieldType.INTEGER)] + self.get_table_signature(table_str)
-        
-        field_info = self.get_field_offset(field_signature, cond_name)
-        field_to_update_info = self.get_field_offset(field_signature, update_name)
-        
-        next_entry_pointer_offset = self.size_of_int(len(field_signature) + 1)
+        version = self.get_version(table_name)
+        scan_order = 'physical' if self.physical_scan else 'chain'
+        partition_name, offset = None, None
+        if cursor is not None:
+            cursor_version, cursor_order, partition_name, offset = self.decode_cursor(cursor)
+            if cursor_version != version or cursor_order != scan_order:
+                raise ValueError
 
-        entry_pointer = self.get(table_file, 'first_entry')
+        table_names = [table_name]
+        if self.is_partitioned(table_name):
+            table_names = self.get_partitions(table_name, field_name, field_value)
+            if partition_name is not None:
+                table_names = table_names[table_names.index(partition_name):]
 
-        # Browse all entry 
-        while entry_pointer > 0:
-            field = self.read_field(table_file, entry_pointer, field_info)
+        entries = []
+        for name in table_names:
+            page, offset = self.read_page(name, field_name, field_value, limit - len(entries), offset)
+            entries += page
+            if offset is not None:
+                return self.select_from_entries(table_name, fields, entries), self.encode_cursor(version, scan_order, name, offset)
 
-            if field == cond_value:
-                field_offset, field_type = field_to_update_info
-                field_pointer = entry_pointer + field_offset
+        return self.select_from_entries(table_name, fields, entries), None
 
-                if field_type == FieldType.INTEGER:
-                    if isinstance(update_value, int):
-                        table_file.write_integer_to(update_value, self.size_of_int(1), field_pointer)
-                    else:
-                        raise ValueError
-                else:
-                    if isinstance(update_value, str):
-                        string_pointer = table_file.read_integer_from(self.size_of_int(1), field_pointer)
-                        current_string = table_file.read_string_from(string_pointer)
-
-                        if len(current_string) >= len(update_value):
-                            table_file.write_string_to(update_value, string_pointer)
-                        else:
-                            spaceEntryString = len(update_value) + 2
-
-                            shift = self.upgrade_db(table_file, table_str, len(update_value) + 2)
-                            entry_pointer += shift
-                            field_pointer += shift
-
-                            strings_pointer = self.insert_strings(table_file, [update_value], spaceEntryString)
-                            
-                            table_file.write_integer_to(strings_pointer, self.size_of_int(1), field_pointer)
-                    else:
-                        raise ValueError
+    def encode_cursor(self, version: int | None, scan_order: str, table_name: str, offset: int) -> str:
+        '''
+        Make the token of a scan position: the entry (or slot) to resume from, relative to the entry buffer
+        so it stays right when strings are added, with the version of the table it's valid for.
+        '''
+        return json.dumps([version, scan_order, table_name, offset]).encode('utf-8').hex()
+
+    def decode_cursor(self, cursor: str) -> tuple[int | None, str, str, int]:
+        try:
+            version, scan_order, table_name, offset = json.loads(bytes.fromhex(cursor))
+        except (ValueError, TypeError):
+            raise ValueError
+        return version, scan_order, table_name, offset
+
+    def read_page(self, table_name: str, field_name: str | None, field_value: Field | None,
+                  limit: int, offset: int | None) -> tuple[list[Entry], int | None]:
+        '''
+        Read at most limit entries meeting the condition, from the offset in the entry buffer (or the start of the table).
+        Return them with the offset of the next entry to read, None if the table was read until its end.
+        '''
+        schema_match = None
+        if field_name is not None:
+            schema_match = self.match_schema_field(table_name, field_name, field_value)
+            if schema_match is False or (schema_match is None and self.is_absent(table_name, field_name, field_value)):
+                return [], None
+
+        table_file = self.open_table(table_name, 'r')
+        codec = self.get_codec(self.get_entry_signature(table_name), self.size_of_pointer(table_file))
+        entry_buffer = self.get(table_file, 'entry_buffer')
+
+        field_index = None
+        if field_name is not None and schema_match is None:
+            field_index = codec.index(field_name)
+            field_type = codec.field_types[field_index]
+            field_value = self.normalize_field(field_type, field_value)
+
+        if self.physical_scan:
+            bitmap = self.get_slot_bitmap(table_name, table_file, codec)
+            start_slot = 0 if offset is None else (entry_buffer + offset - self.get_first_slot(table_file)) // codec.size
+            entries_values = self.iter_physical_values(table_file, codec, bitmap, start_slot)
+        else:
+            entry_pointer = self.get(table_file, 'first_entry') if offset is None else entry_buffer + offset
+            entries_values = self.iter_values(table_file, codec, entry_pointer)
+        self.plan.append(f'{self.get_access_path(table_name, field_name, field_value)}, page of {limit}')
+
+        entries = []
+        for entry_pointer, values in entries_values:
+            # The entry after a full page is where the next one starts
+            if len(entries) == limit:
+                return entries, entry_pointer - entry_buffer
+            self.stats['entries_visited'] += 1
+
+            if field_index is not None:
+                field = values[field_index]
+                if field_type == FieldType.STRING:
+                    field = table_file.read_string_from(field)
+                if type(field) != type(field_value):
+                    raise ValueError
+                if field != field_value:
+                    continue
+
+            self.stats['entries_matched'] += 1
+            entries.append(self.apply_schema(table_name, self.decode_entry(table_file, codec, values)))
+
+        return entries, None
+
+    def update_entries(self, table_str: str, cond_name: str, cond_value: Field, update_name: str, update_value: Field) -> bool:
+        '''
+        Update all entries that meet the given condition with the specified update information.
+        '''
+        return self.update_fields(table_str, cond_name, cond_value, {update_name: update_value})
 
-                update_status = True
+    def evaluate_assignment(self, assignment: Assignment, entry: dict[str, Field]) -> Field:
+        '''
+        Get the new value of a field, given as is or as an expression (field, operator, operand) of the entry.
+        '''
+        if not isinstance(assignment, tuple):
+            return assignment
 
-            entry_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointer + next_entry_pointer_offset)
+        field_name, operator, operand = assignment
+        if operator not in UPDATE_OPERATORS:
+            raise ValueError
+        try:
+            return UPDATE_OPERATORS[operator](entry[field_name], operand)
+        except TypeError:
+            raise ValueError
 
-        return update_status
+    def update_fields(self, table_str: str, cond_name: str, cond_value: Field, assignments: dict[str, Assignment]) -> bool:
+        '''
+        Update several fields of all entries that meet the given condition in a single scan.
+        A field gets a value, or an expression of the entry such as ('CREDITS', '+', 1) for CREDITS=CREDITS+1.
+
+        All new values are computed and checked before anything is written, so a wrong one changes nothing.
+        Strings that don't fit in the place of the old ones are then added together, with a single shift of the entry buffer.
+        '''
+        if self.is_partitioned(table_str):
+            return self.update_partitioned_entries(table_str, cond_name, cond_value, assignments)
+        if self.is_lsm(table_str):
+            return self.update_lsm_entries(table_str, cond_name, cond_value, assignments)
+
+        with self.write_statement(table_str, ('update_fields', table_str, cond_name, cond_value, assignments)):
+            source_names = {assignment[0] for assignment in assignments.values() if isinstance(assignment, tuple)}
+            text_columns = self.get_table_options(table_str).get('text_index', [])
+
+            for field_name in [cond_name, *assignments, *source_names]:
+                self.check_schema_field(table_str, field_name)
+            if not assignments or self.is_absent(table_str, cond_name, cond_value):
+                return False
+
+            start = perf_counter()
+            table_file = self.open_table(table_str, 'r')
+            field_signature = self.get_entry_signature(table_str)
+            pointer_size = self.size_of_pointer(table_file)
+            codec = self.get_codec(field_signature, pointer_size)
+
+            cond_index = codec.index(cond_name)
+            cond_type = codec.field_types[cond_index]
+            cond_value = self.normalize_field(cond_type, cond_value)
+            field_offsets = {field_name: self.get_field_offset(field_signature, [field_name], True, pointer_size)[0] for field_name in assignments}
+
+            entry_pointer = self.get(table_file, 'first_entry')
+            self.add_phase_time('open', start)
+            self.plan.append(self.get_access_path(table_str, cond_name, cond_value))
+
+            # Compute the writes of all matching entries, and the strings that need a new place
+            start = perf_counter()
+            updates = []
+            new_strings = []
+            while entry_pointer > 0:
+                values = self.read_values(table_file, codec, entry_pointer)
+
+                field = values[cond_index]
+                if cond_type == FieldType.STRING:
+                    field = table_file.read_string_from(field)
+                self.stats['entries_visited'] += 1
+
+                if field == cond_value:
+                    self.stats['entries_matched'] += 1
+                    entry = {}
+                    for field_name in source_names:
+                        index = codec.index(field_name)
+                        entry[field_name] = values[index]
+                        if codec.field_types[index] == FieldType.STRING:
+                            entry[field_name] = table_file.read_string_from(values[index])
+
+                    writes = []
+                    for field_name, assignment in assignments.items():
+                        field_offset, field_type = field_offsets[field_name]
+                        new_value = self.evaluate_assignment(assignment, entry)
+                        self.check_field(field_type, new_value)
+
+                        if field_type != FieldType.STRING:
+                            writes.append((field_name, field_offset, field_type, new_value, None))
+                            continue
+
+                        # Overwrite the current string if the new one fits in its place
+                        string_pointer = values[codec.index(field_name)]
+                        new_string = table_file.encode_string(new_value)
+                        if table_file.get_string_size_from(string_pointer) < len(new_string):
+                            new_strings.append(new_string)
+                            string_pointer = None
+                        writes.append((field_name, field_offset, field_type, new_value, (string_pointer, new_string)))
+
+                    updates.append((entry_pointer, writes))
+
+                entry_pointer = values[-1]
+
+            shift = 0
+            string_pointers = iter([])
+            if new_strings:
+                string_space = sum(len(new_string) for new_string in new_strings)
+                shift = self.upgrade_db(table_file, table_str, string_space)
+                string_pointers = iter(self.insert_strings(table_file, new_strings, string_space))
+
+            # Rewrite the matching entries, moved by the shift of the entry buffer
+            entry_buffer = self.get(table_file, 'entry_buffer')
+            text_postings = []
+            bloom_values = {}
+            for entry_pointer, writes in updates:
+                entry_pointer += shift
+
+                for field_name, field_offset, field_type, new_value, string in writes:
+                    if field_type != FieldType.STRING:
+                        table_file.goto(entry_pointer + field_offset)
+                        self.write_value(table_file, field_type, new_value)
+                        continue
+
+                    string_pointer, new_string = string
+                    if string_pointer is None:
+                        table_file.write_integer_to(next(string_pointers), pointer_size, entry_pointer + field_offset)
+                    else:
+                        table_file.goto(string_pointer)
+                        table_file.write_bytes(new_string)
+
+                    bloom_values.setdefault(field_name, []).append(new_value)
+                    if field_name in text_columns:
+                        text_postings.append((field_name, entry_pointer - entry_buffer, new_value))
+
+            self.add_phase_time('scan', start)
+
+            # The new values may now be found
+            table_file.flush()
+            if updates:
+                self.bump_version(table_str)
+                self.note_changes(table_str, len(updates))
+            if bloom_values:
+                self.add_to_bloom_filters(table_str, bloom_values)
+            if text_postings:
+                self.add_text_postings(table_str, text_postings, pointer_size)
+
+            return len(updates) > 0
     
     def unlist_entry(self, table_file: BinaryFile, pointer_offset, entry_pointers):
         '''
         Edit list pointers to remove an entry from the entry list.
         '''
+        pointer_size = self.size_of_pointer(table_file)
 
         # Get current entry pointers
-        last_entry_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointers["last_entry"])
-        next_entry_pointer = table_file.read_integer_from(self.size_of_int(1), entry_pointers["next_entry"])
+        last_entry_pointer = table_file.read_integer_from(pointer_size, entry_pointers["last_entry"])
+        next_entry_pointer = table_file.read_integer_from(pointer_size, entry_pointers["next_entry"])
 
         # Check if it's a first or last entry and if we need to edit pointer next to this entry or modify the header
         if last_entry_pointer > 0:
@@ -654,71 +2715,73 @@ class Database:
             next_entry_last_entry_pointer = self.get_pointer(table_file, 'last_entry')
 
         # Edit pointer
-        table_file.write_integer_to(next_entry_pointer, self.size_of_int(1), last_entry_next_entry_pointer)
-        table_file.write_integer_to(last_entry_pointer, self.size_of_int(1), next_entry_last_entry_pointer)
+        table_file.write_integer_to(next_entry_pointer, pointer_size, last_entry_next_entry_pointer)
+        table_file.write_integer_to(last_entry_pointer, pointer_size, next_entry_last_entry_pointer)
 
         # Decrement the nb of entry 
         nb_entry_pointer = self.get_pointer(table_file, 'nb_entry')
-        table_file.increment_int_from(-1, self.size_of_int(1), nb_entry_pointer)
+        table_file.increment_int_from(-1, pointer_size, nb_entry_pointer)
 
     def list_to_delet_entry(self, table_file: BinaryFile, entry_pointer, pointer_offset, entry_pointers):
         '''
         Edit list pointers to remove and add the entry to the deleted entry list.
         '''
+        pointer_size = self.size_of_pointer(table_file)
         first_deleted_entry_pointer = self.get_pointer(table_file, 'first_deleted_entry')
-        next_deleted_entry = table_file.read_integer_from(self.size_of_int(1), first_deleted_entry_pointer)
+        next_deleted_entry = table_file.read_integer_from(pointer_size, first_deleted_entry_pointer)
 
-        table_file.write_integer_to(entry_pointer, self.size_of_int(1), first_deleted_entry_pointer)
+        table_file.write_integer_to(entry_pointer, pointer_size, first_deleted_entry_pointer)
 
-        table_file.write_integer_to(-1, self.size_of_int(1), entry_pointers["last_entry"])
-        table_file.write_integer_to(next_deleted_entry, self.size_of_int(1), entry_pointers["next_entry"])
+        table_file.write_integer_to(-1, pointer_size, entry_pointers["last_entry"])
+        table_file.write_integer_to(next_deleted_entry, pointer_size, entry_pointers["next_entry"])
 
         if next_deleted_entry > 0:
             next_deleted_entry_last_entry_pointer = next_deleted_entry + pointer_offset["last_entry"]
-            table_file.write_integer_to(entry_pointer, self.size_of_int(1), next_deleted_entry_last_entry_pointer)
+            table_file.write_integer_to(entry_pointer, pointer_size, next_deleted_entry_last_entry_pointer)
 
     def erase_deleted_entry(self, table_name):
         '''
         Reinsert all entries into a new table to delete all previously deleted entries.
         '''
-        table_signature = self.get_table_signature(table_name)
-        all_entry = [entry for entry in self.get_complete_table(table_name)]
+        entry_signature = self.get_row_signature(table_name)
+        options = self.get_rebuild_options(table_name, entry_signature)
+        version = self.get_version(table_name)
+        stats = self.get_table_stats(table_name)
+        all_entry = [entry for entry in self.iter_entries(table_name)]
 
-        self.delete_table(table_name)
-        self.create_table(table_name, *table_signature)
-        for entry in all_entry:
-            self.add_entry(table_name, entry)
+        # Only keep the id column in the header if it was declared with another type
+        if entry_signature[0][1] == self.get_default_id_type(options):
+            entry_signature.pop(0)
 
-    def delete_entry(self, table_file: BinaryFile, field_signature, entry_pointer):
-        '''
-        Calculate pointer offsets and entry pointers, then remove the entry from the entry list and add it to the deleted entry list.
-        '''
-        pointer_offset = {}
-        pointer_offset["last_entry"] = self.size_of_int(len(field_signature))
-        pointer_offset["next_entry"] = pointer_offset["last_entry"] + self.size_of_int(1)
+        self.delete_table(table_name)
+        self.create_table(table_name, *entry_signature, **options)
+        self.add_entries(table_name, all_entry)
 
-        entry_pointers = {}
-        entry_pointers["last_entry"] = entry_pointer + pointer_offset["last_entry"]
-        entry_pointers["next_entry"] = entry_pointer + pointer_offset["next_entry"]
-        
-        self.unlist_entry(table_file, pointer_offset, entry_pointers)
-        self.list_to_delet_entry(table_file, entry_pointer, pointer_offset, entry_pointers)
+        # Entries scanned in physical order don't end with the largest id, the next ids follow it
+        if all_entry:
+            table_file = self.open_table(table_name, 'r')
+            table_file.write_integer_to(max(entry['id'] for entry in all_entry), self.size_of_pointer(table_file), self.get_pointer(table_file, 'last_id'))
 
+        # The table keeps counting its versions from where it was
+        if version is not None:
+            self.set_version(table_name, version + 1)
 
+        # Removing deleted entries doesn't change the statistics
+        if stats is not None:
+            self.save_table_stats(table_name, stats)
 
-    def delete_entries(self, table_name: str, field_name: str, field_value: Field) -> bool:
+    def needs_vacuum(self, table_name: str) -> bool:
         '''
-        Delete all entries that meet the condition and refactor the file if needed.
+        Check if the entry buffer has vacuum_ratio times more slots than entries.
         '''
-        _, action_status = self.for_entries(table_name, field_name, field_value, self.delete_entry)
-
         table_file = self.open_table(table_name, 'r')
 
-        start_of_entry_buffer = self.get_pointer(table_file, "first_deleted_entry") + self.size_of_int(1)
+        pointer_size = self.size_of_pointer(table_file)
+        start_of_entry_buffer = self.get_pointer(table_file, "first_deleted_entry") + pointer_size
         end_of_entry_buffer = table_file.get_size()
 
         entry_buffer_space = end_of_entry_buffer - start_of_entry_buffer
-        entry_size = self.size_of_int(len(self.get_table_signature(table_name)) + 3)
+        entry_size = self.size_of_fields(self.get_entry_signature(table_name), pointer_size) + pointer_size * 2
 
         nb_entry_rel = self.get(table_file, 'nb_entry')
 
@@ -728,8 +2791,180 @@ class Database:
         else:
             nb_entry = 0
 
-        if nb_entry_rel != 0:
-            if nb_entry // nb_entry_rel >= 2:
-                self.erase_deleted_entry(table_name)
+        return nb_entry_rel != 0 and nb_entry // nb_entry_rel >= self.vacuum_ratio
+
+    def vacuum_table(self, table_name: str) -> bool:
+        '''
+        Compact a copy of the table in the .vacuum directory, then swap it with the table if nothing was written meanwhile.
+        Reads and writes are throttled to vacuum_io_budget bytes per second if it's given.
+        Return False if the table changed during the compaction.
+        '''
+        self.check_writable()
+
+        # Own caches and counters, as it runs beside the other operations
+        source = Database(self.name)
+        copy = Database(self.name + '/' + VACUUM_DIRECTORY)
+
+        version = source.get_version(table_name)
+        entry_signature = source.get_row_signature(table_name)
+        options = source.get_rebuild_options(table_name, entry_signature)
+        if entry_signature[0][1] == source.get_default_id_type(options):
+            entry_signature.pop(0)
+
+        for file_name in listdir(copy.name): # Left by an interrupted compaction
+            remove(copy.name + '/' + file_name)
+        copy.create_table(VACUUM_TABLE, *entry_signature, **options)
+
+        start = perf_counter()
+        batch = []
+        for entry in source.iter_entries(table_name):
+            batch.append(entry)
+            if len(batch) == VACUUM_BATCH:
+                copy.add_entries(VACUUM_TABLE, batch)
+                batch = []
+                self.throttle_vacuum(start, source.stats, copy.stats)
+        if batch:
+            copy.add_entries(VACUUM_TABLE, batch)
+
+        with self.write_statement(table_name):
+            swapped = self.get_version(table_name) == version
+            if swapped:
+                replace(copy.get_file_name(VACUUM_TABLE), self.get_file_name(table_name))
+                self.bump_version(table_name)
+
+                # The entries moved, so the trigram index of the copy replaces the old one
+                if isfile(copy.get_file_name(VACUUM_TABLE, 'trigram')):
+                    replace(copy.get_file_name(VACUUM_TABLE, 'trigram'), self.get_file_name(table_name, 'trigram'))
+                elif isfile(self.get_file_name(table_name, 'trigram')):
+                    remove(self.get_file_name(table_name, 'trigram'))
+
+                # The slots moved too, the bitmap is built again by the next scan in physical order
+                if isfile(self.get_file_name(table_name, 'slots')):
+                    remove(self.get_file_name(table_name, 'slots'))
+
+                # The schema changes are now written in the table file
+                if 'schema' in self.get_table_options(table_name):
+                    self.set_table_options(table_name, options)
+                self.string_caches.pop(table_name, None) # Strings are not at the same position anymore
+                self.row_caches.pop(table_name, None)
+
+        for file_name in listdir(copy.name):
+            remove(copy.name + '/' + file_name)
+
+        return swapped
+
+    def throttle_vacuum(self, start: float, *stats: dict[str, int]) -> None:
+        '''
+        Sleep until the bytes read and written since start fit in the I/O budget of the compaction.
+        '''
+        if self.vacuum_io_budget is None:
+            return
+
+        nb_bytes = sum(io_stats['bytes_read'] + io_stats['bytes_written'] for io_stats in stats)
+        delay = nb_bytes / self.vacuum_io_budget - (perf_counter() - start)
+        if delay > 0:
+            sleep(delay)
+
+    def wait_for_vacuum(self, timeout: float | None = None) -> bool:
+        '''
+        Wait for the background compactions to end. Return False if the timeout is over first.
+        '''
+        if self.vacuum_worker is None:
+            return True
+        return self.vacuum_worker.wait(timeout)
+
+    def close(self) -> None:
+        '''
+        Stop the background compactions, the running one is finished first, and sync the last writes.
+        '''
+        if self.vacuum_worker is not None:
+            self.vacuum_worker.stop()
+        for lsm_table in list(self.lsm_tables.values()):
+            lsm_table.close()
+        self.lsm_tables.clear() # Opened again with their log by the next write
+        if self.durability != 'none':
+            self.sync()
+
+    def snapshot(self, destination: str, reflink: bool = True) -> dict:
+        '''
+        Copy the database at a point in time in the destination directory while writes continue.
+        Files are cloned if the file system supports it, or else only their blocks that changed since
+        the previous snapshot in the same destination are written.
+        The copy is made again if a table was written meanwhile, and the last attempt makes the writes wait.
+        Return the number of files, the number of bytes copied, the method used and the number of attempts.
+        '''
+        makedirs(destination, exist_ok=True)
+
+        for attempt in range(1, SNAPSHOT_ATTEMPTS + 1):
+            versions = self.get_table_versions()
+            with ExitStack() as locks:
+                if attempt == SNAPSHOT_ATTEMPTS:
+                    self.lock_tables(locks, versions)
+                report = copy_directory(self.name, destination, reflink) | {'attempts': attempt}
+
+                # The copy is consistent if no write happened since the versions were read
+                self.lock_tables(locks, versions)
+                if self.get_table_versions() == versions:
+                    return report
+
+    def get_table_versions(self) -> dict[str, int | None]:
+        '''
+        Get the version of every table of the database, partitions included.
+        '''
+        table_names = [file_name.split('.')[0] for file_name in listdir(self.name) if file_name.endswith('.table')]
+        return {table_name: self.get_version(table_name) for table_name in table_names}
+
+    def lock_tables(self, locks: ExitStack, table_names: Iterable[str]) -> None:
+        '''
+        Take the write locks of the tables, always in the same order: a partitioned table before its partitions.
+        '''
+        for table_name in sorted(table_names):
+            locks.enter_context(self.get_write_lock(table_name))
+
+    def delete_entry(self, table_file: BinaryFile, field_signature, entry_pointer):
+        '''
+        Calculate pointer offsets and entry pointers, then remove the entry from the entry list and add it to the deleted entry list.
+        '''
+        pointer_size = self.size_of_pointer(table_file)
+        pointer_offset = {}
+        pointer_offset["last_entry"] = self.size_of_fields(field_signature, pointer_size)
+        pointer_offset["next_entry"] = pointer_offset["last_entry"] + pointer_size
+
+        entry_pointers = {}
+        entry_pointers["last_entry"] = entry_pointer + pointer_offset["last_entry"]
+        entry_pointers["next_entry"] = entry_pointer + pointer_offset["next_entry"]
+        
+        self.unlist_entry(table_file, pointer_offset, entry_pointers)
+        self.list_to_delet_entry(table_file, entry_pointer, pointer_offset, entry_pointers)
+        return entry_pointer
+
+
+
+    def delete_entries(self, table_name: str, field_name: str, field_value: Field) -> bool:
+        '''
+        Delete all entries that meet the condition and refactor the file if needed.
+        '''
+        if self.is_partitioned(table_name):
+            return self.delete_partitioned_entries(table_name, field_name, field_value)
+        if self.is_lsm(table_name):
+            return self.delete_lsm_entries(table_name, field_name, field_value)
+
+        with self.write_statement(table_name, ('delete_entries', table_name, field_name, field_value)):
+            deleted, action_status = self.for_entries(table_name, field_name, field_value, self.delete_entry)
+            if action_status:
+                table_file = self.open_table(table_name, 'r')
+                entry_size = self.get_codec(self.get_entry_signature(table_name), self.size_of_pointer(table_file)).size
+                self.mark_slots(table_name, table_file, entry_size, deleted, False)
+                self.bump_version(table_name)
+                self.note_changes(table_name, len(deleted), nb_deleted=len(deleted))
+
+            if self.needs_vacuum(table_name):
+                # A background compaction doesn't make the delete wait
+                if self.vacuum_worker is not None:
+                    self.vacuum_worker.request(table_name)
+                else:
+                    start = perf_counter()
+                    self.erase_deleted_entry(table_name)
+                    self.add_phase_time('compaction', start)
 
-        return action_status
\ No newline at end of file
+            return action_status
\ No newline at end of file
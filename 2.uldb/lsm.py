@@ -0,0 +1,327 @@
+from binary import FieldType, TableSignature, Entry
+from codec import STRUCT_FORMATS
+from struct import Struct
+from array import array
+from bisect import bisect_left, insort
+from heapq import merge
+from mmap import mmap, ACCESS_READ
+from os import listdir, remove, replace
+from os.path import isfile, basename, dirname
+from threading import RLock, Thread
+from typing import Iterable, Iterator
+import json
+
+try:
+    from fcntl import flock, LOCK_EX, LOCK_NB
+except ImportError: # Windows
+    from msvcrt import locking, LK_NBLCK
+    flock = None
+
+SEGMENT_MAGIC = 0x4D534C55 # Magic constant of a segment file (ULSM in ASCII)
+SEGMENT_HEADER = Struct('<iiq') # Magic constant, number of records and last id given when the segment was written
+SEGMENT_FOOTER = Struct('<q') # Offset of the index of the ids, at the end of the file
+RECORD_HEADER = Struct('<q?') # Id of the record, and whether it holds an entry or the deletion of the id
+MEMTABLE_SIZE = 4096 # Entries kept in memory before they are written to a segment
+COMPACTION_TRIGGER = 4 # Segments that start a background compaction merging all of them
+WAL = 'wal' # Extension of the write-ahead log of the memtable
+SEGMENT = 'segment' # Extension of the segment files, named table.number.segment
+
+def lock_file(file) -> None:
+    '''
+    Take an exclusive lock on an open file, kept until it's closed. Raise a ValueError if another handle has it.
+    '''
+    try:
+        if flock is not None:
+            flock(file.fileno(), LOCK_EX | LOCK_NB)
+        else:
+            file.seek(0)
+            locking(file.fileno(), LK_NBLCK, 1)
+    except OSError:
+        raise ValueError
+
+class RecordCodec:
+    def __init__(self, entry_signature: TableSignature):
+        '''
+        Pack the records of a segment: the id and a live flag, then the fields of a live entry.
+        Strings are given by their length with the other fields, and follow them.
+        '''
+        self.field_names = [field[0] for field in entry_signature[1:]]
+        self.string_indexes = [index for index, field in enumerate(entry_signature[1:]) if field[1] == FieldType.STRING]
+        self.struct = Struct('<' + ''.join('H' if field[1] == FieldType.STRING else STRUCT_FORMATS[field[1]] for field in entry_signature[1:]))
+
+    def pack(self, entry_id: int, entry: Entry | None) -> bytes:
+        if entry is None:
+            return RECORD_HEADER.pack(entry_id, False)
+
+        values = [entry[field_name] for field_name in self.field_names]
+        strings = [values[index].encode('utf-8') for index in self.string_indexes]
+        for index, string in zip(self.string_indexes, strings):
+            values[index] = len(string)
+        return RECORD_HEADER.pack(entry_id, True) + self.struct.pack(*values) + b''.join(strings)
+
+    def unpack_from(self, data: bytes, offset: int) -> tuple[int, Entry | None, int]:
+        '''
+        Unpack the record at the offset, and give the offset of the next one.
+        '''
+        entry_id, live = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        if not live:
+            return entry_id, None, offset
+
+        values = list(self.struct.unpack_from(data, offset))
+        offset += self.struct.size
+        for index in self.string_indexes:
+            values[index], offset = str(data[offset:offset + values[index]], 'utf-8'), offset + values[index]
+        return entry_id, dict(zip(['id'] + self.field_names, [entry_id] + values)), offset
+
+class Segment:
+    def __init__(self, path: str, codec: RecordCodec):
+        '''
+        A segment file, never changed once written: records sorted by id, then the index of their offsets.
+        It's read through a memory map, still usable by the reads that started before it was merged and removed.
+        '''
+        self.path = path
+        self.number = int(basename(path).split('.')[-2])
+        self.codec = codec
+        with open(path, 'rb') as file:
+            self.data = mmap(file.fileno(), 0, access=ACCESS_READ)
+
+        magic, self.count, self.last_id = SEGMENT_HEADER.unpack_from(self.data)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError
+        self.index_offset = SEGMENT_FOOTER.unpack_from(self.data, len(self.data) - SEGMENT_FOOTER.size)[0]
+        index = array('q', self.data[self.index_offset:len(self.data) - SEGMENT_FOOTER.size])
+        self.ids, self.offsets = index[0::2], index[1::2]
+
+    def get(self, entry_id: int) -> tuple[bool, Entry | None]:
+        '''
+        Find the record of an id: whether the segment has one, and its entry (None if the id was deleted).
+        '''
+        position = bisect_left(self.ids, entry_id)
+        if position == len(self.ids) or self.ids[position] != entry_id:
+            return False, None
+        return True, self.codec.unpack_from(self.data, self.offsets[position])[1]
+
+    def __iter__(self) -> Iterator[tuple[int, Entry | None]]:
+        offset = SEGMENT_HEADER.size
+        while offset < self.index_offset:
+            entry_id, entry, offset = self.codec.unpack_from(self.data, offset)
+            yield entry_id, entry
+
+def write_segment(path: str, codec: RecordCodec, records: Iterable[tuple[int, Entry | None]], last_id: int) -> int:
+    '''
+    Write records sorted by id in a new segment file, replaced at once so it's never seen half written.
+    Return the number of records.
+    '''
+    ids = array('q')
+    with open(path + '~', 'wb') as file:
+        file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, 0, last_id))
+        offset = SEGMENT_HEADER.size
+        for entry_id, entry in records:
+            record = codec.pack(entry_id, entry)
+            ids.extend([entry_id, offset])
+            file.write(record)
+            offset += len(record)
+
+        file.write(ids.tobytes())
+        file.write(SEGMENT_FOOTER.pack(offset))
+        file.seek(0)
+        file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, len(ids) // 2, last_id))
+
+    replace(path + '~', path)
+    return len(ids) // 2
+
+def with_age(records: Iterable[tuple[int, Entry | None]], age: int) -> Iterator[tuple[int, int, Entry | None]]:
+    for entry_id, entry in records:
+        yield entry_id, age, entry
+
+def merge_records(sources: list[Iterable[tuple[int, Entry | None]]]) -> Iterator[tuple[int, Entry | None]]:
+    '''
+    Merge sources of records sorted by id, given from the newest to the oldest: only the newest record of an id is kept.
+    '''
+    last_id = None
+    for entry_id, _, entry in merge(*[with_age(records, age) for age, records in enumerate(sources)]):
+        if entry_id != last_id:
+            last_id = entry_id
+            yield entry_id, entry
+
+class LsmTable:
+    def __init__(self, path: str, entry_signature: TableSignature, memtable_size: int = MEMTABLE_SIZE, read_only: bool = False):
+        '''
+        Entries of a table kept by id in a log-structured merge tree: writes go to a sorted memtable and to its
+        write-ahead log (path.wal), which is written as a sorted segment file once the memtable is full.
+        Once there are COMPACTION_TRIGGER segments, a background thread merges them into one.
+        Reads merge the memtable and the segments, the newest record of an id hides the older ones.
+        A table has a single writer, which holds a lock on the log until it's closed: opening it again
+        for writing raises a ValueError, read-only instances read the log without the lock.
+        '''
+        self.path = path
+        self.entry_signature = entry_signature # Kept, as the fields of the table can't change
+        self.codec = RecordCodec(entry_signature)
+        self.memtable_size = memtable_size
+        self.read_only = read_only
+        self.lock = RLock() # Held while the memtable or the list of segments change
+        self.memtable = {} # Entry by id, None for a deleted id
+        self.memtable_ids = [] # Ids of the memtable, sorted
+        self.compaction = None # Thread of the running compaction
+        self.errors = [] # Error of the compaction thread, raised to the next caller waiting for it
+
+        prefix = basename(path) + '.'
+        self.segments = sorted( # Oldest first
+            [Segment(dirname(path) + '/' + file_name, self.codec) for file_name in listdir(dirname(path))
+             if file_name.startswith(prefix) and file_name.endswith('.' + SEGMENT) and file_name.count('.') == 2],
+            key=lambda segment: segment.number
+        )
+        self.last_id = self.segments[-1].last_id if self.segments else 0
+        self.replay_wal()
+        self.wal = None
+        if not read_only:
+            self.wal = open(self.get_wal_name(), 'a', encoding='utf-8')
+            try:
+                lock_file(self.wal)
+            except ValueError:
+                self.wal.close()
+                raise
+
+    def get_wal_name(self) -> str:
+        return f'{self.path}.{WAL}'
+
+    def replay_wal(self) -> None:
+        '''
+        Fill the memtable again with the writes logged since the last segment was written.
+        A last line without its end was not fully written, so its write never succeeded.
+        '''
+        if not isfile(self.get_wal_name()):
+            return
+
+        with open(self.get_wal_name(), 'rb') as wal_file:
+            for line in wal_file.read().split(b'\n')[:-1]:
+                write = json.loads(line)
+                self.apply_write(write['put'], write['delete'])
+                self.last_id = write['last_id']
+
+    def apply_write(self, entries: list[Entry], deleted_ids: list[int]) -> None:
+        for entry_id, entry in [(entry['id'], entry) for entry in entries] + [(entry_id, None) for entry_id in deleted_ids]:
+            if entry_id not in self.memtable:
+                insort(self.memtable_ids, entry_id)
+            self.memtable[entry_id] = entry
+
+    def write(self, entries: list[Entry], deleted_ids: list[int] = (), last_id: int | None = None) -> None:
+        '''
+        Add or replace entries by id and delete ids with a single append to the log.
+        '''
+        if self.read_only:
+            raise ValueError
+
+        with self.lock:
+            self.last_id = self.last_id if last_id is None else last_id
+            self.wal.write(json.dumps({'last_id': self.last_id, 'put': entries, 'delete': list(deleted_ids)}) + '\n')
+            self.wal.flush()
+            self.apply_write(entries, deleted_ids)
+
+    def is_full(self) -> bool:
+        return len(self.memtable) >= self.memtable_size
+
+    def flush_memtable(self) -> None:
+        '''
+        Write the memtable to a new segment, then empty it with its log. The log is emptied in place to keep its lock.
+        '''
+        with self.lock:
+            if not self.memtable:
+                return
+
+            number = self.segments[-1].number + 1 if self.segments else 1
+            segment_name = f'{self.path}.{number}.{SEGMENT}'
+            write_segment(segment_name, self.codec, [(entry_id, self.memtable[entry_id]) for entry_id in self.memtable_ids], self.last_id)
+            self.segments.append(Segment(segment_name, self.codec))
+
+            self.memtable, self.memtable_ids = {}, []
+            self.wal.truncate(0)
+
+            if len(self.segments) >= COMPACTION_TRIGGER and self.compaction is None:
+                self.compaction = Thread(target=self.run_compaction, name=f'compaction-{basename(self.path)}', daemon=True)
+                self.compaction.start()
+
+    def compact(self) -> None:
+        '''
+        Merge all segments into one. Deleted ids are left out, no older record of them can remain.
+        Segments written meanwhile are newer, so they stay in front of the merged one.
+        '''
+        with self.lock:
+            segments = list(self.segments)
+        if len(segments) < 2:
+            return
+
+        # The merged segment takes the place of the newest one it replaces
+        newest = segments[-1]
+        live_records = (record for record in merge_records(list(reversed(segments))) if record[1] is not None)
+        write_segment(newest.path + '.merged', self.codec, live_records, newest.last_id)
+
+        with self.lock:
+            replace(newest.path + '.merged', newest.path)
+            merged = Segment(newest.path, self.codec)
+            self.segments = [merged] + self.segments[len(segments):]
+            for segment in segments[:-1]:
+                remove(segment.path)
+
+    def run_compaction(self) -> None:
+        try:
+            self.compact()
+        except Exception as error:
+            self.errors.append(error)
+        finally:
+            with self.lock:
+                self.compaction = None
+
+    def wait_for_compaction(self) -> None:
+        '''
+        Wait for the running compaction to end, and raise its error if it failed.
+        '''
+        compaction = self.compaction
+        if compaction is not None:
+            compaction.join()
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def get_sources(self) -> list[Iterable[tuple[int, Entry | None]]]:
+        '''
+        Get the memtable and the segments as they are now, from the newest to the oldest.
+        '''
+        with self.lock:
+            memtable = [(entry_id, self.memtable[entry_id]) for entry_id in self.memtable_ids]
+            return [memtable] + list(reversed(self.segments))
+
+    def get(self, entry_id: int) -> Entry | None:
+        '''
+        Get the entry of an id, looked up from the newest level to the oldest.
+        '''
+        with self.lock:
+            if entry_id in self.memtable:
+                return self.memtable[entry_id]
+            segments = list(reversed(self.segments))
+
+        for segment in segments:
+            found, entry = segment.get(entry_id)
+            if found:
+                return entry
+        return None
+
+    def __iter__(self) -> Iterator[Entry]:
+        '''
+        Give the entries sorted by id.
+        '''
+        for _, entry in merge_records(self.get_sources()):
+            if entry is not None:
+                yield entry
+
+    def close(self) -> None:
+        '''
+        Wait for the running compaction and close the log, the memtable is kept in it until the next opening.
+        '''
+        try:
+            self.wait_for_compaction()
+        finally:
+            with self.lock:
+                if self.wal is not None:
+                    self.wal.close()
+                    self.wal = None
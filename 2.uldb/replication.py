@@ -0,0 +1,149 @@
+from database import Database, FieldType, CHANGE_LOG
+from threading import Thread, Event, Lock
+from os import replace
+from os.path import isfile, getsize
+from time import time
+import json
+
+POLL_INTERVAL = 0.1 # Seconds between two reads of the change log by a follower thread
+FOLLOWER_POSITION = '.follower.json' # Number and log offset of the last change applied, in the follower directory
+
+class Follower:
+    def __init__(self, leader: str, name: str, poll_interval: float = POLL_INTERVAL, **options):
+        '''
+        Keep the database in the name directory up to date with the change log of the leader database,
+        opened with change_log=True. Both directories must be on a file system the follower can read.
+
+        Changes are applied in their order by poll(), or by a background thread once started.
+        The follower starts from an empty directory and resumes from the last applied change when it's opened again.
+        Reads are served by read-only databases opened on its directory with open_reader().
+        '''
+        self.log_path = leader + '/' + CHANGE_LOG
+        self.db = Database(name, **options)
+        self.position_path = self.db.name + '/' + FOLLOWER_POSITION
+        self.last_change, self.offset = self.read_position()
+        self.poll_interval = poll_interval
+        self.lock = Lock() # Held while changes are applied, by poll() or the thread
+        self.stopping = Event()
+        self.thread = None
+        self.errors = [] # Errors of the thread, which stops at the first change it can't apply
+
+    def read_position(self) -> tuple[int, int]:
+        '''
+        Get the number of the last applied change and the offset of the next one in the log.
+        '''
+        if not isfile(self.position_path):
+            return 0, 0
+
+        with open(self.position_path, encoding='utf-8') as position_file:
+            position = json.load(position_file)
+        return position['change'], position['offset']
+
+    def save_position(self) -> None:
+        '''
+        Write the position beside the applied tables, replaced at once so it's never half written.
+        '''
+        with open(self.position_path + '~', 'w', encoding='utf-8') as position_file:
+            json.dump({'change': self.last_change, 'offset': self.offset}, position_file)
+        replace(self.position_path + '~', self.position_path)
+
+    def read_pending(self) -> list[bytes]:
+        '''
+        Get the lines of the log written since the last applied change.
+        A last line without its end is still being written by the leader, so it's left for later.
+        '''
+        if not isfile(self.log_path):
+            return []
+
+        with open(self.log_path, 'rb') as log_file:
+            log_file.seek(self.offset)
+            return log_file.read().split(b'\n')[:-1]
+
+    def apply_change(self, change: dict) -> None:
+        '''
+        Make the logged write on the follower database, with the types JSON can't keep.
+        '''
+        operation, args = change['operation'], change['args']
+
+        if operation == 'create_table':
+            table_name, fields, options = args
+            options = {name: tuple(value) if isinstance(value, list) else value
+                       for name, value in options.items() if value is not None}
+            self.db.create_table(table_name, *[(name, FieldType(field_type)) for name, field_type in fields], **options)
+        elif operation == 'add_column':
+            table_name, field_name, field_type, default = args
+            self.db.add_column(table_name, field_name, FieldType(field_type), default)
+        elif operation == 'update_fields':
+            table_name, cond_name, cond_value, assignments = args
+            assignments = {name: tuple(value) if isinstance(value, list) else value for name, value in assignments.items()}
+            self.db.update_fields(table_name, cond_name, cond_value, assignments)
+        elif operation in ['delete_table', 'add_entries', 'delete_entries', 'create_text_index', 'drop_column']:
+            getattr(self.db, operation)(*args)
+        else:
+            raise ValueError
+
+    def poll(self) -> int:
+        '''
+        Apply the changes logged since the last call and return how many were applied.
+        '''
+        with self.lock:
+            nb_applied = 0
+            for line in self.read_pending():
+                change = json.loads(line)
+
+                # A change applied before the position was saved is not applied twice
+                if change['change'] > self.last_change:
+                    self.apply_change(change)
+                    self.last_change = change['change']
+                    nb_applied += 1
+
+                self.offset += len(line) + 1
+                self.save_position()
+
+            return nb_applied
+
+    def get_lag(self) -> dict:
+        '''
+        Get how far the follower is behind the leader: the number of changes and bytes of the log not applied yet,
+        and the seconds since the oldest of them was made (0 if the follower is up to date).
+        '''
+        pending = self.read_pending()
+        return {
+            'changes': len(pending),
+            'bytes': getsize(self.log_path) - self.offset if isfile(self.log_path) else 0,
+            'seconds': time() - json.loads(pending[0])['time'] if pending else 0
+        }
+
+    def open_reader(self, **options) -> Database:
+        '''
+        Open the follower database for reads only, it sees the changes as they are applied.
+        '''
+        return Database(self.db.name, read_only=True, **options)
+
+    def start(self) -> None:
+        '''
+        Apply the changes in a background thread as soon as they are logged.
+        '''
+        if self.thread is None:
+            self.stopping.clear()
+            self.thread = Thread(target=self.run, name=f'follower-{self.db.name}', daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stop the thread once the change being applied is done.
+        '''
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                self.poll()
+            except Exception as error:
+                # Later changes can't be applied without this one
+                self.errors.append(error)
+                return
+            self.stopping.wait(self.poll_interval)
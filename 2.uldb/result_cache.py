@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from sys import getsizeof
+from threading import Lock
+
+def get_result_size(result) -> int:
+    '''
+    Estimate the memory taken by a query result with all the values it contains.
+    '''
+    if isinstance(result, dict):
+        return getsizeof(result) + sum(getsizeof(key) + get_result_size(value) for key, value in result.items())
+    if isinstance(result, (list, tuple)):
+        return getsizeof(result) + sum(get_result_size(value) for value in result)
+    return getsizeof(result)
+
+def copy_result(result):
+    '''
+    Copy the lists and dicts of a result so callers can't change what is cached.
+    '''
+    if isinstance(result, dict):
+        return dict(result)
+    if isinstance(result, list):
+        return [copy_result(value) for value in result]
+    return result # Fields and tuples of fields can't be changed
+
+class ResultCache:
+    def __init__(self, max_size: int):
+        '''
+        Least recently used query results, keyed by (table, query, table version).
+        The oldest results are dropped once their total size is over max_size bytes.
+        '''
+        self.max_size = max_size
+        self.size = 0
+        self.results = OrderedDict() # Result and its size by key
+        self.lock = Lock() # The cache can be shared by the threads of an AsyncDatabase
+
+    def get(self, key: tuple) -> tuple[bool, object]:
+        '''
+        Get whether the result is cached and a copy of it.
+        '''
+        with self.lock:
+            if key not in self.results:
+                return False, None
+
+            self.results.move_to_end(key)
+            return True, copy_result(self.results[key][0])
+
+    def put(self, key: tuple, result) -> None:
+        result_size = get_result_size(result)
+        if result_size > self.max_size:
+            return # Would evict everything else
+
+        with self.lock:
+            self.pop(key)
+            self.results[key] = (copy_result(result), result_size)
+            self.size += result_size
+
+            while self.size > self.max_size:
+                _, (_, oldest_size) = self.results.popitem(last=False)
+                self.size -= oldest_size
+
+    def pop(self, key: tuple) -> None:
+        if key in self.results:
+            _, result_size = self.results.pop(key)
+            self.size -= result_size
+
+    def drop_table(self, table_name: str) -> None:
+        '''
+        Forget all results of a table, used when it's deleted.
+        '''
+        with self.lock:
+            for key in [key for key in self.results if key[0] == table_name]:
+                self.pop(key)
@@ -0,0 +1,39 @@
+from binary import BinaryFile, FieldType, Field
+from codec import RowCodec
+from collections.abc import Mapping
+
+class Row(Mapping):
+    __slots__ = ('table_file', 'codec', 'data')
+
+    def __init__(self, table_file: BinaryFile, codec: RowCodec, data: bytes):
+        '''
+        An entry that keeps the bytes of its fields and only unpacks a field when it's used.
+        Its strings are read in the string buffer at that time, so a row is read before its table is written again,
+        or copied with dict(row). It can't be changed, but reads like the dict of an entry.
+        '''
+        self.table_file = table_file
+        self.codec = codec
+        self.data = data
+
+    def __getitem__(self, field_name: str) -> Field:
+        index = self.codec.field_indexes[field_name] # KeyError as for a dict
+        value = self.codec.unpack_field(self.data, index)
+
+        if self.codec.field_types[index] == FieldType.STRING:
+            return self.table_file.read_string_from(value)
+        return value
+
+    def __iter__(self):
+        return iter(self.codec.field_names)
+
+    def __len__(self) -> int:
+        return len(self.codec.field_names)
+
+    def __or__(self, other: Mapping) -> dict:
+        return dict(self) | other
+
+    def __ror__(self, other: Mapping) -> dict:
+        return other | dict(self)
+
+    def __repr__(self) -> str:
+        return f'Row({dict(self)!r})'
@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from bisect import bisect_left, insort
+from threading import Lock
+
+class OffsetCache:
+    def __init__(self, max_items: int):
+        '''
+        Least recently used values decoded from a file, keyed by the offset of their bytes.
+        A value is dropped as soon as one of its bytes is written, the oldest ones once there are more than max_items.
+        '''
+        self.max_items = max_items
+        self.items = OrderedDict() # Value and number of bytes by offset
+        self.offsets = [] # Sorted offsets, to find the values a write overlaps
+        self.max_size = 0 # Largest number of bytes of a cached value, no value before pos - max_size can reach pos
+        self.lock = Lock() # The cache can be shared by the threads of an AsyncDatabase
+
+    def get(self, offset: int) -> tuple[bool, object]:
+        with self.lock:
+            if offset not in self.items:
+                return False, None
+
+            self.items.move_to_end(offset)
+            return True, self.items[offset][0]
+
+    def put(self, offset: int, value, size: int) -> None:
+        with self.lock:
+            if offset in self.items:
+                self.items.move_to_end(offset)
+            else:
+                insort(self.offsets, offset)
+            self.items[offset] = (value, size)
+            self.max_size = max(self.max_size, size)
+
+            while len(self.items) > self.max_items:
+                oldest, _ = self.items.popitem(last=False)
+                del self.offsets[bisect_left(self.offsets, oldest)]
+
+    def invalidate(self, pos: int, size: int) -> None:
+        '''
+        Drop the values with a byte between pos and pos + size.
+        '''
+        with self.lock:
+            start = bisect_left(self.offsets, pos - self.max_size + 1)
+            end = bisect_left(self.offsets, pos + size)
+            kept = []
+            for offset in self.offsets[start:end]:
+                if offset + self.items[offset][1] > pos:
+                    del self.items[offset]
+                else:
+                    kept.append(offset)
+            self.offsets[start:end] = kept
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+            self.offsets.clear()
+            self.max_size = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+class RowCache:
+    def __init__(self, max_items: int):
+        '''
+        Decoded entries and strings of a table, each keyed by its position in the table file.
+        Writes through the files of the table drop exactly what they overwrite, moved entries included.
+        '''
+        self.rows = OffsetCache(max_items)
+        self.strings = OffsetCache(max_items)
+
+    def invalidate(self, pos: int, size: int) -> None:
+        self.rows.invalidate(pos, size)
+        self.strings.invalidate(pos, size)
+
+    def clear(self) -> None:
+        self.rows.clear()
+        self.strings.clear()
@@ -0,0 +1,43 @@
+from binary import BinaryFile
+
+def is_live(bitmap: bytearray, slot: int) -> bool:
+    return slot >> 3 < len(bitmap) and bool(bitmap[slot >> 3] >> (slot & 7) & 1)
+
+def read_slot_bitmap(bitmap_file: BinaryFile) -> bytearray:
+    '''
+    Read a bitmap of the slots of a table: bit i of byte i // 8 is set if slot i holds an entry.
+    '''
+    bitmap_file.goto(0)
+    return bytearray(bitmap_file.read_bytes(bitmap_file.get_size()))
+
+def write_slot_bitmap(bitmap_file: BinaryFile, bitmap: bytearray) -> None:
+    bitmap_file.goto(0)
+    bitmap_file.write_bytes(bytes(bitmap))
+
+def write_slot_changes(bitmap_file: BinaryFile, slots: list[int], live: bool) -> None:
+    '''
+    Set or clear the bits of the given slots, only writing the bytes that hold them.
+    The file grows with deleted slots if a slot is after its end.
+    '''
+    size = bitmap_file.get_size()
+    changed_bytes = {}
+
+    for slot in slots:
+        byte_index = slot >> 3
+        if byte_index not in changed_bytes:
+            changed_bytes[byte_index] = bitmap_file.read_integer_from(1, byte_index) & 0xff if byte_index < size else 0
+
+        if live:
+            changed_bytes[byte_index] |= 1 << (slot & 7)
+        else:
+            changed_bytes[byte_index] &= ~(1 << (slot & 7))
+
+    # Bytes between the end of the file and a new slot are deleted slots
+    last_byte = max(changed_bytes, default=-1)
+    if last_byte >= size:
+        bitmap_file.goto(size)
+        bitmap_file.write_bytes(bytes(last_byte + 1 - size))
+
+    for byte_index in sorted(changed_bytes):
+        bitmap_file.goto(byte_index)
+        bitmap_file.write_bytes(bytes([changed_bytes[byte_index]]))
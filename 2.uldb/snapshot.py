@@ -0,0 +1,108 @@
+from hashlib import blake2b
+from os import listdir, remove, replace
+from os.path import isfile, getsize
+import json
+
+try:
+    from fcntl import ioctl
+except ImportError: # Not available on Windows, files are always copied by blocks
+    ioctl = None
+
+FICLONE = 0x40049409 # Linux ioctl sharing the blocks of a file with another one (btrfs, xfs, ...)
+BLOCK_SIZE = 4096
+MANIFEST = '.snapshot.json' # Hash of each block of the files of a snapshot
+
+def reflink_file(source: str, destination: str) -> bool:
+    '''
+    Make destination a copy-on-write clone of source. Return False if the file system can't.
+    '''
+    if ioctl is None:
+        return False
+
+    # The previous copy is kept until the clone is done
+    clone = destination + '.clone'
+    with open(source, 'rb') as source_file, open(clone, 'wb') as clone_file:
+        try:
+            ioctl(clone_file.fileno(), FICLONE, source_file.fileno())
+            cloned = True
+        except OSError:
+            cloned = False
+
+    if cloned:
+        replace(clone, destination)
+    else:
+        remove(clone)
+    return cloned
+
+def hash_block(block: bytes) -> str:
+    return blake2b(block, digest_size=16).hexdigest()
+
+def diff_copy_file(source: str, destination: str, block_hashes: list[str] | None) -> tuple[list[str], int]:
+    '''
+    Only write the blocks of source that changed since the previous copy in destination.
+    Without the hashes of the previous copy, its blocks are read to be compared.
+    Return the hashes of the new copy and the number of bytes written.
+    '''
+    new_hashes = []
+    nb_bytes = 0
+    mode = 'r+b' if isfile(destination) else 'w+b'
+    if mode == 'w+b':
+        block_hashes = None # The hashes of a removed copy can't be trusted
+
+    with open(source, 'rb') as source_file, open(destination, mode) as destination_file:
+        block_index = 0
+        while block := source_file.read(BLOCK_SIZE):
+            block_hash = hash_block(block)
+            new_hashes.append(block_hash)
+
+            position = block_index * BLOCK_SIZE
+            if block_hashes is not None:
+                changed = block_index >= len(block_hashes) or block_hashes[block_index] != block_hash
+            else:
+                destination_file.seek(position)
+                changed = destination_file.read(len(block)) != block
+
+            if changed:
+                destination_file.seek(position)
+                destination_file.write(block)
+                nb_bytes += len(block)
+            block_index += 1
+
+        destination_file.truncate(getsize(source))
+
+    return new_hashes, nb_bytes
+
+def copy_directory(source: str, destination: str, reflink: bool = True) -> dict:
+    '''
+    Copy all files of source in destination, by cloning them if possible or else by changed blocks.
+    Files that are not in source anymore are removed from destination.
+    '''
+    try:
+        with open(destination + '/' + MANIFEST, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        manifest = {}
+
+    file_names = [file_name for file_name in listdir(source) if isfile(source + '/' + file_name)]
+    report = {'files': len(file_names), 'bytes_copied': 0, 'method': 'diff'}
+    new_manifest = {}
+
+    for file_name in file_names:
+        source_path, destination_path = source + '/' + file_name, destination + '/' + file_name
+
+        if reflink and reflink_file(source_path, destination_path):
+            report['method'] = 'reflink'
+            new_manifest[file_name] = None # Unknown until the next copy by blocks
+        else:
+            reflink = False # The whole directory is on the same file system
+            new_manifest[file_name], nb_bytes = diff_copy_file(source_path, destination_path, manifest.get(file_name))
+            report['bytes_copied'] += nb_bytes
+
+    for file_name in listdir(destination):
+        if file_name not in new_manifest and file_name != MANIFEST and isfile(destination + '/' + file_name):
+            remove(destination + '/' + file_name)
+
+    with open(destination + '/' + MANIFEST, 'w') as manifest_file:
+        json.dump(new_manifest, manifest_file)
+
+    return report
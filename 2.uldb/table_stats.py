@@ -0,0 +1,108 @@
+from binary import FieldType, Field
+from hashlib import blake2b
+from bisect import bisect_left, bisect_right
+from math import log
+
+HLL_PRECISION = 10 # 1024 registers, about 3% of error on distinct counts
+HISTOGRAM_BUCKETS = 16
+STALE_FRACTION = 0.2 # Statistics are computed again once this fraction of rows changed
+
+# Types with an equi-depth histogram
+NUMBER_TYPES = [FieldType.INTEGER, FieldType.INT8, FieldType.INT16, FieldType.INT64, FieldType.FLOAT64]
+
+class HyperLogLog:
+    def __init__(self, registers: bytearray | None = None):
+        self.nb_registers = 1 << HLL_PRECISION
+        self.registers = registers if registers is not None else bytearray(self.nb_registers)
+
+    def add(self, value: Field) -> None:
+        hash_value = int.from_bytes(blake2b(repr(value).encode('utf-8'), digest_size=8).digest(), byteorder='little')
+        register = hash_value & (self.nb_registers - 1)
+        rest = hash_value >> HLL_PRECISION
+
+        # Position of the first 1 bit of the rest of the hash
+        rank = 1
+        while rest & 1 == 0 and rank <= 64 - HLL_PRECISION:
+            rest >>= 1
+            rank += 1
+
+        self.registers[register] = max(self.registers[register], rank)
+
+    def count(self) -> int:
+        '''
+        Estimate the number of distinct values added.
+        '''
+        m = self.nb_registers
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -register for register in self.registers)
+
+        # Linear counting is more precise while many registers are still empty
+        nb_empty = self.registers.count(0)
+        if estimate <= 2.5 * m and nb_empty > 0:
+            estimate = m * log(m / nb_empty)
+
+        return round(estimate)
+
+def is_null_equivalent(value: Field) -> bool:
+    '''
+    Fields can't be null, so an empty string or a 0 is counted instead.
+    '''
+    return value == '' or (value == 0 and not isinstance(value, bool))
+
+def build_histogram(values: list[Field]) -> list[Field]:
+    '''
+    Get the bounds of equi-depth buckets: each bucket holds about the same number of values.
+    '''
+    if not values:
+        return []
+
+    values = sorted(values)
+    nb_buckets = min(HISTOGRAM_BUCKETS, len(values))
+    return [values[(len(values) - 1) * i // nb_buckets] for i in range(nb_buckets + 1)]
+
+def new_column_stats() -> dict:
+    return {'distinct': 0, 'nulls': 0, 'min': None, 'max': None, 'hll': None}
+
+def add_to_column_stats(column_stats: dict, hll: HyperLogLog, value: Field) -> None:
+    '''
+    Count a new value in the statistics of a column, histograms are only updated by a new analysis.
+    '''
+    hll.add(value)
+
+    if is_null_equivalent(value):
+        column_stats['nulls'] += 1
+    if column_stats['min'] is None or value < column_stats['min']:
+        column_stats['min'] = value
+    if column_stats['max'] is None or value > column_stats['max']:
+        column_stats['max'] = value
+
+def save_hll(column_stats: dict, hll: HyperLogLog) -> None:
+    column_stats['hll'] = hll.registers.hex()
+    column_stats['distinct'] = hll.count()
+
+def load_hll(column_stats: dict) -> HyperLogLog:
+    if column_stats['hll'] is None:
+        return HyperLogLog()
+    return HyperLogLog(bytearray.fromhex(column_stats['hll']))
+
+def is_comparable(column_stats: dict, value: Field) -> bool:
+    '''
+    Check if a value can be compared with the values of a column, a string is only compared with strings.
+    '''
+    return column_stats['min'] is not None and isinstance(value, str) == isinstance(column_stats['min'], str)
+
+def estimate_selectivity(column_stats: dict, value: Field) -> float:
+    '''
+    Estimate the fraction of rows where the column is equal to the value.
+    '''
+    if column_stats['min'] is None or value < column_stats['min'] or value > column_stats['max']:
+        return 0.0
+
+    selectivity = 1 / max(column_stats['distinct'], 1)
+
+    # A value found in several bounds of the histogram fills several buckets
+    histogram = column_stats.get('histogram')
+    if histogram:
+        nb_bounds = bisect_right(histogram, value) - bisect_left(histogram, value)
+        selectivity = max(selectivity, (nb_bounds - 1) / (len(histogram) - 1))
+
+    return selectivity
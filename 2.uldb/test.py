@@ -101,8 +101,8 @@ def test_create_db():
 def test_field_types():
     from database import FieldType
     types = set(map(lambda x: getattr(x, 'name'), FieldType))
-    assert types == {'STRING', 'INTEGER'}
-    assert set(FieldType) == set(map(FieldType, range(1, 3)))
+    assert types == {'STRING', 'INTEGER', 'INT8', 'INT16', 'INT64', 'BOOL', 'FLOAT64'}
+    assert set(FieldType) == set(map(FieldType, range(1, 8)))
 
 def test_list_table():
     db = get_programme_db()
@@ -0,0 +1,1614 @@
+from pathlib import Path
+import pytest
+
+EXTRA_PATH = Path('extra_db')
+
+def get_empty_db(db_name: str = 'extra_db', **options) -> 'Database':
+    from database import Database
+    db = Database(db_name, **options)
+    for table_name in db.list_tables():
+        db.delete_table(table_name)
+    return db
+
+def get_cours_db(**options) -> 'Database':
+    from database import FieldType
+    db = get_empty_db(**options)
+    db.create_table(
+        'cours',
+        ('MNEMONIQUE', FieldType.INTEGER),
+        ('NOM', FieldType.STRING),
+        ('COORDINATEUR', FieldType.STRING),
+        ('CREDITS', FieldType.INTEGER)
+    )
+    for course in COURSES:
+        db.add_entry('cours', course)
+    return db
+
+COURSES = [
+    {'MNEMONIQUE': 101, 'NOM': 'Programmation',
+     'COORDINATEUR': 'Thierry Massart', 'CREDITS': 10},
+    {'MNEMONIQUE': 102, 'NOM': 'Fonctionnement des ordinateurs',
+     'COORDINATEUR': 'Gilles Geeraerts', 'CREDITS': 5},
+    {'MNEMONIQUE': 103, 'NOM': 'Algorithmique I',
+     'COORDINATEUR': 'Olivier Markowitch', 'CREDITS': 10},
+    {'MNEMONIQUE': 105, 'NOM': 'Langages de programmation I',
+     'COORDINATEUR': 'Christophe Petit', 'CREDITS': 5},
+    {'MNEMONIQUE': 106, 'NOM': 'Projet d\'informatique I',
+     'COORDINATEUR': 'Gwenaël Joret', 'CREDITS': 5},
+]
+
+def run_uldb(script: str) -> str:
+    from subprocess import run
+    process = run(['python3', 'uldb.py'], input=script + 'quit', capture_output=True, text=True, check=True)
+    return process.stdout.replace('uldb:: ', '').strip()
+
+########################################
+#           Instrumentation            #
+########################################
+
+def test_io_counters():
+    from binary import BinaryFile
+    import tempfile
+    with tempfile.TemporaryFile() as f:
+        file = BinaryFile(f)
+        file.write_integer(1, 4)
+        file.write_string('abc')
+        file.read_integer_from(4, 0)
+        file.shift_from(0, 2)
+        assert file.stats['bytes_written'] >= 9
+        assert file.stats['shifts'] == 1
+        assert file.stats['bytes_shifted'] == 9
+        assert file.stats['seeks'] >= 2
+
+def test_explain_counts_rows():
+    db = get_cours_db()
+    report = db.explain('select_entries', 'cours', ('MNEMONIQUE',), 'CREDITS', 5)
+    assert set(report['result']) == {102, 105, 106}
+    assert report['entries_visited'] == len(COURSES)
+    assert report['entries_matched'] == 3
+    assert report['plan'] == ['cours: full scan with filter on CREDITS']
+    assert {'open', 'scan', 'action'} <= set(report['phases'])
+    with pytest.raises(ValueError):
+        db.explain('delete_table', 'cours')
+
+def test_plan_is_bounded():
+    from database import PLAN_LENGTH
+    db = get_cours_db()
+    for _ in range(PLAN_LENGTH + 10):
+        db.get_entry('cours', 'MNEMONIQUE', 106)
+    assert len(db.get_stats()['plan']) == PLAN_LENGTH
+
+def test_script_explain():
+    _ = get_empty_db('programme')
+    output = run_uldb('''open(programme)
+create_table(cours,MNEM=INTEGER,NOM=STRING,COORD=STRING)
+insert_to(cours,MNEM=101,NOM="Progra",COORD="T. Massart")
+explain(from_if_get(cours,MNEM=101,NOM))
+''')
+    lines = output.split('\n')
+    assert lines[0] == 'Progra'
+    assert lines[1] == 'access path: cours: full scan with filter on MNEM'
+    assert lines[2] == 'rows examined: 1'
+
+########################################
+#             Typed fields             #
+########################################
+
+def get_typed_db() -> 'Database':
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table(
+        'mesures',
+        ('id', FieldType.INT16),
+        ('CAPTEUR', FieldType.INT8),
+        ('NOM', FieldType.STRING),
+        ('ACTIF', FieldType.BOOL),
+        ('VALEUR', FieldType.FLOAT64),
+        ('TOTAL', FieldType.INT64),
+        ('LIEU', FieldType.STRING)
+    )
+    return db
+
+def test_typed_fields_round_trip():
+    db = get_typed_db()
+    entry = {'CAPTEUR': -3, 'NOM': 'thermo', 'ACTIF': True,
+             'VALEUR': 21.5, 'TOTAL': 2 ** 40, 'LIEU': 'Plaine'}
+    db.add_entry('mesures', entry)
+    db.add_entry('mesures', entry | {'CAPTEUR': 4, 'ACTIF': False})
+    assert db.get_entry('mesures', 'CAPTEUR', -3) == entry | {'id': 1}
+    assert db.select_entries('mesures', ('CAPTEUR',), 'ACTIF', False) == [4]
+    assert db.select_entry('mesures', ('NOM',), 'VALEUR', 21.5) == 'thermo'
+    assert db.update_entries('mesures', 'id', 2, 'VALEUR', 3)
+    assert db.select_entry('mesures', ('VALEUR',), 'id', 2) == 3.0
+
+def test_typed_fields_entry_size():
+    from binary import FIELD_SIZES
+    db = get_typed_db()
+    signature = db.get_entry_signature('mesures')
+    assert signature[0][0] == 'id'
+    assert db.get_table_signature('mesures') == signature[1:]
+    assert sum(FIELD_SIZES[field[1]] for field in signature) == 2 + 1 + 4 + 1 + 8 + 8 + 4
+
+def test_typed_fields_out_of_range():
+    from database import FieldType
+    db = get_typed_db()
+    entry = {'CAPTEUR': 128, 'NOM': 'a', 'ACTIF': True,
+             'VALEUR': 0.0, 'TOTAL': 0, 'LIEU': 'b'}
+    with pytest.raises(ValueError):
+        db.add_entry('mesures', entry)
+    with pytest.raises(ValueError):
+        db.add_entry('mesures', entry | {'CAPTEUR': 1, 'ACTIF': 1})
+    assert db.get_table_size('mesures') == 0
+    with pytest.raises(ValueError):
+        db.create_table('erreur', ('id', FieldType.INT64))
+
+def test_typed_fields_after_delete():
+    from database import FieldType
+    db = get_typed_db()
+    for i in range(6):
+        db.add_entry('mesures', {'CAPTEUR': i, 'NOM': str(i), 'ACTIF': i % 2 == 0,
+                                 'VALEUR': i / 2, 'TOTAL': i, 'LIEU': 'x'})
+    db.delete_entries('mesures', 'ACTIF', True)
+    assert [entry['CAPTEUR'] for entry in db.get_complete_table('mesures')] == [1, 3, 5]
+    assert db.get_entry_signature('mesures')[0] == ('id', FieldType.INT16)
+
+def test_script_typed_fields():
+    _ = get_empty_db('programme')
+    output = run_uldb('''open(programme)
+create_table(cours,MNEM=INT16,NOM=STRING,COORD=STRING,OPTION=BOOL,POIDS=FLOAT64)
+insert_to(cours,MNEM=101,NOM="Progra",COORD="T. Massart",OPTION=false,POIDS=1.5)
+insert_to(cours,MNEM=102,NOM="FDO",COORD="G. Geeraerts",OPTION=true,POIDS=2)
+from_if_get(cours,OPTION=true,MNEM,POIDS)
+''')
+    assert output == '(102, 2.0)'
+
+########################################
+#          String compression          #
+########################################
+
+LONG_TEXT = 'Ce cours introduit les bases de la programmation en Python. ' * 20
+
+def test_compressed_strings_are_smaller():
+    from database import FieldType
+    db = get_empty_db()
+    for table_name, compression in [('brut', None), ('zlib', ('zlib', 9)), ('lzma', 'lzma')]:
+        db.create_table(table_name, ('NOM', FieldType.STRING), ('TEXTE', FieldType.STRING),
+                        compression=compression)
+        for i in range(10):
+            db.add_entry(table_name, {'NOM': f'cours {i}', 'TEXTE': LONG_TEXT + str(i)})
+    sizes = {name: (EXTRA_PATH / f'{name}.table').stat().st_size for name in ['brut', 'zlib', 'lzma']}
+    assert sizes['zlib'] * 3 < sizes['brut']
+    assert sizes['lzma'] * 3 < sizes['brut']
+    assert sorted(db.list_tables()) == ['brut', 'lzma', 'zlib']
+    assert db.select_entry('lzma', ('TEXTE',), 'NOM', 'cours 3') == LONG_TEXT + '3'
+    assert db.get_entries('zlib', 'TEXTE', LONG_TEXT + '7')[0]['NOM'] == 'cours 7'
+
+def test_compressed_strings_update_and_cache():
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table('notes', ('NOM', FieldType.STRING), ('TEXTE', FieldType.STRING), compression='zlib')
+    db.add_entry('notes', {'NOM': 'a', 'TEXTE': LONG_TEXT})
+    db.add_entry('notes', {'NOM': 'b', 'TEXTE': 'court'})
+    assert db.update_entries('notes', 'NOM', 'b', 'TEXTE', LONG_TEXT * 2)
+    assert db.update_entries('notes', 'NOM', 'a', 'TEXTE', 'x')
+    db.reset_stats()
+    for _ in range(2):
+        assert db.select_entries('notes', ('TEXTE',), 'NOM', 'b') == [LONG_TEXT * 2]
+    assert db.get_stats()['string_cache_hits'] == 1
+    assert db.select_entry('notes', ('TEXTE',), 'NOM', 'a') == 'x'
+
+def test_compression_threshold():
+    from binary import BinaryFile, MIN_COMPRESSED_STRING
+    from database import FieldType
+    import tempfile
+    with tempfile.TemporaryFile() as f:
+        file = BinaryFile(f, compression=('zlib', 9))
+        # Each string is compressed alone, shorter ones keep their positive size and raw content
+        short = 'a' * (MIN_COMPRESSED_STRING - 1)
+        assert file.encode_string(short) == len(short).to_bytes(2, byteorder='little') + short.encode('utf-8')
+        assert int.from_bytes(file.encode_string('a' * MIN_COMPRESSED_STRING)[:2], byteorder='little', signed=True) < 0
+        # A long string that doesn't get smaller is not compressed either
+        random_text = ''.join(chr(33 + (i * 7919) % 94) for i in range(MIN_COMPRESSED_STRING))
+        assert file.encode_string(random_text)[2:] == random_text.encode('utf-8')
+
+    # Tables of short strings take the same space with or without compression
+    db = get_empty_db()
+    for table_name, compression in [('brut', None), ('zlib', 'zlib')]:
+        db.create_table(table_name, ('NOM', FieldType.STRING), compression=compression)
+        db.add_entries(table_name, [{'NOM': course['NOM']} for course in COURSES])
+    assert (EXTRA_PATH / 'zlib.table').stat().st_size == (EXTRA_PATH / 'brut.table').stat().st_size
+
+def test_compression_kept_and_removed_with_table():
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table('notes', ('A', FieldType.INTEGER), ('TEXTE', FieldType.STRING), compression=('zlib', 1))
+    for i in range(4):
+        db.add_entry('notes', {'A': i, 'TEXTE': LONG_TEXT})
+    db.delete_entries('notes', 'A', 1)
+    db.delete_entries('notes', 'A', 2)
+    db.delete_entries('notes', 'A', 3)
+    assert db.get_table_options('notes') == {'compression': ['zlib', 1]}
+    db.delete_table('notes')
+    assert not (EXTRA_PATH / 'notes.meta').exists()
+    with pytest.raises(ValueError):
+        db.create_table('erreur', ('A', FieldType.INTEGER), compression='bz2')
+
+########################################
+#            Bloom filters             #
+########################################
+
+def get_bloom_db() -> 'Database':
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table(
+        'cours',
+        ('MNEMONIQUE', FieldType.INTEGER),
+        ('NOM', FieldType.STRING),
+        ('COORDINATEUR', FieldType.STRING),
+        ('CREDITS', FieldType.INTEGER),
+        bloom=('NOM', 'COORDINATEUR')
+    )
+    for course in COURSES:
+        db.add_entry('cours', course)
+    return db
+
+def test_bloom_skips_absent_values():
+    db = get_bloom_db()
+    assert sorted(db.list_tables()) == ['cours']
+    db.reset_stats()
+    assert db.get_entry('cours', 'NOM', 'Analyse') is None
+    assert db.select_entries('cours', ('id',), 'COORDINATEUR', 'Personne') == []
+    assert not db.update_entries('cours', 'NOM', 'Analyse', 'CREDITS', 1)
+    assert not db.delete_entries('cours', 'NOM', 'Analyse')
+    assert db.get_stats()['entries_visited'] == 0
+    assert db.get_entry('cours', 'NOM', 'Algorithmique I')['MNEMONIQUE'] == 103
+
+def test_bloom_maintained_on_update_and_reload():
+    from database import Database
+    db = get_bloom_db()
+    db.update_entries('cours', 'MNEMONIQUE', 101, 'NOM', 'Programmation I')
+    db.add_entry('cours', {'MNEMONIQUE': 107, 'NOM': 'Analyse', 'COORDINATEUR': 'X', 'CREDITS': 5})
+    db = Database('extra_db')
+    assert db.select_entry('cours', ('MNEMONIQUE',), 'NOM', 'Programmation I') == 101
+    assert db.select_entry('cours', ('MNEMONIQUE',), 'NOM', 'Analyse') == 107
+
+def test_bloom_rebuilt_when_full(monkeypatch):
+    import database
+    from database import FieldType
+    monkeypatch.setattr(database, 'MIN_CAPACITY', 4)
+    db = get_empty_db()
+    db.create_table('mots', ('MOT', FieldType.STRING), bloom=('MOT',))
+    for i in range(10):
+        db.add_entry('mots', {'MOT': f'mot {i}'})
+    assert db.get_bloom_filters('mots')['MOT'].capacity >= 10
+    assert db.get_bloom_filters('mots')['MOT'].count == 10
+    assert all(db.get_entry('mots', 'MOT', f'mot {i}') for i in range(10))
+    with pytest.raises(ValueError):
+        db.create_table('erreur', ('A', FieldType.INTEGER), bloom=('A',))
+
+def test_bloom_shared_by_two_databases():
+    from database import Database
+    first = get_bloom_db()
+    second = Database('extra_db')
+    assert second.get_entry('cours', 'NOM', 'Analyse') is None # Filters of the second database read now
+    first.add_entry('cours', {'MNEMONIQUE': 107, 'NOM': 'Analyse', 'COORDINATEUR': 'X', 'CREDITS': 5})
+    assert second.get_entry('cours', 'NOM', 'Analyse')['MNEMONIQUE'] == 107
+    # Both add values, neither loses the bits of the other
+    assert first.get_entry('cours', 'NOM', 'Physique') is None
+    second.add_entry('cours', {'MNEMONIQUE': 108, 'NOM': 'Physique', 'COORDINATEUR': 'Y', 'CREDITS': 5})
+    first.add_entry('cours', {'MNEMONIQUE': 109, 'NOM': 'Chimie', 'COORDINATEUR': 'Z', 'CREDITS': 5})
+    third = Database('extra_db')
+    for name in ['Analyse', 'Physique', 'Chimie']:
+        assert first.get_entry('cours', 'NOM', name) is not None
+        assert third.get_entry('cours', 'NOM', name) is not None
+    assert third.get_bloom_filters('cours')['NOM'].count == 8
+
+########################################
+#            Import / export           #
+########################################
+
+def test_add_entries_in_any_field_order():
+    db = get_cours_db()
+    db.add_entries('cours', [
+        {'CREDITS': 5, 'COORDINATEUR': 'Joël Goossens', 'NOM': 'Systèmes', 'MNEMONIQUE': 201},
+        {'NOM': 'Algorithmique II', 'MNEMONIQUE': 203, 'CREDITS': 5, 'COORDINATEUR': 'Jean Cardinal'},
+    ])
+    assert db.get_entry('cours', 'MNEMONIQUE', 201) == {
+        'id': 6, 'MNEMONIQUE': 201, 'NOM': 'Systèmes', 'COORDINATEUR': 'Joël Goossens', 'CREDITS': 5}
+    assert db.get_table_size('cours') == len(COURSES) + 2
+    with pytest.raises(ValueError):
+        db.add_entries('cours', [COURSES[0], {'MNEMONIQUE': 1}])
+    assert db.get_table_size('cours') == len(COURSES) + 2
+
+def test_export_import_csv_and_ndjson(tmp_path):
+    db = get_cours_db()
+    signature = db.get_table_signature('cours')
+    expected = db.get_complete_table('cours')
+    assert db.export_csv('cours', tmp_path / 'cours.csv') == len(COURSES)
+    assert db.export_ndjson('cours', tmp_path / 'cours.ndjson') == len(COURSES)
+    for extension, import_file in [('csv', db.import_csv), ('ndjson', db.import_ndjson)]:
+        db.delete_table('cours')
+        db.create_table('cours', *signature)
+        nb_rows, rows_per_second = import_file('cours', tmp_path / f'cours.{extension}', batch_size=2)
+        assert nb_rows == len(COURSES)
+        assert rows_per_second > 0
+        assert db.get_complete_table('cours') == expected
+
+def test_import_converts_types(tmp_path):
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table('mesures', ('NOM', FieldType.STRING), ('ACTIF', FieldType.BOOL), ('VALEUR', FieldType.FLOAT64))
+    (tmp_path / 'mesures.csv').write_text('VALEUR,NOM,ACTIF\n1.5,a,true\n2,b,0\n', encoding='utf-8')
+    assert db.import_csv('mesures', tmp_path / 'mesures.csv')[0] == 2
+    assert db.get_complete_table('mesures') == [
+        {'id': 1, 'NOM': 'a', 'ACTIF': True, 'VALEUR': 1.5},
+        {'id': 2, 'NOM': 'b', 'ACTIF': False, 'VALEUR': 2.0},
+    ]
+    (tmp_path / 'erreur.csv').write_text('NOM,AUTRE\na,b\n', encoding='utf-8')
+    with pytest.raises(ValueError):
+        db.import_csv('mesures', tmp_path / 'erreur.csv')
+
+def test_script_import_export(tmp_path):
+    _ = get_empty_db('programme')
+    (tmp_path / 'cours.csv').write_text('MNEM,NOM,COORD\n101,Progra,T. Massart\n102,FDO,G. Geeraerts\n', encoding='utf-8')
+    output = run_uldb(f'''open(programme)
+create_table(cours,MNEM=INTEGER,NOM=STRING,COORD=STRING)
+import_from(cours,{tmp_path / 'cours.csv'})
+export_to(cours,{tmp_path / 'copie.ndjson'})
+''')
+    lines = output.split('\n')
+    assert lines[0].startswith('2 rows imported (')
+    assert lines[1] == '2 rows exported'
+    assert (tmp_path / 'copie.ndjson').read_text(encoding='utf-8').count('\n') == 2
+
+########################################
+#               Row codec              #
+########################################
+
+def test_codec_size_matches_entry():
+    from database import FieldType
+    db = get_typed_db()
+    entry_signature = db.get_entry_signature('mesures')
+    codec = db.get_codec(entry_signature)
+    assert codec.size == db.size_of_fields(entry_signature) + 2 * db.size_of_int(1)
+    assert db.get_codec(entry_signature) is codec
+    assert codec.string_indexes == [codec.index('NOM'), codec.index('LIEU')]
+    assert codec.field_types[codec.index('VALEUR')] == FieldType.FLOAT64
+
+def test_codec_scans_after_delete_and_reuse():
+    db = get_cours_db()
+    db.delete_entries('cours', 'CREDITS', 5)
+    db.add_entry('cours', {'MNEMONIQUE': 999, 'NOM': 'Nouveau', 'COORDINATEUR': 'Personne', 'CREDITS': 3})
+    expected = [course for course in COURSES if course['CREDITS'] != 5]
+
+    entries = db.get_complete_table('cours')
+    assert [entry['MNEMONIQUE'] for entry in entries[:-1]] == [course['MNEMONIQUE'] for course in expected]
+    assert entries[-1]['NOM'] == 'Nouveau'
+    assert db.select_entries('cours', ('NOM', 'CREDITS'), 'CREDITS', 3)[-1] == ('Nouveau', 3)
+    assert db.get_entry('cours', 'MNEMONIQUE', 999)['COORDINATEUR'] == 'Personne'
+
+def test_codec_reads_runs_of_entries():
+    db = get_cours_db()
+    db.reset_stats()
+    db.get_entries('cours', 'CREDITS', 1234)
+    small_table_reads = db.stats['reads']
+
+    db.add_entries('cours', COURSES * 10)
+    db.reset_stats()
+    db.get_entries('cours', 'CREDITS', 1234)
+    assert db.stats['entries_visited'] == len(COURSES) * 11
+    # Entries written in order are read in a single run, whatever their number
+    assert db.stats['reads'] == small_table_reads
+
+########################################
+#              Async API               #
+########################################
+
+def test_async_database_same_results():
+    import asyncio
+    from async_database import AsyncDatabase
+
+    async def main():
+        get_cours_db()
+        async with AsyncDatabase('extra_db') as db:
+            assert await db.get_table_size('cours') == len(COURSES)
+            assert await db.get_complete_table('cours') == get_cours_db().get_complete_table('cours')
+            assert await db.select_entry('cours', ('NOM',), 'MNEMONIQUE', 101) == 'Programmation'
+            assert await db.update_entries('cours', 'MNEMONIQUE', 101, 'CREDITS', 12)
+            assert (await db.get_entry('cours', 'MNEMONIQUE', 101))['CREDITS'] == 12
+            entries = [entry async for entry in db.iter_entries('cours', batch_size=3)]
+            assert [entry['MNEMONIQUE'] for entry in entries] == [course['MNEMONIQUE'] for course in COURSES]
+
+    asyncio.run(main())
+
+def test_async_database_orders_writes():
+    import asyncio
+    from async_database import AsyncDatabase
+    from database import FieldType
+
+    async def main():
+        get_empty_db()
+        async with AsyncDatabase('extra_db', max_workers=4) as db:
+            await db.create_table('a', ('N', FieldType.INTEGER), ('NOM', FieldType.STRING))
+            await db.create_table('b', ('N', FieldType.INTEGER), ('NOM', FieldType.STRING))
+            await asyncio.gather(*(
+                db.add_entry(table_name, {'N': n, 'NOM': 'x' * n})
+                for n in range(30) for table_name in ('a', 'b')
+            ))
+            for table_name in ('a', 'b'):
+                entries = await db.get_complete_table(table_name)
+                assert [(entry['id'], entry['N']) for entry in entries] == [(n + 1, n) for n in range(30)]
+
+    asyncio.run(main())
+
+def test_async_database_schema_and_text():
+    import asyncio
+    from async_database import AsyncDatabase
+    from database import FieldType
+
+    async def main():
+        get_cours_db()
+        async with AsyncDatabase('extra_db') as db:
+            assert (await db.analyze_table('cours'))['rows'] == len(COURSES)
+            await db.add_column('cours', 'SALLE', FieldType.STRING, 'A')
+            await db.drop_column('cours', 'COORDINATEUR')
+            assert [name for name, _ in await db.get_table_signature('cours')] == ['MNEMONIQUE', 'NOM', 'CREDITS', 'SALLE']
+            await db.create_text_index('cours', 'NOM')
+            assert [entry['MNEMONIQUE'] for entry in await db.get_entries_like('cours', 'NOM', 'Algo%')] == [103]
+            assert [entry['MNEMONIQUE'] for entry in await db.get_entries_containing('cours', 'NOM', 'mation')] == [101, 105]
+            report = await db.explain('get_entry', 'cours', 'MNEMONIQUE', 102)
+            assert report['result']['SALLE'] == 'A'
+
+    asyncio.run(main())
+
+########################################
+#             Result cache             #
+########################################
+
+def test_result_cache_until_table_changes():
+    get_cours_db()
+    from database import Database
+    db = Database('extra_db', result_cache_size=1 << 20)
+    version = db.get_version('cours')
+
+    first = db.get_entries('cours', 'CREDITS', 5)
+    first[0]['NOM'] = 'Changé' # Callers can't change the cached result
+    db.reset_stats()
+    assert db.get_entries('cours', 'CREDITS', 5) == get_cours_db().get_entries('cours', 'CREDITS', 5)
+    assert db.get_stats()['result_cache_hits'] == 1
+    assert db.get_stats()['reads'] == 0
+
+    db = Database('extra_db', result_cache_size=1 << 20)
+    assert db.select_entries('cours', ('NOM',), 'CREDITS', 10) == ['Programmation', 'Algorithmique I']
+    db.update_entries('cours', 'MNEMONIQUE', 103, 'NOM', 'Algo')
+    assert db.get_version('cours') > version
+    db.reset_stats()
+    assert db.select_entries('cours', ('NOM',), 'CREDITS', 10) == ['Programmation', 'Algo']
+    assert db.get_stats()['result_cache_hits'] == 0
+
+def test_result_cache_is_bounded():
+    from result_cache import ResultCache
+    cache = ResultCache(2000)
+    for i in range(100):
+        cache.put(('t', ('get_entry', 'N', i), 1), {'N': i, 'NOM': 'x' * 50})
+    assert cache.size <= 2000
+    assert cache.get(('t', ('get_entry', 'N', 99), 1)) == (True, {'N': 99, 'NOM': 'x' * 50})
+    assert cache.get(('t', ('get_entry', 'N', 0), 1)) == (False, None)
+    cache.drop_table('t')
+    assert cache.size == 0
+
+########################################
+#           Table statistics           #
+########################################
+
+def test_analyze_table():
+    db = get_cours_db()
+    assert db.get_table_stats('cours') is None
+    stats = db.analyze_table('cours')
+
+    assert stats['rows'] == len(COURSES)
+    assert stats['columns']['CREDITS']['distinct'] == 2
+    assert stats['columns']['MNEMONIQUE']['min'] == 101
+    assert stats['columns']['MNEMONIQUE']['max'] == 106
+    assert stats['columns']['CREDITS']['histogram'][0] == 5
+    assert 'histogram' not in stats['columns']['NOM']
+    assert (EXTRA_PATH / 'cours.stats').exists()
+
+    assert db.estimate_rows('cours', 'CREDITS', 5) == 3
+    assert db.estimate_rows('cours', 'MNEMONIQUE', 999) == 0
+    assert db.explain('get_entries', 'cours', 'CREDITS', 10)['plan'] == ['cours: full scan with filter on CREDITS (estimated 2 rows)']
+
+    # A value of another type is still refused like before the analysis
+    assert db.estimate_rows('cours', 'CREDITS', 'abc') is None
+    with pytest.raises(ValueError):
+        db.get_entries('cours', 'CREDITS', 'abc')
+
+def test_hyperloglog_and_histogram():
+    from table_stats import HyperLogLog, build_histogram
+    hll = HyperLogLog()
+    for i in range(20000):
+        hll.add(i % 5000)
+    assert abs(hll.count() - 5000) < 5000 * 0.1
+
+    histogram = build_histogram(list(range(1000)))
+    assert len(histogram) == 17 and histogram[0] == 0 and histogram[-1] == 999
+    assert histogram[4] == 249
+
+def test_table_stats_refreshed():
+    from database import Database
+    db = get_cours_db()
+    db.analyze_table('cours')
+
+    db.add_entry('cours', {'MNEMONIQUE': 107, 'NOM': '', 'COORDINATEUR': 'Personne', 'CREDITS': 5})
+    stats = Database('extra_db').get_table_stats('cours')
+    assert stats['rows'] == len(COURSES) + 1
+    assert stats['changes'] == 1
+    assert stats['columns']['NOM']['nulls'] == 1
+    assert stats['columns']['MNEMONIQUE']['max'] == 107
+
+    # Deleting 4 rows out of 6 is enough to analyze the table again
+    db.delete_entries('cours', 'CREDITS', 5)
+    stats = db.get_table_stats('cours')
+    assert stats['changes'] == 0
+    assert stats['rows'] == 2
+    assert stats['columns']['CREDITS']['distinct'] == 1
+
+def test_script_analyze():
+    _ = get_empty_db('programme')
+    output = run_uldb('''open(programme)
+create_table(cours,MNEM=INTEGER,NOM=STRING)
+insert_to(cours,MNEM=101,NOM="Progra")
+insert_to(cours,MNEM=102,NOM="")
+analyze(cours)
+''')
+    assert output.split('\n')[:4] == [
+        'rows: 2',
+        'id: 2 distinct, 0 nulls, min 1, max 2',
+        'MNEM: 2 distinct, 0 nulls, min 101, max 102',
+        'NOM: 2 distinct, 1 nulls, min , max Progra',
+    ]
+
+########################################
+#          Background vacuum           #
+########################################
+
+def test_background_vacuum():
+    from database import Database
+    get_cours_db()
+    db = Database('extra_db', background_vacuum=True)
+    size = (EXTRA_PATH / 'cours.table').stat().st_size
+
+    db.reset_stats()
+    assert db.delete_entries('cours', 'CREDITS', 5)
+    assert 'compaction' not in db.get_stats()['phases']
+    assert db.wait_for_vacuum(timeout=10)
+    db.close()
+
+    assert (EXTRA_PATH / 'cours.table').stat().st_size < size
+    assert db.get_complete_table('cours') == [
+        {'id': i + 1} | course for i, course in enumerate(COURSES) if course['CREDITS'] != 5
+    ]
+    assert list((EXTRA_PATH / '.vacuum').iterdir()) == []
+
+def test_vacuum_gives_up_if_table_changes(monkeypatch):
+    import database
+    db = get_cours_db()
+    monkeypatch.setattr(database, 'VACUUM_BATCH', 1)
+    monkeypatch.setattr(db, 'throttle_vacuum', lambda *_: db.update_entries('cours', 'MNEMONIQUE', 101, 'CREDITS', 1))
+
+    assert not db.vacuum_table('cours')
+    assert db.get_entry('cours', 'MNEMONIQUE', 101)['CREDITS'] == 1
+
+def test_background_vacuum_failures(monkeypatch):
+    from database import Database
+    get_cours_db()
+    db = Database('extra_db', background_vacuum=True)
+
+    # A table deleted meanwhile is only recorded
+    monkeypatch.setattr(db, 'vacuum_table', lambda table_name: db.open_table('absente', 'r'))
+    db.vacuum_worker.request('cours')
+    assert db.wait_for_vacuum(timeout=10)
+    assert [(table_name, type(error)) for table_name, error in db.vacuum_worker.failures] == [('cours', ValueError)]
+
+    # Other errors are raised to the caller waiting for the compactions
+    def fail(table_name):
+        raise RuntimeError(table_name)
+    monkeypatch.setattr(db, 'vacuum_table', fail)
+    db.vacuum_worker.request('cours')
+    with pytest.raises(RuntimeError):
+        db.wait_for_vacuum(timeout=10)
+    assert db.wait_for_vacuum(timeout=10)
+    db.close()
+
+def test_vacuum_io_budget():
+    from database import Database
+    from time import perf_counter
+    db = get_cours_db()
+    size = (EXTRA_PATH / 'cours.table').stat().st_size
+    db.add_entries('cours', COURSES * 100)
+
+    db = Database('extra_db', vacuum_io_budget=size * 100)
+    start = perf_counter()
+    assert db.vacuum_table('cours')
+    # The copy reads and writes the table at least once
+    assert perf_counter() - start > 0.5
+
+########################################
+#          Partitioned tables          #
+########################################
+
+def get_partitioned_db(partition_by: tuple) -> 'Database':
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table(
+        'cours',
+        ('MNEMONIQUE', FieldType.INTEGER),
+        ('NOM', FieldType.STRING),
+        ('COORDINATEUR', FieldType.STRING),
+        ('CREDITS', FieldType.INTEGER),
+        partition_by=partition_by
+    )
+    db.add_entries('cours', COURSES)
+    return db
+
+def test_hash_partitioned_table():
+    db = get_partitioned_db(('MNEMONIQUE', 'hash', 4))
+    assert db.list_tables() == ['cours']
+    assert len(list(EXTRA_PATH.glob('cours~*.table'))) == 4
+    assert db.get_table_size('cours') == len(COURSES)
+    assert sorted(entry['id'] for entry in db.get_complete_table('cours')) == list(range(1, len(COURSES) + 1))
+
+    report = db.explain('get_entry', 'cours', 'MNEMONIQUE', 103)
+    assert report['result']['NOM'] == 'Algorithmique I'
+    assert report['plan'][0] == 'cours: 1 of 4 partitions'
+    assert report['entries_visited'] < len(COURSES)
+    assert sorted(db.select_entries('cours', ('MNEMONIQUE',), 'CREDITS', 5)) == [102, 105, 106]
+
+    db.add_entry('cours', {'MNEMONIQUE': 107, 'NOM': 'Nouveau', 'COORDINATEUR': 'Personne', 'CREDITS': 5})
+    assert db.get_entry('cours', 'MNEMONIQUE', 107)['id'] == len(COURSES) + 1
+
+    db.delete_table('cours')
+    assert list(EXTRA_PATH.glob('cours*')) == []
+
+def test_partition_field_update_checked_first():
+    db = get_partitioned_db(('MNEMONIQUE', 'hash', 4))
+    with pytest.raises(ValueError):
+        db.update_entries('cours', 'MNEMONIQUE', 103, 'MNEMONIQUE', 'abc')
+    assert sorted(entry['MNEMONIQUE'] for entry in db.get_complete_table('cours')) == [101, 102, 103, 105, 106]
+
+    assert db.update_entries('cours', 'MNEMONIQUE', 103, 'MNEMONIQUE', 104)
+    assert db.get_entry('cours', 'MNEMONIQUE', 104)['NOM'] == 'Algorithmique I'
+
+def test_range_partitioned_table():
+    db = get_partitioned_db(('CREDITS', 'range', [6]))
+    assert db.get_table_size('cours~0') == 3
+    assert db.get_table_size('cours~1') == 2
+
+    # Moving an entry to another partition keeps its id
+    assert db.update_entries('cours', 'MNEMONIQUE', 101, 'CREDITS', 3)
+    assert db.get_table_size('cours~0') == 4
+    assert db.get_entry('cours', 'CREDITS', 3) == {'id': 1} | COURSES[0] | {'CREDITS': 3}
+
+    assert db.update_entries('cours', 'CREDITS', 10, 'NOM', 'Dix')
+    assert db.select_entries('cours', ('NOM',), 'CREDITS', 10) == ['Dix']
+    assert db.delete_entries('cours', 'CREDITS', 5)
+    assert db.get_table_size('cours') == 2
+    assert db.get_table_size('cours~0') == 1
+
+def test_range_partition_value_type_checked():
+    from database import FieldType
+    db = get_partitioned_db(('CREDITS', 'range', [6]))
+    with pytest.raises(ValueError):
+        db.get_entry('cours', 'CREDITS', 'six')
+    with pytest.raises(ValueError):
+        db.add_entry('cours', {'MNEMONIQUE': 107, 'NOM': 'Nouveau', 'COORDINATEUR': 'Personne', 'CREDITS': 'six'})
+    assert db.get_table_size('cours') == len(COURSES)
+    with pytest.raises(ValueError):
+        db.create_table('erreur', ('A', FieldType.INTEGER), partition_by=('A', 'range', ['m']))
+
+def test_script_partitioned_table():
+    _ = get_empty_db('programme')
+    output = run_uldb('''open(programme)
+create_table(cours,MNEM=INTEGER,CRED=INTEGER,partition_by=CRED:range:5:10)
+insert_to(cours,MNEM=101,CRED=10)
+insert_to(cours,MNEM=102,CRED=5)
+list_tables()
+explain(from_if_get(cours,CRED=5,MNEM))
+''')
+    lines = output.split('\n')
+    assert lines[0] == 'cours'
+    assert lines[1] == '102'
+    assert lines[2] == 'access path: cours: 1 of 3 partitions'
+
+########################################
+#              Snapshots               #
+########################################
+
+def test_snapshot_and_incremental_copy(tmp_path):
+    from database import Database
+    db = get_cours_db()
+    db.add_entries('cours', COURSES * 200)
+
+    report = db.snapshot(str(tmp_path / 'backup'), reflink=False)
+    assert report['method'] == 'diff'
+    assert report['bytes_copied'] == sum(path.stat().st_size for path in EXTRA_PATH.iterdir() if path.is_file())
+
+    # Only the blocks changed by the update are copied again
+    db.update_entries('cours', 'id', 1, 'CREDITS', 1)
+    report = db.snapshot(str(tmp_path / 'backup'), reflink=False)
+    assert 0 < report['bytes_copied'] <= 3 * 4096
+
+    backup = Database(str(tmp_path / 'backup'))
+    assert backup.get_complete_table('cours') == db.get_complete_table('cours')
+
+    db.delete_table('cours')
+    db.snapshot(str(tmp_path / 'backup'), reflink=False)
+    assert backup.list_tables() == []
+
+def test_snapshot_while_writing(tmp_path, monkeypatch):
+    import database
+    from database import Database
+    from threading import Thread
+    db = get_cours_db()
+    copy_directory = database.copy_directory
+
+    def copy_and_write(*args):
+        report = copy_directory(*args)
+        if not writes:
+            # Another thread isn't kept waiting by the copy
+            writes.append(Thread(target=db.add_entry, args=('cours', COURSES[0])))
+            writes[0].start()
+            writes[0].join(timeout=10)
+        return report
+
+    writes = []
+    monkeypatch.setattr(database, 'copy_directory', copy_and_write)
+    report = db.snapshot(str(tmp_path / 'backup'), reflink=False)
+    assert not writes[0].is_alive()
+    assert report['attempts'] == 2
+    assert Database(str(tmp_path / 'backup')).get_table_size('cours') == len(COURSES) + 1
+
+def test_snapshot_with_reflink(tmp_path):
+    from database import Database
+    db = get_cours_db()
+    report = db.snapshot(str(tmp_path / 'backup'))
+    assert report['method'] in ['reflink', 'diff'] # Depends on the file system
+    assert Database(str(tmp_path / 'backup')).get_complete_table('cours') == db.get_complete_table('cours')
+
+########################################
+#            Schema changes            #
+########################################
+
+def test_add_column_without_rewrite():
+    from database import FieldType
+    db = get_cours_db()
+    db.add_entries('cours', COURSES * 100)
+    table_bytes = (EXTRA_PATH / 'cours.table').read_bytes()
+
+    db.add_column('cours', 'SALLE', FieldType.STRING, 'P.A2')
+    assert (EXTRA_PATH / 'cours.table').read_bytes() == table_bytes
+    assert db.get_table_signature('cours')[-1] == ('SALLE', FieldType.STRING)
+    assert db.get_entry('cours', 'MNEMONIQUE', 101) == {'id': 1} | COURSES[0] | {'SALLE': 'P.A2'}
+    assert db.select_entry('cours', ('MNEMONIQUE', 'SALLE'), 'id', 2) == (102, 'P.A2')
+
+    # The default value doesn't need the new field in the file
+    db.add_entry('cours', COURSES[0] | {'SALLE': 'P.A2'})
+    assert 'schema' in db.get_table_options('cours')
+
+    # Another value makes the table be rewritten once
+    db.add_entry('cours', COURSES[1] | {'SALLE': 'Forum'})
+    assert 'schema' not in db.get_table_options('cours')
+    assert db.get_entries('cours', 'SALLE', 'Forum') == [{'id': 507} | COURSES[1] | {'SALLE': 'Forum'}]
+    assert len(db.get_entries('cours', 'SALLE', 'P.A2')) == 506
+
+def test_read_added_column_without_rewrite():
+    from database import FieldType
+    db = get_cours_db()
+    db.add_column('cours', 'SALLE', FieldType.STRING, 'P.A2')
+    table_bytes = (EXTRA_PATH / 'cours.table').read_bytes()
+
+    # Conditions on the added field are checked against its default value
+    assert len(db.get_entries('cours', 'SALLE', 'P.A2')) == len(COURSES)
+    assert db.get_entry('cours', 'SALLE', 'Forum') is None
+    assert db.select_entries('cours', ('MNEMONIQUE',), 'SALLE', 'P.A2') == [101, 102, 103, 105, 106]
+    assert len(db.get_entries_like('cours', 'SALLE', 'P.%')) == len(COURSES)
+    with pytest.raises(ValueError):
+        db.get_entries('cours', 'SALLE', 1)
+    assert 'rewrite' not in db.get_stats()['phases']
+    assert (EXTRA_PATH / 'cours.table').read_bytes() == table_bytes
+    assert 'schema' in db.get_table_options('cours')
+
+def test_drop_column_without_rewrite():
+    db = get_cours_db()
+    db.drop_column('cours', 'COORDINATEUR')
+    assert [field[0] for field in db.get_table_signature('cours')] == ['MNEMONIQUE', 'NOM', 'CREDITS']
+    assert db.get_entry('cours', 'id', 1) == {'id': 1, 'MNEMONIQUE': 101, 'NOM': 'Programmation', 'CREDITS': 10}
+    assert db.select_entries('cours', ('NOM', 'COORDINATEUR'), 'CREDITS', 10) == ['Programmation', 'Algorithmique I']
+    with pytest.raises(ValueError):
+        db.get_entries('cours', 'COORDINATEUR', 'Thierry Massart')
+
+    db.add_entry('cours', {'MNEMONIQUE': 107, 'NOM': 'Nouveau', 'CREDITS': 5})
+    assert db.get_entry('cours', 'MNEMONIQUE', 107) == {'id': 6, 'MNEMONIQUE': 107, 'NOM': 'Nouveau', 'CREDITS': 5}
+
+    # The compaction writes the new schema
+    db.delete_entries('cours', 'CREDITS', 5)
+    assert 'schema' not in db.get_table_options('cours')
+    assert db.get_table_signature('cours') == db.read_table_signature('cours')
+    assert db.get_complete_table('cours') == [
+        {'id': 1, 'MNEMONIQUE': 101, 'NOM': 'Programmation', 'CREDITS': 10},
+        {'id': 3, 'MNEMONIQUE': 103, 'NOM': 'Algorithmique I', 'CREDITS': 10},
+    ]
+
+def test_drop_then_add_column():
+    from database import FieldType
+    db = get_cours_db()
+    db.drop_column('cours', 'COORDINATEUR')
+    db.add_column('cours', 'COORDINATEUR', FieldType.STRING, 'Personne')
+    assert db.get_entry('cours', 'id', 1)['COORDINATEUR'] == 'Personne'
+    assert len(db.get_entries('cours', 'COORDINATEUR', 'Personne')) == len(COURSES)
+    assert db.get_entries('cours', 'COORDINATEUR', 'Thierry Massart') == []
+    assert len(db.get_entries_like('cours', 'COORDINATEUR', 'Pers%')) == len(COURSES)
+
+    # The new value is written by a rewrite with the new field
+    assert db.update_entries('cours', 'MNEMONIQUE', 101, 'COORDINATEUR', 'Quelqu\'un')
+    assert 'schema' not in db.get_table_options('cours')
+    assert db.select_entries('cours', ('MNEMONIQUE',), 'COORDINATEUR', 'Personne') == [102, 103, 105, 106]
+
+def test_script_schema_changes():
+    _ = get_empty_db('programme')
+    output = run_uldb('''open(programme)
+create_table(cours,MNEM=INTEGER,NOM=STRING)
+insert_to(cours,MNEM=101,NOM="Progra")
+add_column(cours,CRED=INT8,default=5)
+drop_column(cours,NOM)
+from_if_get(cours,MNEM=101,*)
+''')
+    assert output.split('\n')[0] == '(101, 5)'
+
+
+########################################
+#             Text search              #
+########################################
+
+def test_like_and_contains():
+    db = get_cours_db()
+    db.create_text_index('cours', 'NOM')
+    assert db.get_entries_like('cours', 'NOM', 'Algo%') == [{'id': 3} | COURSES[2]]
+    assert [entry['MNEMONIQUE'] for entry in db.get_entries_like('cours', 'NOM', '%I')] == [103, 105, 106]
+    assert [entry['MNEMONIQUE'] for entry in db.get_entries_containing('cours', 'NOM', 'gram')] == [101, 105]
+    assert db.get_entries_like('cours', 'NOM', 'Pro_et%') == [{'id': 5} | COURSES[4]]
+    assert db.get_entries_like('cours', 'NOM', 'gram%') == []
+
+    # Same results without the index
+    db.set_table_options('cours', {})
+    assert [entry['MNEMONIQUE'] for entry in db.get_entries_containing('cours', 'NOM', 'gram')] == [101, 105]
+
+def test_text_index_checks_entries():
+    from database import Database
+    db = get_cours_db()
+    db.create_text_index('cours', 'NOM')
+    db.delete_entries('cours', 'MNEMONIQUE', 101)
+    db.add_entry('cours', {'MNEMONIQUE': 107, 'NOM': 'Analyse', 'COORDINATEUR': 'X', 'CREDITS': 5})
+    db.update_entries('cours', 'MNEMONIQUE', 105, 'NOM', 'Langages de scripts')
+    assert db.get_entries_containing('cours', 'NOM', 'gram') == []
+    assert db.get_entries_like('cours', 'NOM', 'Ana%')[0]['MNEMONIQUE'] == 107
+
+    # The postings are read again by another database
+    db = Database('extra_db')
+    assert db.get_entries_like('cours', 'NOM', 'Langages de s%')[0]['MNEMONIQUE'] == 105
+
+def test_text_index_skips_deleted_entries():
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table('cours', ('N', FieldType.INTEGER), ('NOM', FieldType.STRING), text_index=('NOM',))
+    db.add_entries('cours', [{'N': i, 'NOM': 'Algorithmique' if i < 3 else f'Cours {i}'} for i in range(10)])
+
+    # Deleted slots point to each other like entries do
+    db.delete_entries('cours', 'N', 0)
+    db.delete_entries('cours', 'N', 1)
+    assert [entry['N'] for entry in db.get_entries_like('cours', 'NOM', 'Algo%')] == [2]
+    assert [entry['N'] for entry in db.get_entries('cours', 'NOM', 'Algorithmique')] == [2]
+
+    # A reused slot holds another value
+    db.add_entry('cours', {'N': 10, 'NOM': 'Analyse'})
+    assert sorted(entry['N'] for entry in db.get_entries_like('cours', 'NOM', 'A%')) == [2, 10]
+
+def test_text_index_reads_fewer_entries():
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table('cours', ('MNEMONIQUE', FieldType.INTEGER), ('NOM', FieldType.STRING), text_index=('NOM',))
+    db.add_entries('cours', [{'MNEMONIQUE': i, 'NOM': f'Cours {i}'} for i in range(1000)])
+
+    db.reset_stats()
+    assert [entry['MNEMONIQUE'] for entry in db.get_entries_like('cours', 'NOM', 'Cours 42%')] == [42] + list(range(420, 430))
+    assert db.get_stats()['entries_visited'] == 11
+    assert 'trigram index' in db.get_stats()['plan'][0]
+
+    # The index is written again when the table is compacted
+    db.delete_entries('cours', 'MNEMONIQUE', 42)
+    assert db.get_entries_like('cours', 'NOM', 'Cours 42_') == [{'id': 421 + i, 'MNEMONIQUE': 420 + i, 'NOM': f'Cours {420 + i}'} for i in range(10)]
+
+def test_script_text_search():
+    _ = get_empty_db('programme')
+    output = run_uldb('''open(programme)
+create_table(cours,MNEM=INTEGER,NOM=STRING,text_index=NOM)
+insert_to(cours,MNEM=101,NOM="Programmation")
+insert_to(cours,MNEM=103,NOM="Algorithmique I")
+from_if_get(cours,NOM LIKE "Algo%",MNEM)
+from_if_get(cours,NOM CONTAINS "gram",MNEM)
+''')
+    assert output.split('\n')[:2] == ['103', '101']
+
+
+########################################
+#        Scan in physical order        #
+########################################
+
+def get_fragmented_db(**options) -> 'Database':
+    from database import FieldType
+    db = get_empty_db(vacuum_ratio=100, **options)
+    db.create_table('mots', ('NUMERO', FieldType.INTEGER), ('PAIR', FieldType.BOOL))
+    db.add_entries('mots', [{'NUMERO': i, 'PAIR': i % 2 == 0} for i in range(2000)])
+    db.delete_entries('mots', 'PAIR', True)
+
+    # New entries reuse the deleted slots, from the last deleted one
+    db.add_entries('mots', [{'NUMERO': i, 'PAIR': True} for i in range(2000, 2500)])
+    return db
+
+def test_physical_scan_same_entries():
+    from database import Database
+    chain_entries = get_fragmented_db().get_complete_table('mots')
+    db = Database('extra_db', physical_scan=True)
+    physical_entries = db.get_complete_table('mots')
+    assert sorted(physical_entries, key=lambda entry: entry['id']) == sorted(chain_entries, key=lambda entry: entry['id'])
+    assert [entry['NUMERO'] for entry in db.get_entries('mots', 'PAIR', True)] == list(range(2000, 2500))[::-1]
+    assert 'physical order' in db.explain('get_entries', 'mots', 'PAIR', True)['plan'][0]
+
+def test_physical_scan_compaction_keeps_ids():
+    from database import Database
+    get_fragmented_db()
+    db = Database('extra_db', physical_scan=True)
+    db.delete_entries('mots', 'PAIR', False) # Compacted, the entries with the largest ids are not in the last slots
+    assert db.get_table_size('mots') == 500
+    db.add_entries('mots', [{'NUMERO': i, 'PAIR': False} for i in range(3000, 3010)])
+    ids = [entry['id'] for entry in db.get_complete_table('mots')]
+    assert len(set(ids)) == len(ids) == 510
+    assert db.get_entry('mots', 'NUMERO', 3000)['id'] == 2501
+
+def test_physical_scan_sequential_reads():
+    from database import Database
+    db = get_fragmented_db()
+    db.reset_stats()
+    db.get_complete_table('mots')
+    chain_seeks = db.get_stats()['seeks']
+
+    db = Database('extra_db', physical_scan=True)
+    db.get_complete_table('mots')
+    assert (EXTRA_PATH / 'mots.slots').exists() # Built once from the deleted entries
+    db.reset_stats()
+    db.get_complete_table('mots')
+    assert db.get_stats()['seeks'] * 10 < chain_seeks
+
+    # The bitmap is kept up to date by the writes, even of a database scanning in chain order
+    chain_db = Database('extra_db')
+    chain_db.delete_entries('mots', 'NUMERO', 1)
+    chain_db.delete_entries('mots', 'NUMERO', 2001)
+    chain_db.add_entries('mots', [{'NUMERO': i, 'PAIR': False} for i in range(3000, 3010)])
+    db.reset_stats()
+    physical_entries = db.get_complete_table('mots')
+    assert db.get_stats()['seeks'] * 10 < chain_seeks
+    by_id = lambda entry: entry['id']
+    assert sorted(physical_entries, key=by_id) == sorted(chain_db.get_complete_table('mots'), key=by_id)
+    assert len(physical_entries) == 1508
+
+
+########################################
+#              Durability              #
+########################################
+
+def test_durability_none_and_per_statement():
+    from database import Database
+    db = get_cours_db()
+    assert db.get_stats()['syncs'] == 0
+
+    db = Database('extra_db', durability='per-statement')
+    db.add_entry('cours', COURSES[0])
+    assert db.get_stats()['syncs'] > 0
+    db.reset_stats()
+    db.delete_entries('cours', 'MNEMONIQUE', 102)
+    assert db.get_stats()['syncs'] > 0
+
+    with pytest.raises(ValueError):
+        Database('extra_db', durability='sometimes')
+
+def test_durability_per_transaction():
+    from database import Database
+    _ = get_cours_db()
+    db = Database('extra_db', durability='per-transaction')
+    with db.transaction():
+        db.add_entry('cours', COURSES[0])
+        db.update_entries('cours', 'MNEMONIQUE', 101, 'CREDITS', 6)
+        assert db.get_stats()['syncs'] == 0
+
+        # Written data is seen by other handles before the sync
+        assert Database('extra_db').get_entries('cours', 'CREDITS', 6)[0]['id'] == 1
+    assert db.get_stats()['syncs'] > 0
+
+    # A write outside of a transaction is synced at once
+    db.reset_stats()
+    db.add_entry('cours', COURSES[1])
+    assert db.get_stats()['syncs'] > 0
+
+def test_durability_interval():
+    from database import Database
+    from time import sleep
+    _ = get_cours_db()
+    db = Database('extra_db', durability='interval(50)')
+    db.add_entry('cours', COURSES[0])
+    db.add_entry('cours', COURSES[1])
+    assert db.get_stats()['syncs'] == 0
+
+    for _ in range(100):
+        if db.get_stats()['syncs'] > 0:
+            break
+        sleep(0.01)
+    assert db.get_stats()['syncs'] > 0
+    db.close()
+
+
+########################################
+#               Catalog                #
+########################################
+
+def test_catalog_lists_tables_once(monkeypatch):
+    import database
+    db = get_cours_db()
+    (EXTRA_PATH / 'notes.txt').write_text('pas une table')
+    (EXTRA_PATH / 'vieux.table').mkdir()
+    assert db.list_tables() == ['cours']
+
+    nb_listdir = []
+    listdir = database.listdir
+    monkeypatch.setattr(database, 'listdir', lambda path: nb_listdir.append(path) or listdir(path))
+    for _ in range(10):
+        assert db.table_exists('cours')
+        db.get_entry('cours', 'MNEMONIQUE', 101)
+    assert nb_listdir == []
+
+    (EXTRA_PATH / 'notes.txt').unlink()
+    (EXTRA_PATH / 'vieux.table').rmdir()
+
+def test_catalog_sees_other_databases():
+    from database import Database, FieldType
+    db = get_cours_db()
+    assert not db.table_exists('profs')
+
+    other = Database('extra_db')
+    other.create_table('profs', ('NOM', FieldType.STRING))
+    assert db.table_exists('profs')
+    assert sorted(db.list_tables()) == ['cours', 'profs']
+
+    other.delete_table('profs')
+    assert not db.table_exists('profs')
+    with pytest.raises(ValueError):
+        db.get_complete_table('profs')
+
+def test_table_info():
+    db = get_cours_db()
+    info = db.table_info('cours')
+    assert info['rows'] == len(COURSES)
+    assert info['format'] == 1
+    assert info['size'] >= (EXTRA_PATH / 'cours.table').stat().st_size
+
+    db.add_entries('cours', COURSES)
+    assert db.table_info('cours')['rows'] == 2 * len(COURSES)
+    with pytest.raises(ValueError):
+        db.table_info('absente')
+
+
+########################################
+#            Read-only mode            #
+########################################
+
+def test_read_only_database():
+    from database import Database, FieldType
+    get_cours_db()
+    table_bytes = (EXTRA_PATH / 'cours.table').read_bytes()
+
+    db = Database('extra_db', read_only=True)
+    assert db.get_complete_table('cours') == [{'id': i + 1} | course for i, course in enumerate(COURSES)]
+    assert db.select_entries('cours', ('MNEMONIQUE',), 'CREDITS', 5) == [102, 105, 106]
+
+    with pytest.raises(ValueError):
+        db.add_entry('cours', COURSES[0])
+    with pytest.raises(ValueError):
+        db.update_entries('cours', 'MNEMONIQUE', 101, 'CREDITS', 1)
+    with pytest.raises(ValueError):
+        db.delete_entries('cours', 'MNEMONIQUE', 101)
+    with pytest.raises(ValueError):
+        db.create_table('profs', ('NOM', FieldType.STRING))
+    with pytest.raises(ValueError):
+        db.delete_table('cours')
+    with pytest.raises(ValueError):
+        db.analyze_table('cours')
+    assert (EXTRA_PATH / 'cours.table').read_bytes() == table_bytes
+
+    with pytest.raises(ValueError):
+        Database('absente', read_only=True)
+    with pytest.raises(ValueError):
+        Database('extra_db', use_mmap=True)
+
+def test_read_only_memory_map():
+    from database import Database
+    writer = get_cours_db(result_cache_size=0)
+    writer.create_table('mots', *[(name, type) for name, type in writer.get_table_signature('cours')], bloom=('NOM',))
+    writer.add_entries('mots', COURSES)
+
+    db = Database('extra_db', read_only=True, use_mmap=True)
+    assert db.get_entry('mots', 'NOM', 'Programmation')['MNEMONIQUE'] == 101
+    assert db.get_entries('mots', 'NOM', 'Analyse') == []
+
+    # Changes of the writer are seen, with the new bloom filter
+    writer.add_entry('mots', {'MNEMONIQUE': 107, 'NOM': 'Analyse', 'COORDINATEUR': 'X', 'CREDITS': 5})
+    assert db.get_entries('mots', 'NOM', 'Analyse')[0]['MNEMONIQUE'] == 107
+    assert db.get_table_size('mots') == len(COURSES) + 1
+
+
+########################################
+#         Multi-column updates         #
+########################################
+
+def test_update_fields_single_pass(monkeypatch):
+    db = get_cours_db()
+    upgrades = []
+    upgrade_db = db.upgrade_db
+    monkeypatch.setattr(db, 'upgrade_db', lambda *args: upgrades.append(upgrade_db(*args)) or upgrades[-1])
+
+    db.reset_stats()
+    assert db.update_fields('cours', 'CREDITS', 5, {
+        'CREDITS': ('CREDITS', '+', 1),
+        'NOM': ('NOM', '+', ' (nouveau programme)'),
+        'COORDINATEUR': 'X'
+    })
+    # One scan, and one shift of the pointers of all entries for the three longer names
+    assert db.get_stats()['entries_visited'] == 2 * len(COURSES)
+    assert len(upgrades) == 1
+
+    assert db.select_entries('cours', ('NOM', 'CREDITS'), 'COORDINATEUR', 'X') == [
+        (course['NOM'] + ' (nouveau programme)', 6) for course in COURSES if course['CREDITS'] == 5
+    ]
+    assert db.get_entry('cours', 'MNEMONIQUE', 101) == {'id': 1} | COURSES[0]
+
+def test_update_fields_checks_all_values():
+    db = get_cours_db()
+    with pytest.raises(ValueError):
+        db.update_fields('cours', 'CREDITS', 10, {'NOM': 'Analyse', 'CREDITS': ('NOM', '+', 1)})
+    with pytest.raises(ValueError):
+        db.update_fields('cours', 'CREDITS', 10, {'CREDITS': ('CREDITS', '/', 2)})
+
+    # Nothing was written
+    assert db.get_complete_table('cours') == [{'id': index + 1} | course for index, course in enumerate(COURSES)]
+
+def test_update_fields_moves_partitioned_entries():
+    db = get_partitioned_db(('MNEMONIQUE', 'hash', 4))
+    assert db.update_fields('cours', 'CREDITS', 5, {'MNEMONIQUE': ('MNEMONIQUE', '+', 100), 'CREDITS': 6})
+
+    # Some entries go to the partition another one just left
+    assert sorted((entry['MNEMONIQUE'], entry['CREDITS']) for entry in db.get_complete_table('cours')) == [
+        (101, 10), (103, 10), (202, 6), (205, 6), (206, 6)
+    ]
+    assert db.get_entry('cours', 'MNEMONIQUE', 206)['NOM'] == 'Projet d\'informatique I'
+
+def test_script_update_several_fields():
+    _ = get_empty_db('programme')
+    output = run_uldb('''open(programme)
+create_table(cours,MNEM=INTEGER,NOM=STRING,CRED=INTEGER)
+insert_to(cours,MNEM=101,NOM="Progra",CRED=5)
+from_update_where(cours,MNEM=101,CRED=CRED*2,NOM="Programmation")
+from_if_get(cours,MNEM=101,NOM,CRED)
+''')
+    assert output.split('\n')[0] == "('Programmation', 10)"
+
+
+########################################
+#             Replication              #
+########################################
+
+def test_follower_applies_changes(tmp_path):
+    from database import Database, FieldType
+    from replication import Follower
+    leader = Database(str(tmp_path / 'leader'), change_log=True)
+    leader.create_table('cours', ('MNEMONIQUE', FieldType.INTEGER), ('NOM', FieldType.STRING),
+                        ('COORDINATEUR', FieldType.STRING), ('CREDITS', FieldType.INT8), bloom=('NOM',))
+    leader.create_table('notes', ('MNEMONIQUE', FieldType.INTEGER), partition_by=('MNEMONIQUE', 'range', [103]))
+    leader.add_entries('cours', COURSES)
+    leader.add_entries('notes', [{'MNEMONIQUE': course['MNEMONIQUE']} for course in COURSES])
+    leader.update_fields('cours', 'CREDITS', 5, {'CREDITS': ('CREDITS', '+', 1), 'NOM': 'X'})
+    leader.delete_entries('cours', 'MNEMONIQUE', 101)
+    leader.add_column('cours', 'LANGUE', FieldType.STRING, 'fr')
+    with pytest.raises(ValueError):
+        leader.add_entry('cours', {'MNEMONIQUE': 'abc'}) # Failed writes are not logged
+
+    follower = Follower(str(tmp_path / 'leader'), str(tmp_path / 'follower'))
+    assert follower.get_lag()['changes'] == 7
+    assert follower.poll() == 7
+    assert follower.get_lag() == {'changes': 0, 'bytes': 0, 'seconds': 0}
+
+    reader = follower.open_reader()
+    for table_name in ['cours', 'notes']:
+        assert reader.get_complete_table(table_name) == leader.get_complete_table(table_name)
+    with pytest.raises(ValueError):
+        reader.add_entry('cours', COURSES[0])
+
+def test_follower_thread_and_restart(tmp_path):
+    from database import Database, FieldType
+    from replication import Follower
+    from time import sleep
+    leader = Database(str(tmp_path / 'leader'), change_log=True)
+    leader.create_table('cours', ('MNEMONIQUE', FieldType.INTEGER))
+
+    follower = Follower(str(tmp_path / 'leader'), str(tmp_path / 'follower'), poll_interval=0.01)
+    follower.start()
+    leader.add_entries('cours', [{'MNEMONIQUE': 101}, {'MNEMONIQUE': 102}])
+    for _ in range(500):
+        if follower.get_lag()['changes'] == 0 and follower.last_change == 2:
+            break
+        sleep(0.01)
+    follower.stop()
+    assert follower.errors == []
+    assert follower.open_reader().get_table_size('cours') == 2
+
+    # A change still being written is left for later, and nothing is applied twice after a restart
+    leader.delete_entries('cours', 'MNEMONIQUE', 101)
+    with open(tmp_path / 'leader' / '.changes.ndjson', 'a') as log_file:
+        log_file.write('{"change": 4')
+    follower = Follower(str(tmp_path / 'leader'), str(tmp_path / 'follower'))
+    assert follower.poll() == 1
+    assert follower.get_lag()['changes'] == 0
+    assert follower.open_reader().get_complete_table('cours') == [{'id': 2, 'MNEMONIQUE': 102}]
+
+def test_follower_keeps_leader_ids(tmp_path):
+    from database import Database, FieldType
+    from replication import Follower
+    leader = Database(str(tmp_path / 'leader'), change_log=True)
+    leader.create_table('cours', ('MNEMONIQUE', FieldType.INTEGER))
+    leader.create_table('notes', ('MNEMONIQUE', FieldType.INTEGER), engine='lsm')
+    for table_name in ['cours', 'notes']:
+        leader.add_entries(table_name, [{'MNEMONIQUE': course['MNEMONIQUE']} for course in COURSES])
+        for mnemonique in [103, 105, 106]:
+            leader.delete_entries(table_name, 'MNEMONIQUE', mnemonique) # The leader compacts 'cours' and gives id 3 again
+        leader.add_entry(table_name, {'MNEMONIQUE': 107})
+    leader.add_entry('notes', {'id': 2, 'MNEMONIQUE': 202})
+
+    # The follower never compacts, its next ids would not be the ones of the leader
+    follower = Follower(str(tmp_path / 'leader'), str(tmp_path / 'follower'), vacuum_ratio=100)
+    follower.poll()
+    reader = follower.open_reader()
+    for table_name in ['cours', 'notes']:
+        assert reader.get_complete_table(table_name) == leader.get_complete_table(table_name)
+
+
+########################################
+#              Large files             #
+########################################
+
+def test_large_file_table():
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table('cours', ('MNEMONIQUE', FieldType.INTEGER), ('NOM', FieldType.STRING),
+                    ('COORDINATEUR', FieldType.STRING), ('CREDITS', FieldType.INTEGER), large_file=True, text_index=('NOM',))
+    db.add_entries('cours', COURSES)
+    db.add_entry('cours', COURSES[0] | {'id': 2 ** 40}) # Ids are 8 bytes long
+    with open(EXTRA_PATH / 'cours.table', 'rb') as file:
+        assert file.read(4) == b'ULD8'
+    assert db.table_info('cours')['format'] == 2
+    assert db.get_entry_signature('cours')[0] == ('id', FieldType.INT64)
+    assert db.get_entry('cours', 'id', 2 ** 40)['NOM'] == 'Programmation'
+
+    # Strings moved by a growing string buffer, deleted slots and compactions keep 8-byte pointers
+    db.update_fields('cours', 'CREDITS', 5, {'NOM': ('NOM', '+', ' (nouveau programme)')})
+    for mnemonique in [102, 103, 105]:
+        db.delete_entries('cours', 'MNEMONIQUE', mnemonique)
+    db.add_entry('cours', COURSES[1])
+    assert db.table_info('cours')['format'] == 2
+    assert [entry['id'] for entry in db.get_complete_table('cours')] == [1, 5, 2 ** 40, 2 ** 40 + 1]
+    assert db.get_entries_containing('cours', 'NOM', 'nouveau') == [
+        {'id': 5} | COURSES[4] | {'NOM': COURSES[4]['NOM'] + ' (nouveau programme)'}
+    ]
+
+def test_large_file_id_types():
+    from database import FieldType
+    db = get_empty_db()
+    with pytest.raises(ValueError):
+        db.create_table('cours', ('id', FieldType.INT64), ('NOM', FieldType.STRING))
+    db.create_table('cours', ('id', FieldType.INT64), ('NOM', FieldType.STRING), large_file=True)
+    db.create_table('notes', ('NOTE', FieldType.INT8), partition_by=('NOTE', 'range', [10]), large_file=True)
+    db.add_entries('notes', [{'NOTE': 8}, {'NOTE': 15}])
+    assert db.get_complete_table('notes') == [{'id': 1, 'NOTE': 8}, {'id': 2, 'NOTE': 15}]
+    assert db.table_info('notes')['format'] == 2
+
+
+########################################
+#              Pagination              #
+########################################
+
+@pytest.mark.parametrize('physical_scan', [False, True])
+def test_select_page(physical_scan: bool):
+    from database import FieldType
+    db = get_empty_db(physical_scan=physical_scan)
+    db.create_table('notes', ('NOM', FieldType.STRING), ('NOTE', FieldType.INTEGER))
+    db.add_entries('notes', [{'NOM': f'Etudiant {index}', 'NOTE': index % 2} for index in range(200)])
+    db.delete_entries('notes', 'NOM', 'Etudiant 3')
+
+    # Every page reads its own entries, however deep it is
+    names, cursor, nb_pages = [], None, 0
+    while True:
+        db.reset_stats()
+        page, cursor = db.select_page('notes', ('NOM',), None, None, 10, cursor)
+        assert db.get_stats()['entries_visited'] == len(page)
+        names += page
+        nb_pages += 1
+        if cursor is None:
+            break
+    assert names == [f'Etudiant {index}' for index in range(200) if index != 3]
+    assert nb_pages == 20
+
+    page, cursor = db.select_page('notes', ('NOM', 'NOTE'), 'NOTE', 1, 3)
+    assert page == [('Etudiant 1', 1), ('Etudiant 5', 1), ('Etudiant 7', 1)]
+    assert db.select_page('notes', ('NOM',), 'NOTE', 1, 2, cursor)[0] == ['Etudiant 9', 'Etudiant 11']
+
+    # A cursor is only valid for the version of the table it was made on
+    db.add_entry('notes', {'NOM': 'Etudiant 200', 'NOTE': 0})
+    with pytest.raises(ValueError):
+        db.select_page('notes', ('NOM',), 'NOTE', 1, 2, cursor)
+    with pytest.raises(ValueError):
+        db.select_page('notes', ('NOM',), None, None, 2, 'pas un curseur')
+
+def test_select_page_partitioned():
+    db = get_partitioned_db(('CREDITS', 'range', [6]))
+    pages, cursor = [], None
+    while True:
+        page, cursor = db.select_page('cours', ('MNEMONIQUE',), None, None, 2, cursor)
+        pages.append(page)
+        if cursor is None:
+            break
+    assert pages == [[102, 105], [106, 101], [103]]
+    assert db.select_page('cours', ('MNEMONIQUE',), 'CREDITS', 10, 5) == ([101, 103], None)
+
+def test_script_limit():
+    _ = get_empty_db('programme')
+    output = run_uldb('''open(programme)
+create_table(cours,MNEM=INTEGER,NOM=STRING,CRED=INTEGER)
+insert_to(cours,MNEM=101,NOM="Progra",CRED=10)
+insert_to(cours,MNEM=102,NOM="FDO",CRED=5)
+insert_to(cours,MNEM=103,NOM="Algo",CRED=10)
+insert_to(cours,MNEM=105,NOM="LDP",CRED=10)
+from_if_get(cours,CRED=10,NOM,LIMIT 2)
+''')
+    lines = output.split('\n')
+    assert lines[:2] == ['Progra', 'Algo']
+    assert lines[2].startswith('CURSOR ')
+
+    output = run_uldb(f'''open(programme)
+from_if_get(cours,CRED=10,NOM,LIMIT 2,{lines[2]})
+''')
+    assert output == 'LDP'
+
+    # A text condition takes the limit, it has no next page
+    output = run_uldb('''open(programme)
+from_if_get(cours,NOM LIKE "%",MNEM,LIMIT 2)
+''')
+    assert output == '101\n102'
+
+
+########################################
+#               Row cache              #
+########################################
+
+def test_offset_cache():
+    from row_cache import OffsetCache
+    cache = OffsetCache(3)
+    for offset in [0, 10, 20]:
+        cache.put(offset, f'valeur {offset}', 10)
+    assert cache.get(0) == (True, 'valeur 0')
+    cache.put(30, 'valeur 30', 10) # Drops the least recently used
+    assert cache.get(10) == (False, None)
+
+    cache.invalidate(29, 1) # Last byte of 20
+    assert [cache.get(offset)[0] for offset in [0, 20, 30]] == [True, False, True]
+    cache.invalidate(40, 4)
+    cache.invalidate(5, 26) # First byte of 30
+    assert len(cache) == 0
+
+def test_row_cache_hits():
+    db = get_cours_db(row_cache_size=16)
+    for _ in range(2):
+        db.reset_stats()
+        assert db.get_entry('cours', 'MNEMONIQUE', 103) == {'id': 3} | COURSES[2]
+        assert db.get_entries('cours', 'NOM', 'Algorithmique I') == [{'id': 3} | COURSES[2]]
+
+    row_stats = db.get_row_cache_stats()
+    assert row_stats['rows'] == {'hits': 2, 'misses': 0, 'hit_rate': 1}
+    assert row_stats['strings']['misses'] == 0 and row_stats['strings']['hits'] > 0
+    assert row_stats['tables']['cours']['rows'] == 1
+
+@pytest.mark.parametrize('row_cache_size', [0, 2, 64])
+def test_row_cache_invalidation(row_cache_size: int):
+    db = get_cours_db(row_cache_size=row_cache_size, vacuum_ratio=2)
+
+    def get_names():
+        return [db.get_entry('cours', 'MNEMONIQUE', course['MNEMONIQUE'])['NOM'] for course in COURSES]
+
+    assert get_names() == [course['NOM'] for course in COURSES]
+
+    # Strings overwritten in place, then moved by a growing string buffer
+    db.update_entries('cours', 'MNEMONIQUE', 101, 'NOM', 'Progra')
+    db.update_entries('cours', 'MNEMONIQUE', 102, 'NOM', 'Fonctionnement des ordinateurs et des réseaux')
+    assert get_names()[:3] == ['Progra', 'Fonctionnement des ordinateurs et des réseaux', 'Algorithmique I']
+
+    # Slots reused by other entries, then moved by a compaction
+    db.delete_entries('cours', 'MNEMONIQUE', 103)
+    db.add_entry('cours', COURSES[2] | {'NOM': 'Algorithmique II'})
+    assert get_names()[2:] == ['Algorithmique II'] + [course['NOM'] for course in COURSES[3:]]
+    for mnemonique in [101, 102, 105]:
+        db.delete_entries('cours', 'MNEMONIQUE', mnemonique)
+    assert [entry['NOM'] for entry in db.get_complete_table('cours')] == ['Projet d\'informatique I', 'Algorithmique II']
+    assert db.get_entry('cours', 'MNEMONIQUE', 106)['NOM'] == 'Projet d\'informatique I'
+
+def test_row_cache_written_by_another_database():
+    from database import Database
+    db = get_cours_db(row_cache_size=16)
+    assert db.get_entry('cours', 'MNEMONIQUE', 103)['NOM'] == 'Algorithmique I'
+
+    # Own writes keep the cache, the ones of another database drop it
+    db.update_entries('cours', 'MNEMONIQUE', 101, 'CREDITS', 3)
+    db.reset_stats()
+    assert db.get_entry('cours', 'MNEMONIQUE', 103)['NOM'] == 'Algorithmique I'
+    assert db.get_stats()['row_cache_hits'] == 1
+    Database('extra_db').update_entries('cours', 'MNEMONIQUE', 103, 'NOM', 'Algo')
+    assert db.get_entry('cours', 'MNEMONIQUE', 103)['NOM'] == 'Algo'
+
+
+########################################
+#               Lazy rows              #
+########################################
+
+def test_lazy_rows():
+    from row import Row
+    db = get_cours_db(lazy_rows=True)
+    row = db.get_entry('cours', 'MNEMONIQUE', 103)
+    assert isinstance(row, Row) and not hasattr(row, '__dict__')
+    assert row == {'id': 3} | COURSES[2] and dict(row) == {'id': 3} | COURSES[2]
+    assert list(row) == ['id', 'MNEMONIQUE', 'NOM', 'COORDINATEUR', 'CREDITS'] and len(row) == 5
+    assert 'NOM' in row and row.get('Analyse') is None
+    with pytest.raises(KeyError):
+        row['Analyse']
+    with pytest.raises(TypeError):
+        row['CREDITS'] = 3
+    assert row | {'CREDITS': 3} == {'id': 3} | COURSES[2] | {'CREDITS': 3}
+
+    # Numbers are unpacked from the kept bytes, only strings are read when they are used
+    reads = row.table_file.stats['reads']
+    assert row['CREDITS'] == 10 and row.table_file.stats['reads'] == reads
+    assert row['NOM'] == 'Algorithmique I' and row.table_file.stats['reads'] == reads + 2
+
+    assert [entry['MNEMONIQUE'] for entry in db.get_entries('cours', 'CREDITS', 5)] == [102, 105, 106]
+
+def test_lazy_rows_with_schema_and_cache():
+    from database import FieldType
+    db = get_cours_db(lazy_rows=True, row_cache_size=8)
+    db.add_column('cours', 'SEMESTRE', FieldType.INTEGER, 1)
+    assert db.get_entry('cours', 'MNEMONIQUE', 101) == {'id': 1} | COURSES[0] | {'SEMESTRE': 1}
+    assert db.get_entry('cours', 'MNEMONIQUE', 101) == {'id': 1} | COURSES[0] | {'SEMESTRE': 1}
+    assert db.get_stats()['row_cache_hits'] == 1
+
+    db = get_partitioned_db(('CREDITS', 'range', [6]))
+    db.lazy_rows = True
+    db.update_entries('cours', 'MNEMONIQUE', 102, 'CREDITS', 10)
+    assert db.get_entries('cours', 'CREDITS', 10) == [{'id': 1} | COURSES[0], {'id': 3} | COURSES[2],
+                                                     {'id': 2} | COURSES[1] | {'CREDITS': 10}]
+
+
+########################################
+#              LSM engine              #
+########################################
+
+def get_lsm_db(memtable_size: int) -> 'Database':
+    from database import FieldType
+    db = get_empty_db()
+    db.create_table(
+        'cours',
+        ('MNEMONIQUE', FieldType.INTEGER),
+        ('NOM', FieldType.STRING),
+        ('COORDINATEUR', FieldType.STRING),
+        ('CREDITS', FieldType.INTEGER),
+        engine=('lsm', memtable_size)
+    )
+    for course in COURSES:
+        db.add_entry('cours', course)
+    return db
+
+def test_lsm_table():
+    from database import Database
+    db = get_lsm_db(4)
+    assert sorted(file.name for file in EXTRA_PATH.glob('cours.*')) == ['cours.1.segment', 'cours.meta', 'cours.table', 'cours.version', 'cours.wal']
+    assert db.get_complete_table('cours') == [{'id': index + 1} | course for index, course in enumerate(COURSES)]
+    assert db.get_entry('cours', 'id', 5) == {'id': 5} | COURSES[4]
+    assert db.select_entries('cours', ('MNEMONIQUE',), 'CREDITS', 5) == [102, 105, 106]
+    assert db.get_entries_like('cours', 'NOM', 'Algo%') == [{'id': 3} | COURSES[2]]
+
+    # Newer versions hide the older ones, in the memtable and in the segment
+    version = db.get_version('cours')
+    assert db.update_fields('cours', 'CREDITS', 5, {'CREDITS': ('CREDITS', '+', 1)})
+    assert db.delete_entries('cours', 'MNEMONIQUE', 101)
+    assert not db.delete_entries('cours', 'MNEMONIQUE', 101)
+    assert db.get_version('cours') > version
+    expected = [{'id': 2} | COURSES[1] | {'CREDITS': 6}, {'id': 3} | COURSES[2],
+                {'id': 4} | COURSES[3] | {'CREDITS': 6}, {'id': 5} | COURSES[4] | {'CREDITS': 6}]
+    assert db.get_complete_table('cours') == expected
+    assert db.get_table_size('cours') == 4
+
+    # The memtable is read again from its log
+    db.close()
+    db = Database('extra_db')
+    assert db.get_complete_table('cours') == expected
+    db.add_entry('cours', COURSES[0])
+    assert db.get_entry('cours', 'MNEMONIQUE', 101)['id'] == 6
+
+def test_lsm_ids_and_single_writer():
+    from database import Database
+    db = get_lsm_db(4)
+    db.add_entry('cours', {'id': 2} | COURSES[0]) # Replaces the entry, the next id still follows the largest one
+    db.add_entry('cours', COURSES[1])
+    assert [entry['id'] for entry in db.get_complete_table('cours')] == [1, 2, 3, 4, 5, 6]
+    assert db.get_entry('cours', 'id', 2)['MNEMONIQUE'] == 101
+
+    # The log is only written by the database that opened the table first, until it's closed
+    other = Database('extra_db')
+    with pytest.raises(ValueError):
+        other.add_entry('cours', COURSES[2])
+    assert Database('extra_db', read_only=True).get_table_size('cours') == 6
+    db.close()
+    other.add_entry('cours', COURSES[2])
+    assert other.get_entry('cours', 'id', 7)['MNEMONIQUE'] == 103
+
+def test_lsm_compaction():
+    db = get_lsm_db(2)
+    for _ in range(5):
+        for course in COURSES:
+            db.add_entry('cours', course)
+        db.delete_entries('cours', 'CREDITS', 5)
+    db.get_lsm_table('cours').wait_for_compaction()
+
+    assert len(db.get_lsm_table('cours').segments) < 4
+    assert [entry['id'] for entry in db.get_complete_table('cours')] == [1, 3, 6, 8, 11, 13, 16, 18, 21, 23, 26, 28]
+    db.get_lsm_table('cours').compact()
+    segments = db.get_lsm_table('cours').segments
+    assert len(segments) == 1 and segments[0].count == 12 # No deletion is kept once all segments are merged
+
+def test_lsm_refused_options():
+    from database import FieldType
+    db = get_lsm_db(16)
+    for options in [{'engine': 'btree'}, {'engine': ('lsm', 0)}, {'engine': 'lsm', 'bloom': ('NOM',)},
+                    {'engine': 'lsm', 'partition_by': ('CREDITS', 'hash', 2)}]:
+        with pytest.raises(ValueError):
+            db.create_table('notes', ('NOM', FieldType.STRING), ('CREDITS', FieldType.INTEGER), **options)
+    with pytest.raises(ValueError):
+        db.add_column('cours', 'SEMESTRE', FieldType.INTEGER)
+    with pytest.raises(ValueError):
+        db.update_entries('cours', 'id', 1, 'id', 7)
+    with pytest.raises(ValueError):
+        db.add_entry('cours', {'NOM': 'Analyse'})
+    db.delete_table('cours')
+    assert list(EXTRA_PATH.glob('cours.*')) == []
+
+def test_script_lsm_table():
+    _ = get_empty_db('programme')
+    output = run_uldb('''open(programme)
+create_table(cours,MNEM=INTEGER,NOM=STRING,engine=lsm:2)
+insert_to(cours,MNEM=101,NOM="Progra")
+insert_to(cours,MNEM=102,NOM="FDO")
+insert_to(cours,MNEM=103,NOM="Algo")
+from_if_get(cours,MNEM=103,NOM)
+''')
+    assert output == 'Algo'
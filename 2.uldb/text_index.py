@@ -0,0 +1,88 @@
+from binary import BinaryFile
+import re
+
+START = '\x02' # Marks the start of a string, so prefixes have their own trigrams
+
+def get_trigrams(text: str) -> set[str]:
+    '''
+    Get all sequences of 3 characters of a text.
+    '''
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def get_value_trigrams(value: str) -> set[str]:
+    return get_trigrams(START * 2 + value)
+
+def get_like_trigrams(pattern: str) -> set[str]:
+    '''
+    Get the trigrams that every value matching a LIKE pattern contains ('%' is any text and '_' any character).
+    '''
+    segments = re.split('[%_]', pattern)
+
+    # Without a wildcard first, the pattern is a prefix
+    if not pattern.startswith(('%', '_')):
+        segments[0] = START * 2 + segments[0]
+
+    return set().union(*(get_trigrams(segment) for segment in segments))
+
+def compile_like(pattern: str) -> re.Pattern:
+    '''
+    Get a regular expression matching the same values as a LIKE pattern.
+    '''
+    parts = ['.*' if part == '%' else '.' if part == '_' else re.escape(part) for part in re.split('([%_])', pattern)]
+    return re.compile(''.join(parts), re.DOTALL)
+
+class TextIndex:
+    def __init__(self, offset_size: int = 4):
+        '''
+        Offsets of the entries by trigram of each indexed field, read from the postings of a .trigram file.
+        Postings are only added, so an offset may point to a deleted or changed entry and must be checked.
+        Offsets take as many bytes as the pointers of the table.
+        '''
+        self.offset_size = offset_size
+        self.postings = {} # Set of entry offsets by trigram by field
+        self.position = 0 # Size of the file already read
+        self.file_id = None # Inode of the file, it's a new file once the table is compacted
+
+    def add(self, field_name: str, offset: int, value: str) -> None:
+        field_postings = self.postings.setdefault(field_name, {})
+        for trigram in get_value_trigrams(value):
+            field_postings.setdefault(trigram, set()).add(offset)
+
+    def get_candidates(self, field_name: str, trigrams: set[str]) -> set[int] | None:
+        '''
+        Get the offsets of the entries that have all trigrams, None if there is no trigram to look for.
+        '''
+        if not trigrams:
+            return None
+
+        field_postings = self.postings.get(field_name, {})
+        candidates = None
+        for trigram in sorted(trigrams, key=lambda trigram: len(field_postings.get(trigram, ()))):
+            candidates = field_postings.get(trigram, set()) if candidates is None else candidates & field_postings.get(trigram, set())
+            if not candidates:
+                return set()
+        return candidates
+
+    def read(self, index_file: BinaryFile) -> None:
+        '''
+        Read the postings written since the last read.
+        '''
+        size = index_file.get_size()
+        index_file.goto(self.position)
+
+        while index_file.current_pos < size:
+            field_name = index_file.read_string()
+            offset = index_file.read_integer(self.offset_size)
+            self.add(field_name, offset, index_file.read_string())
+
+        self.position = size
+
+def write_postings(index_file: BinaryFile, postings: list[tuple[str, int, str]], offset_size: int = 4) -> None:
+    '''
+    Add postings at the end of a .trigram file: the field name, the offset of the entry and its value.
+    '''
+    index_file.goto(index_file.get_size())
+    for field_name, offset, value in postings:
+        index_file.write_string(field_name)
+        index_file.write_integer(offset, offset_size)
+        index_file.write_string(value)
@@ -1,10 +1,7 @@
 from sys import argv
-from database import Database
-from enum import Enum
-
-class FieldType(Enum):
-    INTEGER = 1
-    STRING = 2
+from database import Database, FieldType
+from time import perf_counter
+import re
 
 class run_time:
     def __init__(self):
@@ -16,6 +13,11 @@ class run_time:
         Execute a given request
         '''
 
+        # An explained request contains parentheses, so it is handled before the split
+        if request.startswith('explain('):
+            self.explain(request[len('explain('):request.rindex(')')])
+            return
+
         # Link all function name string to all function
         functions = {
             "open": self.open,
@@ -25,7 +27,12 @@ class run_time:
             "insert_to": self.insert_to,
             "from_if_get": self.from_if_get,
             "from_delete_where": self.from_delete_where,
-            "from_update_where": self.from_update_where
+            "from_update_where": self.from_update_where,
+            "import_from": self.import_from,
+            "export_to": self.export_to,
+            "analyze": self.analyze,
+            "add_column": self.add_column,
+            "drop_column": self.drop_column
         }
 
         # Split the function to get the function name and the arguments
@@ -49,16 +56,21 @@ class run_time:
         '''
         field_name, field_value = field.split('=')
 
-        # Check if field_value is a string or int
+        # Check if field_value is a string, a boolean, an int or a float
         if field_value[0] == '"' and field_value[-1] == '"':
             # This field value is a string
             field_value = field_value[1:-1]
+        elif field_value in ['true', 'false']:
+            field_value = field_value == 'true'
         else:
-            # If is not in quotation marks, it's should be an int
+            # If is not in quotation marks, it's should be a number
             try:
                 field_value = int(field_value)
             except:
-                print("Wrong field value format")
+                try:
+                    field_value = float(field_value)
+                except:
+                    print("Wrong field value format")
 
         # field_name should be always a string, so no need to check
         return field_name, field_value
@@ -75,21 +87,57 @@ class run_time:
     def create_table(self, table_name, *fields: list[str]):
         '''
         Parse table info and check if the format is good and create a new table.
+
+        Example of options : compression=zlib:9, bloom=NOM:COORD, text_index=NOM, partition_by=MNEM:hash:16, partition_by=CRED:range:5:10,
+        large_file=true, engine=lsm, engine=lsm:1000
         '''
         fields_info = []
+        options = {}
         for field in fields:
             field_name, field_type = field.split("=")
 
-            if field_type == "INTEGER":
-                field_type = FieldType.INTEGER
-            elif field_type == "STRING":
-                field_type = FieldType.STRING
+            # Options are written in lowercase to be told apart from fields
+            if field_name == 'compression':
+                if ':' in field_type:
+                    algorithm, level = field_type.split(':')
+                    options['compression'] = (algorithm, int(level))
+                else:
+                    options['compression'] = field_type
+                continue
+            elif field_name in ['bloom', 'text_index']:
+                options[field_name] = tuple(field_type.split(':'))
+                continue
+            elif field_name == 'partition_by':
+                column, kind, *spec = field_type.split(':')
+                if kind == 'hash':
+                    spec = int(spec[0])
+                else:
+                    # Bounds are written like values: 5, 2.5 or "M"
+                    spec = [self.parse_field(f'{column}={bound}')[1] for bound in spec]
+                options['partition_by'] = (column, kind, spec)
+                continue
+            elif field_name == 'engine':
+                if ':' in field_type:
+                    engine_name, memtable_size = field_type.split(':')
+                    options['engine'] = (engine_name, int(memtable_size))
+                else:
+                    options['engine'] = field_type
+                continue
+            elif field_name == 'large_file':
+                if field_type not in ['true', 'false']:
+                    raise ValueError
+                options['large_file'] = field_type == 'true'
+                continue
+
+            # The type is given by its name (INTEGER, STRING, INT8, INT16, INT64, BOOL or FLOAT64)
+            if field_type in FieldType.__members__:
+                field_type = FieldType[field_type]
             else:
                 raise ValueError
             
             fields_info.append((field_name, field_type))
 
-        self.db.create_table(table_name, *fields_info)
+        self.db.create_table(table_name, *fields_info, **options)
             
     def delete_table(self, table_name):
         '''
@@ -100,6 +148,28 @@ class run_time:
         else:
             print("This table doesn't exist")
 
+    def add_column(self, table_name, field, *default):
+        '''
+        Add a field to a table, with an optional default value
+
+        Example : add_column(cours,SALLE=STRING,default="P.A2")
+        '''
+        field_name, field_type = field.split('=')
+        if field_type not in FieldType.__members__:
+            raise ValueError
+
+        default_value = None
+        if default:
+            _, default_value = self.parse_field(default[0])
+
+        self.db.add_column(table_name, field_name, FieldType[field_type], default_value)
+
+    def drop_column(self, table_name, field_name):
+        '''
+        Remove a field from a table
+        '''
+        self.db.drop_column(table_name, field_name)
+
     def list_tables(self):
         '''
         Show a liste of all table of the db
@@ -125,21 +195,51 @@ class run_time:
     def from_if_get(self, table_name, cond: str, *field):
         '''
         Get all selected fields that satisfy the condition
-        '''
 
-        cond_field_name, cond_field_value = self.parse_field(cond)
+        Example of text conditions : NOM LIKE "Algo%", NOM CONTAINS "gram"
+        Example of a page : from_if_get(cours,CRED=5,NOM,LIMIT 2) then from_if_get(cours,CRED=5,NOM,LIMIT 2,CURSOR <printed cursor>)
+        Text conditions only take a LIMIT, they have no next page
+        '''
+        # LIMIT and CURSOR are given after the fields
+        limit, cursor, next_cursor = None, None, None
+        while field and field[-1].split(' ')[0] in ['LIMIT', 'CURSOR']:
+            keyword, value = field[-1].split(' ', 1)
+            if keyword == 'LIMIT':
+                limit = int(value)
+            else:
+                cursor = value.strip()
+            field = field[:-1]
 
         # If * is mentioned, that means it want all field
         if '*' in field:
             table_signature = self.db.get_table_signature(table_name)
             field = [field[0] for field in table_signature]
 
-        query = self.db.select_entries(table_name, field, cond_field_name, cond_field_value)
+        if ' LIKE ' in cond or ' CONTAINS ' in cond:
+            if cursor is not None:
+                raise ValueError
+            cond_field_name, operator, pattern = cond.strip().split(' ', 2)
+            _, pattern = self.parse_field(f'{cond_field_name}={pattern}')
+            if operator == 'LIKE':
+                entries = self.db.get_entries_like(table_name, cond_field_name, pattern)
+            else:
+                entries = self.db.get_entries_containing(table_name, cond_field_name, pattern)
+            query = self.db.select_from_entries(table_name, field, entries[:limit])
+        elif limit is not None:
+            cond_field_name, cond_field_value = self.parse_field(cond)
+            query, next_cursor = self.db.select_page(table_name, field, cond_field_name, cond_field_value, limit, cursor)
+        else:
+            cond_field_name, cond_field_value = self.parse_field(cond)
+            query = self.db.select_entries(table_name, field, cond_field_name, cond_field_value)
 
         # Print all field one by one
         for field in query:
             print(field)
 
+        # The next page is asked with the cursor, there is none after the last one
+        if next_cursor is not None:
+            print(f'CURSOR {next_cursor}')
+
     def from_delete_where(self, table_name, cond):
         '''
         Delete all selected fields that satisfy the condition
@@ -148,14 +248,89 @@ class run_time:
 
         self.db.delete_entries(table_name, cond_field_name, cond_field_value)
 
-    def from_update_where(self, table_name, cond, edit):
+    def from_update_where(self, table_name, cond, *edits):
         '''
         Update all selected fields with given propreties that satisfy the condition
+
+        Example of edits : CRED=10, NOM="LDP 2", CRED=CRED+1
         '''
         cond_field_name, cond_field_value = self.parse_field(cond)
-        edit_field_name, edit_field_value = self.parse_field(edit)
+        assignments = {}
+        for edit in edits:
+            edit_field_name, edit_value = edit.split('=', 1)
+
+            # A value starts with a digit, a sign or a quote, an expression with the name of a field
+            expression = re.fullmatch(r'([A-Za-z_]\w*)\s*([+*-])\s*(.+)', edit_value)
+            if expression:
+                source_name, operator, operand = expression.groups()
+                _, operand = self.parse_field(f'{source_name}={operand}')
+                assignments[edit_field_name] = (source_name, operator, operand)
+            else:
+                assignments[edit_field_name] = self.parse_field(edit)[1]
+
+        self.db.update_fields(table_name, cond_field_name, cond_field_value, assignments)
+
+    def import_from(self, table_name, path):
+        '''
+        Add all rows of a CSV or NDJSON file to the table, depending on the file extension
+        '''
+        if path.endswith('.csv'):
+            nb_rows, rows_per_second = self.db.import_csv(table_name, path)
+        elif path.endswith('.ndjson') or path.endswith('.jsonl'):
+            nb_rows, rows_per_second = self.db.import_ndjson(table_name, path)
+        else:
+            raise ValueError
+
+        print(f'{nb_rows} rows imported ({rows_per_second:.0f} rows/s)')
+
+    def export_to(self, table_name, path):
+        '''
+        Write all entries of the table in a CSV or NDJSON file, depending on the file extension
+        '''
+        if path.endswith('.csv'):
+            nb_rows = self.db.export_csv(table_name, path)
+        elif path.endswith('.ndjson') or path.endswith('.jsonl'):
+            nb_rows = self.db.export_ndjson(table_name, path)
+        else:
+            raise ValueError
+
+        print(f'{nb_rows} rows exported')
+
+    def analyze(self, table_name):
+        '''
+        Compute the statistics of the table and show them column by column
+        '''
+        stats = self.db.analyze_table(table_name)
+
+        print(f"rows: {stats['rows']}")
+        for column_name, column_stats in stats['columns'].items():
+            print(f"{column_name}: {column_stats['distinct']} distinct, {column_stats['nulls']} nulls, "
+                  f"min {column_stats['min']}, max {column_stats['max']}")
+
+    def explain(self, request: str):
+        '''
+        Execute a request and show the access paths, rows examined, I/O counters and time per phase
+        '''
+        self.db.reset_stats()
+        start = perf_counter()
+        self.exec_request(request)
+        total_time = perf_counter() - start
+
+        stats = self.db.get_stats()
+
+        for access_path in stats['plan']:
+            print(f'access path: {access_path}')
+
+        print(f"rows examined: {stats['entries_visited']}")
+        print(f"rows matched: {stats['entries_matched']}")
+        print(f"io: {stats['seeks']} seeks, {stats['reads']} reads ({stats['bytes_read']} bytes), "
+              f"{stats['writes']} writes ({stats['bytes_written']} bytes), "
+              f"{stats['shifts']} shifts ({stats['bytes_shifted']} bytes)")
+
+        for phase, phase_time in stats['phases'].items():
+            print(f'{phase}: {phase_time * 1000:.3f} ms')
 
-        self.db.update_entries(table_name, cond_field_name, cond_field_value, edit_field_name, edit_field_value)
+        print(f'total: {total_time * 1000:.3f} ms')
 
     def run_script(self, path):
         '''
@@ -0,0 +1,80 @@
+from threading import Thread, Condition
+
+VACUUM_RETRIES = 3 # Attempts to compact a table that keeps changing during its compaction
+
+class VacuumWorker:
+    def __init__(self, db: 'Database'):
+        '''
+        Compact the tables of a database one after the other in a background thread.
+        '''
+        self.db = db
+        self.pending = [] # Table names waiting for a compaction, in request order
+        self.running = None # Table name being compacted
+        self.condition = Condition()
+        self.thread = None
+        self.stopping = False
+        self.failures = [] # Table name and error of each compaction that failed
+        self.errors = [] # Unexpected errors, raised to the next caller waiting for the compactions
+
+    def request(self, table_name: str) -> None:
+        '''
+        Ask for a compaction of the table, the thread is started the first time.
+        '''
+        with self.condition:
+            if table_name not in self.pending and table_name != self.running:
+                self.pending.append(table_name)
+
+            if self.thread is None:
+                self.thread = Thread(target=self.run, name=f'vacuum-{self.db.name}', daemon=True)
+                self.thread.start()
+
+            self.condition.notify_all()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        '''
+        Wait until no compaction is pending or running. Return False if the timeout is over first.
+        An unexpected error of a compaction is raised here, as it can't be raised in the thread.
+        '''
+        with self.condition:
+            done = self.condition.wait_for(lambda: not self.pending and self.running is None, timeout)
+            if self.errors:
+                raise self.errors.pop(0)
+            return done
+
+    def stop(self) -> None:
+        '''
+        Finish the running compaction, forget the pending ones and stop the thread.
+        '''
+        with self.condition:
+            self.stopping = True
+            self.pending.clear()
+            self.condition.notify_all()
+
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.stopping)
+                if self.stopping:
+                    return
+                self.running = self.pending.pop(0)
+
+            try:
+                for _ in range(VACUUM_RETRIES):
+                    # Retry only if the table was changed during the compaction and still needs one
+                    if self.db.vacuum_table(self.running) or not self.db.needs_vacuum(self.running):
+                        break
+            except (ValueError, FileNotFoundError) as error:
+                # The table was deleted or changed while it was read, it will be compacted by a later delete
+                with self.condition:
+                    self.failures.append((self.running, error))
+            except Exception as error:
+                with self.condition:
+                    self.failures.append((self.running, error))
+                    self.errors.append(error)
+            finally:
+                with self.condition:
+                    self.running = None
+                    self.condition.notify_all()